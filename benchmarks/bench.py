@@ -0,0 +1,345 @@
+"""QuickFile 性能测试
+
+在可复现的合成目录树上测量：
+    crawl     建立文件索引的耗时与吞吐量（文件/秒）、峰值内存
+    save      保存索引的耗时与索引文件大小
+    load      冷加载（新进程中加载索引并完成第一次搜索）与热加载耗时
+    query     一组查询（前缀、模糊子序列、中文、扩展名、无结果）的 p50/p90/p99 延迟，
+              逐字输入（边输入边搜索）时每次按键的延迟，以及重复查询（命中结果缓存）的延迟
+    score     Scorer 对单个文件名评分的平均耗时
+
+结果写入 JSON 文件，--compare 与之前的结果对比，用于发现不同版本之间的性能退化。
+
+用法:
+    python benchmarks/bench.py --files 100000                     # 在临时目录中生成真实的目录树
+    python benchmarks/bench.py --files 10000000 --fake            # 不落盘，模拟 os.scandir
+    python benchmarks/bench.py -o new.json --compare old.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from quickfile_core.engine import IndexEngine
+from quickfile_core.segment import IndexRoot
+from quickfile_core.search import SearchEngine
+from quickfile_core.scoring import Scorer
+from quickfile_core.query import QueryError, parse_query
+from synthetic import TreeSpec, FakeFilesystem, materialize
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """本进程的峰值内存（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def percentiles(samples):
+    """返回以毫秒为单位的延迟统计"""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def at(fraction):
+        return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 3)
+
+    return {"count": len(samples), "p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99),
+            "max_ms": round(samples[-1] * 1000, 3), "mean_ms": round(statistics.mean(samples) * 1000, 3)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_queries(names, count, seed):
+    """从索引中的文件名生成查询集 {类别: [查询]}"""
+    rng = random.Random(seed)
+    ascii_names = [name for name in names if name.isascii() and len(name) >= 4]
+    cjk_names = [name for name in names if not name.isascii()]
+    queries = {"prefix": [], "fuzzy": [], "cjk": [], "extension": [], "miss": []}
+    per_kind = max(1, count // len(queries))
+    for _ in range(per_kind):
+        if ascii_names:
+            name = rng.choice(ascii_names)
+            queries["prefix"].append(name[:rng.randint(3, min(8, len(name)))])
+            positions = sorted(rng.sample(range(len(name)), min(len(name), rng.randint(3, 5))))
+            queries["fuzzy"].append("".join(name[i] for i in positions).strip() or name[:3])
+        if cjk_names:
+            name = rng.choice(cjk_names)
+            start = rng.randint(0, max(0, len(name) - 2))
+            queries["cjk"].append(name[start:start + 2])
+        queries["extension"].append(rng.choice(["report.pdf", "main.py", ".jpg", "notes.md", "2021-"]))
+        queries["miss"].append("".join(rng.choice("qxzjvkw") for _ in range(rng.randint(4, 7))))
+    return {kind: [q for q in items if q.strip() and is_valid_query(q)] for kind, items in queries.items() if items}
+
+
+def is_valid_query(query):
+    """从文件名中截取的片段可能恰好是不完整的查询语法（如 "a -"），这样的查询不参与测量"""
+    try:
+        parse_query(query)
+    except QueryError:
+        return False
+    return True
+
+
+def bench_queries(search_engine, queries, limit, repeat):
+    """测量查询延迟；每个查询先清空结果与匹配缓存，使每次都是完整搜索"""
+    results = {}
+    everything = []
+    for kind, items in queries.items():
+        samples = []
+        for _ in range(repeat):
+            for query in items:
+                search_engine.cache.clear()
+                start = time.perf_counter()
+                search_engine.search(query, "file", limit=limit)
+                samples.append(time.perf_counter() - start)
+        results[kind] = percentiles(samples)
+        everything.extend(samples)
+    results["all"] = percentiles(everything)
+    return results
+
+
+def bench_typeahead(search_engine, names, count, limit, seed):
+    """模拟逐字输入：每次按键都以当前前缀搜索（可利用缓存的前缀查询的匹配结果缩小范围）"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        name = rng.choice(names)
+        search_engine.cache.clear()
+        for end in range(1, min(len(name), 10) + 1):
+            start = time.perf_counter()
+            try:
+                search_engine.search(name[:end], "file", limit=limit)
+            except QueryError:
+                # 前缀可能是不完整的查询语法（如只输入了 "-"），界面上只提示错误
+                continue
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_cached(search_engine, queries, limit):
+    """重复查询（如从搜索历史中再次选择）的延迟：每个查询先完整搜索一次，再测量第二次"""
+    samples = []
+    for items in queries.values():
+        for query in items:
+            search_engine.cache.clear()
+            search_engine.search(query, "file", limit=limit)
+            start = time.perf_counter()
+            search_engine.search(query, "file", limit=limit)
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_scoring(names, queries, budget=200000):
+    """Scorer.score 对单个名称的平均耗时（微秒）"""
+    scorers = [Scorer(query) for items in queries.values() for query in items[:5]]
+    sample = names[:max(1, budget // max(1, len(scorers)))]
+    start = time.perf_counter()
+    calls = 0
+    for scorer in scorers:
+        for name in sample:
+            scorer.score(name)
+        calls += len(sample)
+    elapsed = time.perf_counter() - start
+    return {"calls": calls, "us_per_call": round(elapsed / max(1, calls) * 1e6, 3)}
+
+
+def cold_load(data_dir, query, drop_caches):
+    """在新进程中加载索引并完成一次搜索（索引页尚未被本进程访问过）"""
+    if drop_caches:
+        # 需要 root 权限；失败时只是退化为“新进程”意义上的冷加载
+        try:
+            subprocess.run(["sync"], check=False)
+            with open("/proc/sys/vm/drop_caches", "w") as f:
+                f.write("3\n")
+        except OSError as e:
+            print(f"清空页缓存失败: {e}", file=sys.stderr)
+    code = (
+        "import sys, json, time\n"
+        f"sys.path.insert(0, {REPO_DIR!r})\n"
+        "start = time.perf_counter()\n"
+        "from quickfile_core.engine import IndexEngine\n"
+        "from quickfile_core.search import SearchEngine\n"
+        "imported = time.perf_counter()\n"
+        f"engine = IndexEngine({data_dir!r})\n"
+        "engine.load_file_index()\n"
+        "loaded = time.perf_counter()\n"
+        f"SearchEngine(engine).search({query!r}, 'file', limit=50)\n"
+        "searched = time.perf_counter()\n"
+        "import resource\n"
+        "print(json.dumps({'import_s': imported - start, 'load_s': loaded - imported,\n"
+        "                  'first_search_s': searched - loaded,\n"
+        "                  'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def run(args):
+    spec = TreeSpec(files=args.files, depth=args.depth, fanout=args.fanout,
+                    cjk_ratio=args.cjk_ratio, zipf=args.zipf, seed=args.seed)
+    work_dir = tempfile.mkdtemp(prefix="quickfile-bench-", dir=args.work_dir)
+    data_dir = os.path.join(work_dir, "data")
+    results = {}
+    try:
+        engine = IndexEngine(data_dir)
+        engine.walker_workers = args.workers
+        if args.fake:
+            fake = FakeFilesystem(spec)
+            root = fake.root
+        else:
+            root = os.path.join(work_dir, "tree")
+            start = time.perf_counter()
+            created = materialize(spec, root)
+            print(f"已生成 {created} 个文件，耗时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+
+        # 建立索引（只有这一个根目录）
+        engine.configure_roots([IndexRoot(root)])
+        segment = engine.segments[0]
+        start = time.perf_counter()
+        if args.fake:
+            with fake.installed():
+                count = engine.build_file_index([root], resume=False)
+        else:
+            count = engine.build_file_index([root], resume=False)
+        elapsed = time.perf_counter() - start
+        results["crawl"] = {"files": count, "seconds": round(elapsed, 3),
+                            "files_per_second": round(count / elapsed) if elapsed else None,
+                            "peak_rss_mb": peak_rss_mb()}
+        print(f"建立索引: {count} 个文件，{elapsed:.2f} 秒", file=sys.stderr)
+
+        # 保存
+        start = time.perf_counter()
+        engine.save_file_index()
+        results["save"] = {"seconds": round(time.perf_counter() - start, 3),
+                           "index_bytes": os.path.getsize(segment.index_file),
+                           "bytes_per_file": round(os.path.getsize(segment.index_file) / max(1, count), 1)}
+
+        # 加载
+        names = list(segment.file_index.get_names())
+        queries = build_queries(names, args.queries, args.seed)
+        results["load"] = {"cold": cold_load(data_dir, queries["prefix"][0] if queries.get("prefix") else "a",
+                                             args.drop_caches)}
+        warm = []
+        for _ in range(5):
+            start = time.perf_counter()
+            engine.load_file_index()
+            warm.append(time.perf_counter() - start)
+        results["load"]["warm_s"] = round(statistics.median(warm), 4)
+
+        # 查询
+        search_engine = SearchEngine(engine)
+        search_engine.search("warmup", "file", limit=args.limit)
+        results["query"] = bench_queries(search_engine, queries, args.limit, args.repeat)
+        results["typeahead"] = bench_typeahead(search_engine, names, max(1, args.queries // 10),
+                                               args.limit, args.seed)
+        results["cached"] = bench_cached(search_engine, queries, args.limit)
+        results["score"] = bench_scoring(names, queries)
+        results["peak_rss_mb"] = peak_rss_mb()
+        segment.file_index.close()
+    finally:
+        if args.keep:
+            print(f"保留工作目录: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "mode": "fake" if args.fake else "disk",
+        },
+        "params": dict(spec.as_dict(), workers=args.workers, limit=args.limit, queries=args.queries,
+                       repeat=args.repeat),
+        "results": results,
+    }
+
+
+def flatten(results, prefix=""):
+    """把嵌套结果展开为 {"query.all.p50_ms": 值}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old, new):
+    """打印新旧结果的对比（比值 >1 表示数值变大）"""
+    if old.get("params") != new.get("params"):
+        print("注意: 两次测试的参数不同，对比结果仅供参考")
+    old_flat = flatten(old.get("results", {}))
+    new_flat = flatten(new.get("results", {}))
+    print(f"{'指标':<32}{'旧':>14}{'新':>14}{'比值':>10}")
+    for key in sorted(new_flat):
+        if key in old_flat:
+            ratio = new_flat[key] / old_flat[key] if old_flat[key] else float("nan")
+            print(f"{key:<32}{old_flat[key]:>14g}{new_flat[key]:>14g}{ratio:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QuickFile 性能测试")
+    parser.add_argument("--files", type=int, default=100000, help="文件总数")
+    parser.add_argument("--depth", type=int, default=4, help="目录层数")
+    parser.add_argument("--fanout", type=int, default=8, help="每个目录的子目录数")
+    parser.add_argument("--cjk-ratio", type=float, default=0.2, help="中日韩文件名的比例")
+    parser.add_argument("--zipf", type=float, default=1.1, help="文件名词干分布的 Zipf 指数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--fake", action="store_true", help="不落盘，用模拟的 os.scandir 遍历")
+    parser.add_argument("-j", "--workers", type=int, help="遍历线程数")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每个查询重复次数")
+    parser.add_argument("-n", "--limit", type=int, default=50, help="每次搜索保留的结果数")
+    parser.add_argument("--drop-caches", action="store_true", help="冷加载前清空系统页缓存（Linux，需要 root）")
+    parser.add_argument("--work-dir", help="临时目录的位置（默认系统临时目录）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的目录树与索引")
+    parser.add_argument("-o", "--output", help="结果 JSON 文件（默认输出到标准输出）")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
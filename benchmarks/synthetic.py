@@ -0,0 +1,229 @@
+"""可复现的合成目录树（性能测试用）
+
+同样的参数与随机种子总是生成同样的目录树：每个目录的内容只由 (种子, 目录路径) 决定。
+目录树可以真实写入磁盘（materialize），也可以不落盘：FakeFilesystem 按路径即时推算目录内容，
+替换 walker 模块使用的 os.scandir / os.stat，用于测试上千万个文件的规模（只支持单进程构建）。
+"""
+
+import os
+import re
+import random
+import contextlib
+from types import SimpleNamespace
+
+
+STEMS = [
+    "report", "main", "index", "readme", "config", "test", "data", "image", "photo", "invoice",
+    "budget", "notes", "draft", "backup", "setup", "utils", "schema", "design", "summary", "log_viewer",
+    "QuarterlyReport", "userGuide", "meeting-minutes", "release_notes", "screenshot", "contract",
+]
+CJK_STEMS = [
+    "报告", "会议纪要", "项目计划", "合同", "发票", "照片", "简历", "数据分析", "测试用例", "设计稿",
+    "预算表", "年度总结", "产品需求", "用户手册", "周报", "お知らせ", "資料", "회의록",
+]
+EXTENSIONS = [
+    (".txt", 10), (".md", 5), (".py", 8), (".jpg", 10), (".png", 6), (".pdf", 8), (".docx", 6),
+    (".xlsx", 4), (".mp4", 2), (".zip", 2), (".json", 4), (".c", 3), (".html", 3), ("", 1),
+]
+DIR_STEMS = ["src", "docs", "assets", "project", "archive", "build", "photos", "工作", "资料", "module"]
+BASE_TIME = 1700000000.0        # 修改时间的基准（固定，保证可复现）
+DIR_NAME_PATTERN = re.compile(r"\D*(\d+)$")
+
+
+class TreeSpec:
+    """合成目录树的参数
+
+    files: 文件总数；depth: 目录层数（根目录为第 0 层）；fanout: 每个目录的子目录数；
+    cjk_ratio: 中日韩文件名的比例；zipf: 文件名词干的 Zipf 分布指数（越大重复越集中）。
+    """
+
+    def __init__(self, files=100000, depth=4, fanout=8, cjk_ratio=0.2, zipf=1.1, seed=1):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.cjk_ratio = cjk_ratio
+        self.zipf = zipf
+        self.seed = seed
+        # 第 k 层之前的目录数（广度优先编号的起点）
+        self.level_offsets = [0]
+        for level in range(depth + 1):
+            self.level_offsets.append(self.level_offsets[-1] + fanout ** level)
+        self.dir_count = self.level_offsets[-1]
+        self.base_files, self.extra_files = divmod(files, self.dir_count)
+        self.stem_weights = self._cumulative([1 / (rank + 1) ** zipf for rank in range(len(STEMS))])
+        self.cjk_weights = self._cumulative([1 / (rank + 1) ** zipf for rank in range(len(CJK_STEMS))])
+        self.ext_weights = self._cumulative([weight for _, weight in EXTENSIONS])
+
+    @staticmethod
+    def _cumulative(weights):
+        total = 0
+        cumulative = []
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        return cumulative
+
+    def as_dict(self):
+        return dict(files=self.files, depth=self.depth, fanout=self.fanout,
+                    cjk_ratio=self.cjk_ratio, zipf=self.zipf, seed=self.seed)
+
+    # 目录结构
+    def parse(self, root, path):
+        """把路径解析为各层子目录的序号，不属于目录树时返回 None"""
+        if path == root:
+            return []
+        if not path.startswith(root.rstrip(os.sep) + os.sep):
+            return None
+        indexes = []
+        for part in path[len(root.rstrip(os.sep)) + 1:].split(os.sep):
+            match = DIR_NAME_PATTERN.match(part)
+            if not match or len(indexes) >= self.depth:
+                return None
+            index = int(match.group(1))
+            if index >= self.fanout or part != self.dir_name(len(indexes), index):
+                return None
+            indexes.append(index)
+        return indexes
+
+    def dir_name(self, level, index):
+        return f"{DIR_STEMS[(level + index) % len(DIR_STEMS)]}{index}"
+
+    def subdirs(self, indexes):
+        if len(indexes) >= self.depth:
+            return []
+        return [self.dir_name(len(indexes), i) for i in range(self.fanout)]
+
+    def file_count(self, indexes):
+        number = 0
+        for index in indexes:
+            number = number * self.fanout + index
+        dir_id = self.level_offsets[len(indexes)] + number
+        return self.base_files + (1 if dir_id < self.extra_files else 0)
+
+    def files_in(self, root, path, indexes):
+        """返回某个目录中的文件 [(文件名, 大小, 修改时间)]"""
+        rng = random.Random(f"{self.seed}:{os.path.relpath(path, root)}")
+        files = []
+        names = set()
+        for i in range(self.file_count(indexes)):
+            if rng.random() < self.cjk_ratio:
+                stem = rng.choices(CJK_STEMS, cum_weights=self.cjk_weights)[0]
+            else:
+                stem = rng.choices(STEMS, cum_weights=self.stem_weights)[0]
+            style = rng.random()
+            if style < 0.5:
+                stem = f"{stem}_{rng.randint(1, 9999)}"
+            elif style < 0.7:
+                stem = f"{stem} ({rng.randint(1, 20)})"
+            elif style < 0.85:
+                stem = f"{rng.randint(2015, 2025)}-{stem}"
+            extension = rng.choices(EXTENSIONS, cum_weights=self.ext_weights)[0][0]
+            name = stem + extension
+            if name in names:
+                name = f"{stem}.{i}{extension}"
+            names.add(name)
+            size = int(rng.lognormvariate(9, 2.5))
+            mtime = BASE_TIME - rng.random() * 3 * 365 * 86400
+            files.append((name, size, mtime))
+        return files
+
+    def walk(self, root):
+        """按深度优先逐个产出 (目录, [(文件名, 大小, 修改时间)], [子目录名])"""
+        stack = [(root, [])]
+        while stack:
+            path, indexes = stack.pop()
+            subdirs = self.subdirs(indexes)
+            yield path, self.files_in(root, path, indexes), subdirs
+            for i in reversed(range(len(subdirs))):
+                stack.append((os.path.join(path, subdirs[i]), indexes + [i]))
+
+
+def materialize(spec, root):
+    """把目录树写入磁盘（文件为稀疏文件，只设置大小与修改时间），返回文件数"""
+    count = 0
+    for path, files, subdirs in spec.walk(root):
+        os.makedirs(path, exist_ok=True)
+        for name, size, mtime in files:
+            file_path = os.path.join(path, name)
+            with open(file_path, "wb") as f:
+                f.truncate(size)
+            os.utime(file_path, (mtime, mtime))
+            count += 1
+    return count
+
+
+class FakeDirEntry:
+    """与 os.DirEntry 接口一致的目录项"""
+
+    def __init__(self, parent, name, is_dir, stat):
+        self.name = name
+        self.path = os.path.join(parent, name)
+        self._is_dir = is_dir
+        self._stat = stat
+
+    def is_dir(self):
+        return self._is_dir
+
+    def is_symlink(self):
+        return False
+
+    def stat(self):
+        return self._stat
+
+
+class _OsProxy:
+    """替换 walker 模块中的 os：scandir 与 stat 走合成目录树，其他属性转给真正的 os"""
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+    def scandir(self, path):
+        return self._fake.scandir(path)
+
+    def stat(self, path):
+        return self._fake.stat(path)
+
+
+class FakeFilesystem:
+    """不落盘的合成目录树，挂在虚拟根目录 root 下"""
+
+    def __init__(self, spec, root=os.path.join(os.sep, "synthetic")):
+        self.spec = spec
+        self.root = root
+
+    def _indexes(self, path):
+        indexes = self.spec.parse(self.root, path)
+        if indexes is None:
+            raise FileNotFoundError(2, "No such file or directory", path)
+        return indexes
+
+    def stat(self, path):
+        indexes = self._indexes(path)
+        number = 0
+        for index in indexes:
+            number = number * self.spec.fanout + index
+        return SimpleNamespace(st_mtime_ns=int(BASE_TIME * 1e9), st_ino=self.spec.level_offsets[len(indexes)] + number + 1,
+                               st_size=4096, st_mtime=BASE_TIME)
+
+    @contextlib.contextmanager
+    def scandir(self, path):
+        indexes = self._indexes(path)
+        entries = [FakeDirEntry(path, name, True, None) for name in self.spec.subdirs(indexes)]
+        for name, size, mtime in self.spec.files_in(self.root, path, indexes):
+            entries.append(FakeDirEntry(path, name, False, SimpleNamespace(st_size=size, st_mtime=mtime)))
+        yield iter(entries)
+
+    @contextlib.contextmanager
+    def installed(self):
+        """在 with 块内让 walker 模块遍历合成目录树"""
+        from quickfile_core import walker
+        original = walker.os
+        walker.os = _OsProxy(self)
+        try:
+            yield self
+        finally:
+            walker.os = original
+
@@ -2,13 +2,206 @@ import os
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import json
+import queue
 import threading
-import time
-from datetime import datetime
-import re
-import subprocess
 import platform
 import shutil
+import sys
+
+from quickfile_core import IndexEngine, SearchEngine, TypeaheadSearcher, Revalidator, IndexWatcher
+from quickfile_core.utils import format_file_info
+from quickfile_core.metrics import metrics
+from quickfile_core.daemon import DaemonClient, RemoteSearchEngine
+from quickfile_core.runner import CommandRunner, launch_detached, open_path
+from quickfile_core.apps import launch_command
+
+class VirtualResultList:
+    """虚拟化的结果列表
+
+    Treeview 中只保留一屏的行，滚动时直接改写这些行的内容；全部结果保存在普通列表中，
+    选中与键盘导航都按下标进行，因此显示耗时与结果数量无关。
+    """
+    
+    def __init__(self, parent, columns, on_activate=None, on_view_change=None):
+        self.items = []               # 全部结果
+        self.top = 0                  # 第一行可见结果的下标
+        self.selected = -1            # 选中结果的下标，-1 表示未选中
+        self.page_size = 20           # 可见行数，窗口大小变化时重新计算
+        self.row_ids = []             # Treeview 中实际存在的行
+        self.on_activate = on_activate            # 双击或回车时的回调
+        self.on_view_change = on_view_change      # 可见范围变化时的回调
+        
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in columns], show="headings", selectmode="browse")
+        for name, text, width, anchor in columns:
+            self.tree.heading(name, text=text)
+            self.tree.column(name, width=width, anchor=anchor)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<Button-1>", self.on_click)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        self.tree.bind("<Return>", self.on_return)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        for key, delta in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page"),
+                           ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, d=delta: self.move_selection(d))
+    
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+    
+    def focus_set(self):
+        self.tree.focus_set()
+    
+    # 数据
+    def set_items(self, items):
+        """替换全部结果并回到顶部"""
+        self.items = items
+        self.top = 0
+        self.selected = -1
+        self.render()
+    
+    def selected_item(self):
+        """返回选中的结果，未选中时返回 None"""
+        if 0 <= self.selected < len(self.items):
+            return self.items[self.selected]
+        return None
+    
+    def visible_range(self):
+        """返回当前可见结果的下标范围"""
+        return range(self.top, min(self.top + self.page_size, len(self.items)))
+    
+    def visible_items(self):
+        """返回当前可见的结果"""
+        return [self.items[index] for index in self.visible_range()]
+    
+    def replace_item(self, index, item):
+        """替换某个结果；item 为 None 时删除该结果"""
+        if item is None:
+            del self.items[index]
+            if self.selected > index or self.selected >= len(self.items):
+                self.selected -= 1
+        else:
+            self.items[index] = item
+        self.render()
+    
+    # 显示
+    def render(self):
+        """把 top 开始的一屏结果写入 Treeview 中的行"""
+        total = len(self.items)
+        self.top = max(0, min(self.top, total - self.page_size))
+        count = min(self.page_size, total - self.top)
+        while len(self.row_ids) < count:
+            self.row_ids.append(self.tree.insert("", tk.END))
+        while len(self.row_ids) > count:
+            self.tree.delete(self.row_ids.pop())
+        for offset, row_id in enumerate(self.row_ids):
+            self.tree.item(row_id, values=self.items[self.top + offset])
+        if self.top <= self.selected < self.top + count:
+            self.tree.selection_set(self.row_ids[self.selected - self.top])
+        else:
+            self.tree.selection_set(())
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        if self.on_view_change:
+            self.on_view_change()
+    
+    def on_resize(self, event):
+        """窗口大小变化时重新计算可见行数（按实际行高，只保留完整显示的行）"""
+        row_height = 20
+        header_height = 25
+        if self.row_ids:
+            bbox = self.tree.bbox(self.row_ids[0])
+            if bbox:
+                header_height, row_height = bbox[1], bbox[3]
+        page_size = max(1, (event.height - header_height) // row_height)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.render()
+    
+    # 滚动与导航
+    def scroll(self, delta):
+        """按行滚动"""
+        self.top += delta
+        self.render()
+        return "break"
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        """滚动条回调：moveto 比例，或按行/页滚动"""
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.items))
+            self.render()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.page_size if unit == "pages" else 1))
+    
+    def on_mousewheel(self, event):
+        """Windows/macOS 鼠标滚轮"""
+        return self.scroll(-3 if event.delta > 0 else 3)
+    
+    def select(self, index):
+        """选中某个结果并确保其可见"""
+        if not self.items:
+            return
+        self.selected = max(0, min(index, len(self.items) - 1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.page_size:
+            self.top = self.selected - self.page_size + 1
+        self.render()
+    
+    def move_selection(self, delta):
+        """方向键、翻页键与 Home/End：按下标移动选中项"""
+        if delta == "home":
+            self.select(0)
+        elif delta == "end":
+            self.select(len(self.items) - 1)
+        elif self.selected < 0:
+            self.select(self.top)
+        elif delta == "page":
+            self.select(self.selected + self.page_size)
+        elif delta == "-page":
+            self.select(self.selected - self.page_size)
+        else:
+            self.select(self.selected + delta)
+        return "break"
+    
+    def index_at(self, y):
+        """返回某个纵坐标处的结果下标，不在任何行上时返回 -1"""
+        row_id = self.tree.identify_row(y)
+        if row_id in self.row_ids:
+            return self.top + self.row_ids.index(row_id)
+        return -1
+    
+    def on_click(self, event):
+        """单击选中"""
+        self.tree.focus_set()
+        index = self.index_at(event.y)
+        if index >= 0:
+            self.select(index)
+        if self.tree.identify_region(event.x, event.y) != "separator":
+            return "break"
+    
+    def on_double_click(self, event):
+        """双击打开"""
+        index = self.index_at(event.y)
+        if index >= 0 and self.on_activate:
+            self.select(index)
+            self.on_activate(self.items[index])
+        return "break"
+    
+    def on_return(self, event):
+        """回车打开选中项"""
+        item = self.selected_item()
+        if item is not None and self.on_activate:
+            self.on_activate(item)
+        return "break"
+
 
 class QuickFile:
     def __init__(self, root):
@@ -25,35 +218,49 @@ class QuickFile:
         self.style.configure("Treeview", font=("SimHei", 10))
         
         # 数据存储
-        self.file_index = {}          # 文件索引 {文件名: [文件路径]}
-        self.apps_index = {}          # 应用程序索引 {应用名: 路径}
         self.workspaces = {}          # 工作区配置
         self.custom_commands = {}     # 自定义命令
         self.search_results = []      # 当前搜索结果
         self.history = []             # 搜索历史
         self.max_history = 50         # 最大历史记录数
+        self.result_limit = 1000      # 最多显示的结果数（只保留得分最高的结果）
+        self.last_submitted = None    # 最近提交给后台搜索的查询
+        self.revalidate_results = True  # 是否在后台重新验证可见结果的大小与修改时间
+        self.revalidate_pending = False
+        self.command_timeout = None   # 自定义命令的默认超时（秒），None 表示不限；命令可在 commands.json 中单独设置 timeout
+        self.max_output_lines = 5000  # 命令输出面板最多保留的行数
+        self.output_queue = queue.Queue()  # 后台命令的输出，由主线程定期取出显示
+        self.runner = CommandRunner(self.on_command_output, self.on_command_exit, timeout=self.command_timeout)
         
         # 文件路径
         self.data_dir = os.path.join(os.path.expanduser("~"), ".quickfile")
-        self.index_file = os.path.join(self.data_dir, "file_index.json")
-        self.apps_file = os.path.join(self.data_dir, "apps_index.json")
         self.workspaces_file = os.path.join(self.data_dir, "workspaces.json")
         self.commands_file = os.path.join(self.data_dir, "commands.json")
         self.history_file = os.path.join(self.data_dir, "history.json")
-        
-        # 排除配置
-        self.excluded_dirs = {
-            "System Volume Information", "$Recycle.Bin", "Windows", 
-            "Program Files", "Program Files (x86)", "AppData"
-        }
-        self.excluded_extensions = {
-            ".sys", ".dll", ".exe", ".com", ".tmp", ".log", ".bin", 
-            ".msi", ".cab", ".dat", ".ini", ".db", ".sqlite"
-        }
-        
-        # 创建数据目录
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        self.metrics_file = os.path.join(self.data_dir, "metrics.json")  # 退出时写入运行指标，排查性能问题时使用
+        self.metrics_port = None      # 设置端口时在 127.0.0.1 上以 Prometheus 文本格式提供 /metrics
+        
+        # 索引与搜索引擎（排除配置见 IndexEngine）
+        self.index_engine = IndexEngine(self.data_dir, status_callback=self.set_status)
+        # 建立索引时是否同时建立文本文件的内容索引：要读取根目录下全部文本文件，默认关闭，可在界面上勾选
+        self.index_engine.index_content = False
+        # 建立索引时的资源限制：默认以低优先级运行，避免启动时占满磁盘
+        governor = self.index_engine.governor
+        governor.low_priority = True
+        governor.files_per_second = None   # 每秒最多处理的文件数，None 表示不限
+        governor.idle_window = None        # 只在每天的某个时段内建立索引，例如 (22, 7)
+        # 后台服务（python -m quickfile_core daemon）在运行时直接连接，共用它的索引，本进程不加载索引也不监视
+        self.daemon = DaemonClient.connect(self.data_dir)
+        if self.daemon:
+            self.search_engine = RemoteSearchEngine(self.daemon)
+            self.revalidator = Revalidator(self.daemon, self.on_file_revalidated)
+        else:
+            self.search_engine = SearchEngine(self.index_engine)
+            self.revalidator = Revalidator(self.index_engine, self.on_file_revalidated)
+        self.watcher = IndexWatcher(self.index_engine)
+        self.typeahead = TypeaheadSearcher(self.search_engine, self.on_search_results, limit=self.result_limit,
+                                           on_error=self.on_search_error)
+        self.metrics_server = metrics.serve(self.metrics_port) if self.metrics_port else None
         
         # 加载数据
         self.load_all_data()
@@ -61,14 +268,26 @@ class QuickFile:
         # 创建界面
         self.create_widgets()
         
-        # 启动索引线程
-        if not self.file_index or not self.apps_index:
+        # 启动索引线程（上次构建被中断时从中断处继续）；已有索引时直接开始实时监视
+        if self.daemon:
+            self.status_var.set("已连接后台索引服务")
+        elif (not self.index_engine.file_count() or not self.index_engine.apps_index
+                or self.index_engine.has_unfinished_build()):
             self.start_indexing()
+        else:
+            self.watcher.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def set_status(self, message):
+        """更新状态栏（可从后台线程调用）"""
+        if hasattr(self, "status_var"):
+            self.root.after(0, self.status_var.set, message)
     
     def load_all_data(self):
         """加载所有配置数据"""
-        self.load_file_index()
-        self.load_apps_index()
+        if not self.daemon:
+            self.index_engine.load_file_index()
+            self.index_engine.load_apps_index()
         self.load_workspaces()
         self.load_custom_commands()
         self.load_history()
@@ -83,22 +302,33 @@ class QuickFile:
         ttk.Label(top_frame, text="搜索类型:").pack(side=tk.LEFT, padx=5)
         self.search_type = tk.StringVar(value="all")
         search_types = [("全部", "all"), ("文件", "file"), ("应用", "app"), 
-                        ("工作区", "workspace"), ("命令", "command")]
+                        ("工作区", "workspace"), ("命令", "command"), ("内容", "content")]
         
         for text, value in search_types:
-            ttk.Radiobutton(top_frame, text=text, variable=self.search_type, value=value).pack(side=tk.LEFT, padx=5)
+            ttk.Radiobutton(top_frame, text=text, variable=self.search_type, value=value,
+                            command=self.on_type).pack(side=tk.LEFT, padx=5)
         
         # 搜索框
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(top_frame, textvariable=self.search_var, width=50)
         self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
         self.search_entry.bind("<Return>", self.on_search)
+        self.search_entry.bind("<KeyRelease>", self.on_type)
         self.search_entry.bind("<Down>", self.focus_results)
         
         # 搜索按钮
         self.search_btn = ttk.Button(top_frame, text="搜索", command=self.on_search)
         self.search_btn.pack(side=tk.LEFT, padx=5)
         
+        # 增量更新索引按钮
+        ttk.Button(top_frame, text="更新索引", command=lambda: self.start_indexing(incremental=True)).pack(side=tk.LEFT, padx=5)
+        self.pause_btn = ttk.Button(top_frame, text="暂停索引", command=self.toggle_indexing_pause)
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        # 内容索引开关（下次更新索引时生效）；后台服务自行决定是否建立内容索引
+        self.content_var = tk.BooleanVar(value=self.index_engine.index_content)
+        ttk.Checkbutton(top_frame, text="内容索引", variable=self.content_var, command=self.toggle_content_index,
+                        state=tk.DISABLED if self.daemon else tk.NORMAL).pack(side=tk.LEFT, padx=5)
+        
         # 状态栏
         status_frame = ttk.Frame(self.root, padding=5)
         status_frame.pack(fill=tk.X)
@@ -110,6 +340,21 @@ class QuickFile:
         
         self.progress = ttk.Progressbar(status_frame, mode="indeterminate", length=200)
         
+        # 命令输出面板（先放在底部，结果区域占据剩余空间）
+        output_frame = ttk.LabelFrame(self.root, text="命令输出")
+        output_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+        output_btn_frame = ttk.Frame(output_frame)
+        output_btn_frame.pack(fill=tk.X, padx=5, pady=2)
+        self.jobs_var = tk.StringVar(value="没有正在运行的命令")
+        ttk.Label(output_btn_frame, textvariable=self.jobs_var).pack(side=tk.LEFT)
+        ttk.Button(output_btn_frame, text="清空", command=self.clear_output).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(output_btn_frame, text="停止全部", command=self.runner.cancel_all).pack(side=tk.RIGHT, padx=2)
+        self.output_text = scrolledtext.ScrolledText(output_frame, height=8, font=("Consolas", 9), state=tk.DISABLED)
+        self.output_text.pack(fill=tk.X, padx=5, pady=5)
+        self.output_text.tag_configure("stderr", foreground="red")
+        self.output_text.tag_configure("info", foreground="blue")
+        self.root.after(100, self.drain_output)
+        
         # 结果显示区域
         results_frame = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         results_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -144,207 +389,85 @@ class QuickFile:
         right_frame = ttk.LabelFrame(results_frame, text="搜索结果")
         results_frame.add(right_frame, weight=3)
         
-        columns = ("name", "type", "path", "info")
-        self.results_tree = ttk.Treeview(right_frame, columns=columns, show="headings")
-        self.results_tree.heading("name", text="名称")
-        self.results_tree.heading("type", text="类型")
-        self.results_tree.heading("path", text="路径/命令")
-        self.results_tree.heading("info", text="信息")
-        
-        self.results_tree.column("name", width=150)
-        self.results_tree.column("type", width=80, anchor=tk.CENTER)
-        self.results_tree.column("path", width=300)
-        self.results_tree.column("info", width=120)
-        
-        self.results_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.results_tree.bind("<Double-1>", self.on_double_click)
-        self.results_tree.bind("<Return>", self.on_double_click)
-        self.results_tree.bind("<Up>", self.on_tree_key)
-        self.results_tree.bind("<Down>", self.on_tree_key)
+        columns = [("name", "名称", 150, tk.W), ("type", "类型", 80, tk.CENTER),
+                   ("path", "路径/命令", 300, tk.W), ("info", "信息", 120, tk.W)]
+        self.results_view = VirtualResultList(right_frame, columns, on_activate=self.open_result,
+                                              on_view_change=self.on_results_scroll)
+        self.results_view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # 更新UI数据
         self.update_workspace_display()
         self.update_history_display()
     
     # 索引管理功能
-    def load_file_index(self):
-        """加载文件索引"""
-        try:
-            if os.path.exists(self.index_file):
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    self.file_index = json.load(f)
-                self.status_var.set(f"已加载文件索引，包含 {len(self.file_index)} 个文件")
-        except Exception as e:
-            print(f"加载文件索引失败: {e}")
-            self.file_index = {}
-    
-    def load_apps_index(self):
-        """加载应用程序索引"""
-        try:
-            if os.path.exists(self.apps_file):
-                with open(self.apps_file, 'r', encoding='utf-8') as f:
-                    self.apps_index = json.load(f)
-                self.status_var.set(f"已加载应用索引，包含 {len(self.apps_index)} 个应用")
-        except Exception as e:
-            print(f"加载应用索引失败: {e}")
-            self.apps_index = {}
-    
-    def save_file_index(self):
-        """保存文件索引"""
-        try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(self.file_index, f, ensure_ascii=False, indent=2)
-            self.status_var.set(f"文件索引已保存，包含 {len(self.file_index)} 个文件")
-        except Exception as e:
-            print(f"保存文件索引失败: {e}")
-    
-    def save_apps_index(self):
-        """保存应用程序索引"""
-        try:
-            with open(self.apps_file, 'w', encoding='utf-8') as f:
-                json.dump(self.apps_index, f, ensure_ascii=False, indent=2)
-            self.status_var.set(f"应用索引已保存，包含 {len(self.apps_index)} 个应用")
-        except Exception as e:
-            print(f"保存应用索引失败: {e}")
-    
-    def start_indexing(self):
-        """启动索引线程"""
-        self.status_var.set("正在建立索引...")
+    def start_indexing(self, incremental=False):
+        """启动索引线程（连接后台服务时交给服务更新）"""
+        if self.daemon:
+            try:
+                started = self.daemon.request("index", incremental=incremental)["started"]
+                self.status_var.set("后台服务正在更新索引..." if started else "后台服务的索引正在进行中...")
+            except Exception as e:
+                messagebox.showerror("错误", f"请求后台服务更新索引失败: {e}")
+            return
+        if getattr(self, "index_thread", None) and self.index_thread.is_alive():
+            self.status_var.set("索引正在进行中...")
+            return
+        self.status_var.set("正在更新索引..." if incremental else "正在建立索引...")
         self.progress.start()
-        self.index_thread = threading.Thread(target=self.build_all_indexes)
+        self.index_thread = threading.Thread(target=self.build_all_indexes, args=(incremental,))
         self.index_thread.daemon = True
         self.index_thread.start()
     
-    def build_all_indexes(self):
-        """构建所有索引"""
-        start_time = time.time()
-        
-        # 构建文件索引
-        self.build_file_index()
-        self.save_file_index()
-        
-        # 构建应用程序索引
-        self.build_apps_index()
-        self.save_apps_index()
-        
-        end_time = time.time()
-        self.progress.stop()
-        self.status_var.set(f"索引完成，共耗时 {end_time - start_time:.2f} 秒")
+    def build_all_indexes(self, incremental=False):
+        """在后台线程中构建所有索引"""
+        self.index_engine.build_all_indexes(incremental)
+        self.root.after(0, self.progress.stop)
+        self.watcher.start()
     
-    def build_file_index(self):
-        """构建文件索引"""
-        count = 0
-        self.file_index = {}
-        
-        # 获取所有磁盘驱动器
-        if os.name == 'nt':  # Windows系统
-            import win32api
-            drives = win32api.GetLogicalDriveStrings()
-            drives = drives.split('\000')[:-1]
-        else:  # Linux/Unix/Mac系统
-            drives = ['/']
-        
-        for drive in drives:
+    def toggle_indexing_pause(self):
+        """暂停或继续正在进行的索引"""
+        if self.daemon:
+            paused = self.pause_btn.cget("text") == "继续索引"
             try:
-                for root, dirs, files in os.walk(drive):
-                    # 排除系统目录
-                    dirs[:] = [d for d in dirs if d not in self.excluded_dirs and not d.startswith('.')]
-                    
-                    for file in files:
-                        # 排除特定扩展名的文件
-                        ext = os.path.splitext(file)[1].lower()
-                        if ext in self.excluded_extensions:
-                            continue
-                        
-                        file_path = os.path.join(root, file)
-                        # 排除大文件和无法访问的文件
-                        try:
-                            if os.path.getsize(file_path) > 1024 * 1024 * 100:  # 大于100MB
-                                continue
-                        except (PermissionError, OSError):
-                            continue
-                        
-                        # 更新索引
-                        if file not in self.file_index:
-                            self.file_index[file] = []
-                        self.file_index[file].append(file_path)
-                        
-                        count += 1
-                        if count % 1000 == 0:
-                            self.status_var.set(f"已索引 {count} 个文件...")
+                self.daemon.request("resume" if paused else "pause")
             except Exception as e:
-                print(f"索引 {drive} 时出错: {e}")
-    
-    def build_apps_index(self):
-        """构建应用程序索引"""
-        self.apps_index = {}
-        count = 0
-        
-        if platform.system() == "Windows":
-            # Windows应用程序搜索
-            app_dirs = [
-                os.path.join(os.environ["ProgramFiles"], "Common Files"),
-                os.path.join(os.environ["ProgramFiles"]),
-                os.path.join(os.environ.get("ProgramFiles(x86)", "")),
-                os.path.join(os.environ["LOCALAPPDATA"], "Programs")
-            ]
-            
-            for app_dir in app_dirs:
-                if not os.path.exists(app_dir):
-                    continue
-                
-                try:
-                    for root, dirs, files in os.walk(app_dir):
-                        for file in files:
-                            if file.endswith(".exe") or file.endswith(".lnk"):
-                                app_name = os.path.splitext(file)[0]
-                                app_path = os.path.join(root, file)
-                                
-                                if app_name not in self.apps_index:
-                                    self.apps_index[app_name] = app_path
-                                    count += 1
-                except Exception as e:
-                    print(f"索引应用程序时出错: {e}")
-        
-        elif platform.system() == "Darwin":  # macOS
-            # macOS应用程序搜索
-            app_dirs = ["/Applications", os.path.expanduser("~/Applications")]
-            
-            for app_dir in app_dirs:
-                if not os.path.exists(app_dir):
-                    continue
-                
-                try:
-                    for app in os.listdir(app_dir):
-                        if app.endswith(".app"):
-                            app_name = os.path.splitext(app)[0]
-                            app_path = os.path.join(app_dir, app)
-                            
-                            if app_name not in self.apps_index:
-                                self.apps_index[app_name] = app_path
-                                count += 1
-                except Exception as e:
-                    print(f"索引应用程序时出错: {e}")
-        
-        else:  # Linux
-            # Linux应用程序搜索
-            app_dirs = ["/usr/bin", "/bin", "/usr/local/bin"]
-            
-            for app_dir in app_dirs:
-                if not os.path.exists(app_dir):
-                    continue
-                
-                try:
-                    for app in os.listdir(app_dir):
-                        app_path = os.path.join(app_dir, app)
-                        if os.path.isfile(app_path) and os.access(app_path, os.X_OK):
-                            if app not in self.apps_index:
-                                self.apps_index[app] = app_path
-                                count += 1
-                except Exception as e:
-                    print(f"索引应用程序时出错: {e}")
-        
-        self.status_var.set(f"已索引 {count} 个应用程序")
+                messagebox.showerror("错误", f"请求后台服务失败: {e}")
+                return
+            self.pause_btn.config(text="暂停索引" if paused else "继续索引")
+            return
+        governor = self.index_engine.governor
+        if governor.is_paused():
+            governor.resume()
+            self.pause_btn.config(text="暂停索引")
+            if getattr(self, "index_thread", None) and self.index_thread.is_alive():
+                self.progress.start()
+        else:
+            governor.pause()
+            self.pause_btn.config(text="继续索引")
+            self.progress.stop()
+    
+    def toggle_content_index(self):
+        """打开或关闭内容索引，打开时提示更新索引"""
+        self.index_engine.index_content = self.content_var.get()
+        if self.index_engine.index_content:
+            self.set_status("已打开内容索引，下次更新索引时建立")
+        else:
+            self.set_status("已关闭内容索引，已有的内容索引仍可搜索")
+    
+    def on_close(self):
+        """关闭窗口：停止监视并保存实时更新过的索引"""
+        self.runner.cancel_all()
+        self.watcher.stop()
+        self.typeahead.stop()
+        self.revalidator.shutdown()
+        if self.daemon:
+            self.daemon.close()
+        elif self.index_engine.dirty:
+            self.index_engine.save_file_index()
+        metrics.write(self.metrics_file)
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        self.root.destroy()
     
     # 工作区管理功能
     def load_workspaces(self):
@@ -356,6 +479,7 @@ class QuickFile:
         except Exception as e:
             print(f"加载工作区配置失败: {e}")
             self.workspaces = {}
+        self.search_engine.workspaces = self.workspaces
     
     def save_workspaces(self):
         """保存工作区配置"""
@@ -395,15 +519,12 @@ class QuickFile:
     
     def add_to_workspace(self):
         """将选中项添加到工作区"""
-        selection = self.results_tree.selection()
-        if not selection:
+        item = self.results_view.selected_item()
+        if item is None:
             messagebox.showinfo("提示", "请先选择要添加的项目")
             return
         
-        item = self.results_tree.item(selection[0])
-        item_type = item['values'][1]
-        item_name = item['values'][0]
-        item_path = item['values'][2]
+        item_name, item_type, item_path = item[0], item[1], item[2]
         
         # 选择工作区
         ws_name = tk.simpledialog.askstring("添加到工作区", "请输入工作区名称:")
@@ -430,15 +551,9 @@ class QuickFile:
             ws_name = self.workspace_listbox.get(selection[0])
             items = self.workspaces.get(ws_name, [])
             
-            # 清空现有结果
-            for item in self.results_tree.get_children():
-                self.results_tree.delete(item)
-            
-            # 添加工作区项目
-            for item in items:
-                self.results_tree.insert("", tk.END, values=(
-                    item['name'], item['type'], item['path'], "工作区项目"
-                ))
+            # 显示工作区项目
+            self.search_results = [(item['name'], item['type'], item['path'], "工作区项目") for item in items]
+            self.results_view.set_items(self.search_results)
             
             self.status_var.set(f"已加载工作区 '{ws_name}'，包含 {len(items)} 个项目")
     
@@ -452,6 +567,7 @@ class QuickFile:
         except Exception as e:
             print(f"加载自定义命令失败: {e}")
             self.custom_commands = {}
+        self.search_engine.custom_commands = self.custom_commands
     
     def save_custom_commands(self):
         """保存自定义命令"""
@@ -487,6 +603,19 @@ class QuickFile:
             self.history_listbox.insert(tk.END, item)
     
     # 搜索功能
+    def on_type(self, event=None):
+        """输入变化时提交后台搜索（边输入边搜索）"""
+        query = self.search_var.get().strip()
+        if query == self.last_submitted and event is not None:
+            return
+        self.last_submitted = query
+        if not query:
+            self.search_results = []
+            self.display_results()
+            self.status_var.set("准备就绪")
+            return
+        self.typeahead.submit(query, self.search_type.get())
+    
     def on_search(self, event=None):
         """处理搜索请求"""
         query = self.search_var.get().strip()
@@ -502,102 +631,65 @@ class QuickFile:
         self.save_history()
         self.update_history_display()
         
-        # 执行搜索
+        # 在后台线程执行搜索，结果由 on_search_results 显示
+        metrics.inc("quickfile_ui_searches_total", 1, "在界面中按回车或点击搜索的次数")
         self.status_var.set(f"正在搜索 '{query}'...")
-        self.root.update()
-        self.search_results = []
-        search_type = self.search_type.get()
-        
-        # 模糊搜索
-        pattern = '.*?'.join(map(re.escape, query))
-        regex = re.compile(pattern, re.IGNORECASE)
-        
-        # 根据搜索类型执行不同搜索
-        if search_type in ["all", "file"]:
-            # 搜索文件
-            for filename, paths in self.file_index.items():
-                if regex.search(filename):
-                    for path in paths:
-                        try:
-                            stat = os.stat(path)
-                            size = self.format_size(stat.st_size)
-                            modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M')
-                            self.search_results.append((filename, "文件", path, f"{size} | {modified}"))
-                        except (PermissionError, OSError):
-                            continue
-        
-        if search_type in ["all", "app"]:
-            # 搜索应用程序
-            for app_name, app_path in self.apps_index.items():
-                if regex.search(app_name):
-                    info = "应用程序"
-                    if platform.system() == "Windows" and app_path.endswith(".lnk"):
-                        info = "快捷方式"
-                    self.search_results.append((app_name, "应用", app_path, info))
-        
-        if search_type in ["all", "workspace"]:
-            # 搜索工作区
-            for ws_name, items in self.workspaces.items():
-                if regex.search(ws_name):
-                    self.search_results.append((ws_name, "工作区", ws_name, f"{len(items)} 个项目"))
-        
-        if search_type in ["all", "command"]:
-            # 搜索自定义命令
-            for cmd_name, cmd_data in self.custom_commands.items():
-                if regex.search(cmd_name):
-                    cmd_type = cmd_data.get("type", "未知")
-                    cmd_desc = cmd_data.get("description", "")
-                    self.search_results.append((cmd_name, "命令", cmd_data["command"], f"{cmd_type} | {cmd_desc}"))
-        
-        # 按匹配度排序
-        self.search_results.sort(key=lambda x: self.match_score(x[0], query), reverse=True)
-        
-        # 显示结果
-        self.display_results()
-        self.status_var.set(f"搜索完成，找到 {len(self.search_results)} 个结果")
+        self.last_submitted = query
+        self.typeahead.submit(query, self.search_type.get(), immediate=True)
     
-    def match_score(self, text, query):
-        """计算文本与查询的匹配度"""
-        text_lower = text.lower()
-        query_lower = query.lower()
-        
-        # 完全匹配得高分
-        if text_lower == query_lower:
-            return 100
-        
-        # 前缀匹配次之
-        if text_lower.startswith(query_lower):
-            return 80
-        
-        # 包含匹配再次之
-        if query_lower in text_lower:
-            return 60
-        
-        # 模糊匹配得分更低
-        pattern = '.*?'.join(map(re.escape, query_lower))
-        if re.search(pattern, text_lower):
-            return 40
-        
-        return 0
+    def on_search_results(self, query, search_type, results, total):
+        """后台搜索完成（在搜索线程中调用），切回主线程显示"""
+        self.root.after(0, self.show_search_results, query, search_type, results, total)
     
-    def format_size(self, size_bytes):
-        """格式化文件大小显示"""
-        units = ['B', 'KB', 'MB', 'GB', 'TB']
-        unit_index = 0
-        while size_bytes >= 1024 and unit_index < len(units) - 1:
-            size_bytes /= 1024
-            unit_index += 1
-        return f"{size_bytes:.2f} {units[unit_index]}"
+    def on_search_error(self, query, message):
+        """查询语法有误（在搜索线程中调用），保留当前结果，只在状态栏提示"""
+        self.root.after(0, self.show_search_error, query, message)
+    
+    def show_search_error(self, query, message):
+        if query == self.search_var.get().strip():
+            self.status_var.set(f"查询有误: {message}")
+    
+    def show_search_results(self, query, search_type, results, total):
+        """显示搜索结果；输入已经改变时丢弃过期的结果"""
+        if query != self.search_var.get().strip() or search_type != self.search_type.get():
+            return
+        self.search_results = results
+        self.display_results()
+        if total > len(results):
+            self.status_var.set(f"搜索完成，找到 {total} 个结果，显示最匹配的 {len(results)} 个")
+        else:
+            self.status_var.set(f"搜索完成，找到 {total} 个结果")
     
     def display_results(self):
-        """显示搜索结果"""
-        # 清空现有结果
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
-        
-        # 添加新结果
-        for result in self.search_results:
-            self.results_tree.insert("", tk.END, values=result)
+        """显示搜索结果（虚拟列表只显示可见的一屏）"""
+        with metrics.timer("quickfile_ui_render_seconds", "显示搜索结果的耗时"):
+            self.results_view.set_items(self.search_results)
+    
+    def on_results_scroll(self):
+        """结果列表可见范围变化：稍后重新验证可见的文件"""
+        if self.revalidate_results and not self.revalidate_pending:
+            self.revalidate_pending = True
+            self.root.after(100, self.revalidate_visible)
+    
+    def revalidate_visible(self):
+        """把结果列表中当前可见的文件交给后台线程池重新 stat"""
+        self.revalidate_pending = False
+        paths = [item[2] for item in self.results_view.visible_items() if item[1] == "文件"]
+        if paths:
+            self.revalidator.submit(paths)
+    
+    def on_file_revalidated(self, path, stats):
+        """后台验证完成（在线程池中调用），切回主线程更新结果"""
+        self.root.after(0, self.update_file_result, path, stats)
+    
+    def update_file_result(self, path, stats):
+        """用验证结果更新可见范围内的结果：已消失的文件直接移除"""
+        view = self.results_view
+        for index in view.visible_range():
+            item = view.items[index]
+            if item[1] == "文件" and item[2] == path:
+                view.replace_item(index, None if stats is None else item[:3] + (format_file_info(*stats),))
+                return
     
     # 交互功能
     def on_history_select(self, event):
@@ -608,70 +700,34 @@ class QuickFile:
             self.search_var.set(query)
             self.on_search()
     
-    def on_double_click(self, event):
-        """处理双击结果项"""
-        selection = self.results_tree.selection()
-        if selection:
-            item = self.results_tree.item(selection[0])
-            item_type = item['values'][1]
-            item_path = item['values'][2]
-            
-            if item_type == "文件":
-                self.open_file(item_path)
-            elif item_type == "应用":
-                self.launch_application(item_path)
-            elif item_type == "工作区":
-                self.on_workspace_select(None)
-            elif item_type == "命令":
-                self.execute_command(item_path)
-    
-    def on_tree_key(self, event):
-        """处理结果树中的上下方向键"""
-        selection = self.results_tree.selection()
-        if not selection:
-            if event.keysym == "Down":
-                try:
-                    first_item = self.results_tree.get_children()[0]
-                    self.results_tree.selection_set(first_item)
-                    self.results_tree.see(first_item)
-                except IndexError:
-                    pass
-            return "break"
-        
-        current_item = selection[0]
-        children = self.results_tree.get_children()
-        current_index = children.index(current_item)
-        
-        if event.keysym == "Up" and current_index > 0:
-            new_index = current_index - 1
-        elif event.keysym == "Down" and current_index < len(children) - 1:
-            new_index = current_index + 1
-        else:
-            return "break"
-        
-        new_item = children[new_index]
-        self.results_tree.selection_set(new_item)
-        self.results_tree.see(new_item)
-        return "break"
+    def open_result(self, item):
+        """打开结果项（双击或回车）"""
+        item_type = item[1]
+        item_path = item[2]
+        self.search_engine.launch_history.record(item_path)
+        
+        if item_type == "文件":
+            self.open_file(item_path)
+        elif item_type == "应用":
+            self.launch_application(item_path)
+        elif item_type == "工作区":
+            self.on_workspace_select(None)
+        elif item_type == "命令":
+            self.execute_command(item_path)
     
     def focus_results(self, event):
         """将焦点从搜索框转移到结果列表"""
         if self.search_results:
-            self.results_tree.focus_set()
-            first_item = self.results_tree.get_children()[0]
-            self.results_tree.selection_set(first_item)
-            self.results_tree.see(first_item)
+            self.results_view.focus_set()
+            self.results_view.select(0)
         return "break"
     
     # 执行功能
     def open_file(self, file_path):
-        """打开文件"""
+        """打开文件（不等待打开程序退出）"""
         try:
             if os.path.exists(file_path):
-                if platform.system() == "Windows":
-                    os.startfile(file_path)
-                else:
-                    subprocess.run(['open' if platform.system() == "Darwin" else 'xdg-open', file_path])
+                open_path(file_path)
                 self.status_var.set(f"已打开: {file_path}")
             else:
                 messagebox.showerror("错误", f"文件不存在: {file_path}")
@@ -681,7 +737,7 @@ class QuickFile:
             self.status_var.set("打开文件失败")
     
     def launch_application(self, app_path):
-        """启动应用程序"""
+        """启动应用程序（与启动器分离，不继承输出管道）"""
         try:
             if platform.system() == "Windows":
                 # 处理快捷方式
@@ -692,8 +748,13 @@ class QuickFile:
                     app_path = shortcut.TargetPath
                 
                 os.startfile(app_path)
+            elif platform.system() == "Darwin":
+                launch_detached(["open", app_path])
+            elif app_path.endswith(".desktop"):
+                # 按 .desktop 中的 Exec 启动
+                launch_detached(launch_command(app_path))
             else:
-                subprocess.Popen([app_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                launch_detached([app_path])
             
             self.status_var.set(f"已启动应用: {os.path.basename(app_path)}")
         except Exception as e:
@@ -701,22 +762,76 @@ class QuickFile:
             self.status_var.set("启动应用失败")
     
     def execute_command(self, command):
-        """执行命令"""
+        """在后台执行命令，输出实时显示在命令输出面板中"""
+        timeout = self.command_timeout
+        for cmd_data in self.custom_commands.values():
+            if cmd_data.get("command") == command and cmd_data.get("timeout"):
+                timeout = float(cmd_data["timeout"])
+                break
+        job = self.runner.run(command, timeout=timeout)
+        self.append_output(f"[#{job.id}] $ {command}\n", "info")
+        self.status_var.set(f"正在执行: {command}")
+        self.update_jobs_label()
+    
+    def on_command_output(self, job, stream, text):
+        """命令有新输出（在后台线程中调用）"""
+        self.output_queue.put((job, stream, text))
+    
+    def on_command_exit(self, job):
+        """命令结束（在后台线程中调用）"""
+        self.output_queue.put((job, None, None))
+    
+    def drain_output(self):
+        """定期把后台命令的输出批量写入面板，避免每段输出都触发一次界面更新"""
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            if result.returncode == 0:
-                self.status_var.set(f"命令执行成功: {command}")
-                if result.stdout:
-                    print(f"命令输出:\n{result.stdout}")
-            else:
-                self.status_var.set(f"命令执行失败: {command}")
-                if result.stderr:
-                    print(f"错误信息:\n{result.stderr}")
-        except Exception as e:
-            messagebox.showerror("错误", f"执行命令失败: {e}")
-            self.status_var.set("执行命令失败")
+            chunks = []
+            while True:
+                try:
+                    job, stream, text = self.output_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if stream is not None:
+                    chunks.append((text, "stderr" if stream == "stderr" else ()))
+                    continue
+                chunks.append((f"[#{job.id}] {job.status()}\n", "info"))
+                self.status_var.set(f"命令{job.status()}: {job.command}")
+                self.update_jobs_label()
+            if chunks:
+                self.output_text.config(state=tk.NORMAL)
+                for text, tag in chunks:
+                    self.output_text.insert(tk.END, text, tag)
+                # 只保留最近的若干行
+                lines = int(self.output_text.index("end-1c").split(".")[0])
+                if lines > self.max_output_lines:
+                    self.output_text.delete("1.0", f"{lines - self.max_output_lines + 1}.0")
+                self.output_text.see(tk.END)
+                self.output_text.config(state=tk.DISABLED)
+        finally:
+            self.root.after(100, self.drain_output)
+    
+    def append_output(self, text, tag=()):
+        """在命令输出面板末尾追加文字"""
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.insert(tk.END, text, tag)
+        self.output_text.see(tk.END)
+        self.output_text.config(state=tk.DISABLED)
+    
+    def clear_output(self):
+        """清空命令输出面板"""
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete("1.0", tk.END)
+        self.output_text.config(state=tk.DISABLED)
+    
+    def update_jobs_label(self):
+        """显示正在运行的命令数"""
+        count = len(self.runner.running())
+        self.jobs_var.set(f"{count} 个命令正在运行" if count else "没有正在运行的命令")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # 命令行模式：quickfile.py index / quickfile.py search <关键词>
+        from quickfile_core.cli import main
+        sys.exit(main())
     root = tk.Tk()
     app = QuickFile(root)
     root.mainloop()    
\ No newline at end of file
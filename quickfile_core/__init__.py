@@ -0,0 +1,9 @@
+"""QuickFile 核心：索引与搜索逻辑，不依赖 tkinter。"""
+
+from .engine import IndexEngine
+from .search import SearchEngine, TypeaheadSearcher
+from .revalidate import Revalidator
+from .watcher import IndexWatcher
+from .runner import CommandRunner
+
+__all__ = ["IndexEngine", "SearchEngine", "TypeaheadSearcher", "Revalidator", "IndexWatcher", "CommandRunner"]
@@ -0,0 +1,421 @@
+"""应用程序索引
+
+应用来源按优先级排列，同名应用以先出现的为准：
+
+    Linux     XDG 数据目录中的 .desktop 文件（$XDG_DATA_HOME、$XDG_DATA_DIRS 下的 applications），
+              然后是 $PATH 与 /usr/bin 等目录中的可执行文件
+    macOS     /Applications 等目录中的 .app，然后是 $PATH 中的可执行文件
+    Windows   开始菜单中的快捷方式、Program Files 中的 .exe/.lnk，然后是 %PATH% 中的 .exe
+
+指向同一真实目录的来源（例如 /bin → /usr/bin）只扫描一次。每个目录记录 mtime_ns，
+重建时 mtime 未变的目录直接沿用上次的结果，只重新读取变化的目录；.desktop 文件另按文件的 mtime
+判断是否需要重新解析（原地修改文件不会改变目录的 mtime）。目录的读取与 .desktop 的解析在线程池中并行进行。
+
+结果与目录缓存一起写入 apps_index.bin（与文件索引相同的分段格式，magic 不同）：
+
+    APPNAME   应用名字符串表（去重后的最终结果，启动时只读取这几段）
+    APPPATH   应用路径
+    APPKEYW   应用的关键词（以 ; 分隔，来自 .desktop 的 Keywords、GenericName 与命令名）
+    APPICON   应用图标（.desktop 的 Icon）
+    DIRPATH   扫描过的目录
+    DIRKIND   目录类型 (u8，见 KINDS)
+    DIRPRNT   父目录编号 (i32，-1 表示来源的根目录)
+    DIRMTIM   目录的 mtime_ns (i64)
+    DIRENTS   每个目录的条目在 ENT* 段中的起始位置 (u32，共 目录数+1 个)
+    ENTNAME   条目的应用名（空字符串表示隐藏的 .desktop，只用于覆盖同 ID 的条目）
+    ENTFILE   条目的文件名
+    ENTKEYW   条目的关键词
+    ENTICON   条目的图标
+    ENTCMD    .desktop 条目 Exec 中的命令名（同名的可执行文件不再单独列出）
+    ENTMTIM   .desktop 文件的 mtime_ns (i64)
+"""
+
+import os
+import shlex
+import shutil
+import platform
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from . import store
+
+
+APPS_MAGIC = b"QFAPPS\0\0"
+APPS_VERSION = 1
+
+KINDS = ("exec", "desktop", "bundle", "windows")
+FIELD_CODES = {"%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%i", "%c", "%k", "%v", "%m"}
+
+
+class AppDir:
+    """扫描过的一个目录及其中的应用条目"""
+
+    def __init__(self, path, kind, mtime_ns, entries, subdirs):
+        self.path = path
+        self.kind = kind
+        self.mtime_ns = mtime_ns
+        self.entries = entries      # [(应用名, 文件名, 关键词, 图标, 命令名, mtime_ns)]
+        self.subdirs = subdirs      # 需要继续扫描的子目录名
+        self.parent = -1
+        self.prefix = ""            # .desktop 文件 ID 的前缀（子目录名以 - 连接）
+        self.order = 0              # 所属来源的序号
+
+
+def _locale_suffixes():
+    """当前语言对应的 .desktop 本地化键后缀，例如 zh_CN.UTF-8 → ["zh_CN", "zh"]"""
+    for name in ("LC_ALL", "LC_MESSAGES", "LANG"):
+        value = os.environ.get(name)
+        if value:
+            break
+    else:
+        return []
+    value = value.split(".")[0].split("@")[0]
+    if not value or value in ("C", "POSIX"):
+        return []
+    suffixes = [value]
+    if "_" in value:
+        suffixes.append(value.split("_")[0])
+    return suffixes
+
+
+def _unescape(value):
+    """处理 .desktop 值中的 \\s \\n \\t \\r \\\\ 转义"""
+    if "\\" not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            char = {"s": " ", "n": "\n", "t": "\t", "r": "\r", "\\": "\\"}.get(next(chars, ""), "")
+        result.append(char)
+    return "".join(result)
+
+
+def read_desktop_entry(path):
+    """读取 .desktop 文件中 [Desktop Entry] 组的键值（本地化的键保留 Name[zh_CN] 形式）"""
+    entry = {}
+    in_group = False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("["):
+                if in_group:
+                    break
+                in_group = line == "[Desktop Entry]"
+                continue
+            if in_group and "=" in line:
+                key, value = line.split("=", 1)
+                entry.setdefault(key.strip(), _unescape(value.strip()))
+    return entry
+
+
+def _localized(entry, key, suffixes):
+    for suffix in suffixes:
+        value = entry.get(f"{key}[{suffix}]")
+        if value:
+            return value
+    return entry.get(key, "")
+
+
+def _split_list(value):
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+
+def desktop_command(entry):
+    """把 Exec 转为参数列表，去掉 %f、%U 等字段代码"""
+    try:
+        args = shlex.split(entry.get("Exec", ""))
+    except ValueError:
+        return []
+    command = []
+    for arg in args:
+        if arg in FIELD_CODES:
+            if arg == "%i" and entry.get("Icon"):
+                command.extend(["--icon", entry["Icon"]])
+            elif arg == "%c" and entry.get("Name"):
+                command.append(entry["Name"])
+            continue
+        command.append(arg.replace("%%", "%"))
+    return command
+
+
+def parse_desktop_file(path, suffixes, mtime_ns=0):
+    """解析一个 .desktop 文件，返回条目元组；不应显示的应用名称为空字符串"""
+    filename = os.path.basename(path)
+    hidden = ("", filename, "", "", "", mtime_ns)
+    try:
+        entry = read_desktop_entry(path)
+    except OSError:
+        return hidden
+    if entry.get("Type", "Application") != "Application":
+        return hidden
+    if entry.get("Hidden") == "true" or entry.get("NoDisplay") == "true":
+        return hidden
+    if entry.get("OnlyShowIn") or entry.get("NotShowIn"):
+        desktops = set(_split_list(os.environ.get("XDG_CURRENT_DESKTOP", "")))
+        only = _split_list(entry.get("OnlyShowIn", ""))
+        if (only and not desktops.intersection(only)) or desktops.intersection(_split_list(entry.get("NotShowIn", ""))):
+            return hidden
+    try_exec = entry.get("TryExec")
+    if try_exec and not shutil.which(try_exec):
+        return hidden
+    command = desktop_command(entry)
+    if not command:
+        return hidden
+
+    name = _localized(entry, "Name", suffixes)
+    if not name:
+        return hidden
+    keywords = _split_list(_localized(entry, "Keywords", suffixes))
+    for value in (entry.get("Name", ""), _localized(entry, "GenericName", suffixes)):
+        if value and value != name and value not in keywords:
+            keywords.append(value)
+    command_name = os.path.basename(command[0])
+    return (name, filename, ";".join(keywords), entry.get("Icon", ""), command_name, mtime_ns)
+
+
+def launch_command(path):
+    """返回启动某个 .desktop 应用的参数列表（Terminal=true 时在终端模拟器中运行）"""
+    entry = read_desktop_entry(path)
+    command = desktop_command(entry)
+    if not command:
+        raise ValueError(f"{os.path.basename(path)} 中没有可执行的命令")
+    if entry.get("Terminal") == "true":
+        terminal = shutil.which("x-terminal-emulator") or shutil.which("xterm")
+        if terminal:
+            command = [terminal, "-e"] + command
+    return command
+
+
+def _path_dirs():
+    """$PATH 中的目录（忽略相对路径，避免把当前目录中的文件当作应用）"""
+    return [path for path in os.environ.get("PATH", "").split(os.pathsep) if path and os.path.isabs(path)]
+
+
+def app_sources():
+    """当前平台的应用来源 [(目录, 类型, 是否递归)]，按优先级排列"""
+    system = platform.system()
+    if system == "Windows":
+        sources = []
+        for base in (os.environ.get("APPDATA"), os.environ.get("ProgramData")):
+            if base:
+                sources.append((os.path.join(base, "Microsoft", "Windows", "Start Menu", "Programs"),
+                                "windows", True))
+        for base in (os.environ.get("ProgramFiles"), os.environ.get("ProgramFiles(x86)")):
+            if base:
+                sources.append((base, "windows", True))
+        if os.environ.get("LOCALAPPDATA"):
+            sources.append((os.path.join(os.environ["LOCALAPPDATA"], "Programs"), "windows", True))
+        sources.extend((path, "windows", False) for path in _path_dirs())
+        return sources
+
+    if system == "Darwin":
+        sources = [(path, "bundle", False) for path in
+                   ("/Applications", os.path.expanduser("~/Applications"), "/System/Applications")]
+    else:
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        sources = [(os.path.join(path, "applications"), "desktop", True)
+                   for path in [data_home] + data_dirs.split(":") if path]
+    sources.extend((path, "exec", False) for path in _path_dirs())
+    sources.extend((path, "exec", False) for path in ("/usr/local/bin", "/usr/bin", "/bin"))
+    return sources
+
+
+class AppScanner:
+    """增量扫描应用来源：mtime 未变的目录沿用缓存，变化的目录在线程池中重新读取"""
+
+    def __init__(self, sources=None, workers=None):
+        self.sources = sources if sources is not None else app_sources()
+        self.workers = workers or min(8, (os.cpu_count() or 1) + 2)
+        self.suffixes = _locale_suffixes()
+        self.rescanned = 0          # 本次重新读取的目录数
+        self.reparsed = 0           # 本次重新解析的 .desktop 文件数
+
+    def scan(self, cache=None):
+        """扫描所有来源，返回按优先级排列的 AppDir 列表；cache 为上次的 {目录: AppDir}"""
+        cache = cache or {}
+        self.rescanned = self.reparsed = 0
+        frontier = []
+        seen = set()
+        for order, (path, kind, recursive) in enumerate(self.sources):
+            real_path = os.path.realpath(path)
+            if real_path in seen:
+                continue
+            seen.add(real_path)
+            frontier.append((path, kind, recursive, order, -1, ""))
+
+        dirs = []
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="quickfile-apps") as pool:
+            while frontier:
+                results = pool.map(lambda item: self.visit(item[0], item[1], item[2], cache.get(item[0])), frontier)
+                next_frontier = []
+                for (path, kind, recursive, order, parent, prefix), app_dir in zip(frontier, results):
+                    if app_dir is None:
+                        continue
+                    app_dir.parent, app_dir.prefix, app_dir.order = parent, prefix, order
+                    dirs.append(app_dir)
+                    for name in app_dir.subdirs:
+                        next_frontier.append((os.path.join(path, name), kind, recursive, order, len(dirs) - 1,
+                                              prefix + name + "-"))
+                frontier = next_frontier
+        # 广度优先遍历打乱了来源之间的顺序，按来源重新排列（排序是稳定的，父目录仍在子目录之前）
+        order = sorted(range(len(dirs)), key=lambda index: dirs[index].order)
+        position = {old: new for new, old in enumerate(order)}
+        dirs = [dirs[index] for index in order]
+        for app_dir in dirs:
+            if app_dir.parent >= 0:
+                app_dir.parent = position[app_dir.parent]
+        return dirs
+
+    def visit(self, path, kind, recursive, cached):
+        """读取一个目录（mtime 未变时沿用 cached），目录不存在或无法访问时返回 None"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if cached is not None and cached.kind == kind and cached.mtime_ns == mtime_ns:
+            if kind == "desktop":
+                entries = [self.refresh_desktop(path, entry) for entry in cached.entries]
+                return AppDir(path, kind, mtime_ns, entries, cached.subdirs if recursive else [])
+            return AppDir(path, kind, mtime_ns, cached.entries, cached.subdirs if recursive else [])
+
+        self.rescanned += 1
+        old_entries = {entry[1]: entry for entry in cached.entries} if cached is not None else {}
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if kind == "bundle" and entry.name.endswith(".app"):
+                                entries.append((entry.name[:-4], entry.name, "", "", "", 0))
+                            elif recursive:
+                                subdirs.append(entry.name)
+                            continue
+                        if kind == "exec":
+                            st = entry.stat()
+                            if entry.is_file() and st.st_mode & 0o111:
+                                entries.append((entry.name, entry.name, "", "", "", 0))
+                        elif kind == "windows":
+                            if entry.name.lower().endswith((".exe", ".lnk")):
+                                entries.append((os.path.splitext(entry.name)[0], entry.name, "", "", "", 0))
+                        elif kind == "desktop":
+                            if entry.name.endswith(".desktop"):
+                                old = old_entries.get(entry.name) or ("", entry.name, "", "", "", -1)
+                                entries.append(self.refresh_desktop(path, old))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"索引应用程序时出错: {e}")
+        entries.sort(key=lambda entry: entry[1])
+        subdirs.sort()
+        return AppDir(path, kind, mtime_ns, entries, subdirs)
+
+    def refresh_desktop(self, path, entry):
+        """文件的 mtime 变化时重新解析 .desktop 条目"""
+        file_path = os.path.join(path, entry[1])
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        except OSError:
+            return ("",) + entry[1:5] + (-1,)
+        if mtime_ns == entry[5]:
+            return entry
+        self.reparsed += 1
+        return parse_desktop_file(file_path, self.suffixes, mtime_ns)
+
+
+def collect_apps(dirs):
+    """按优先级合并目录中的条目，返回 [(应用名, 路径, 关键词, 图标)]
+
+    同一 .desktop 文件 ID 只取优先级最高的一个（可以被隐藏的条目覆盖），
+    已有 .desktop 条目启动的命令不再作为可执行文件重复列出，而是作为该应用的关键词。
+    """
+    desktop_ids = set()
+    commands = set()
+    for app_dir in dirs:
+        if app_dir.kind == "desktop":
+            commands.update(entry[4] for entry in app_dir.entries if entry[0] and entry[4])
+    names = set()
+    apps = []
+    for app_dir in dirs:
+        for name, filename, keywords, icon, command, _ in app_dir.entries:
+            if app_dir.kind == "desktop":
+                desktop_id = app_dir.prefix + filename
+                if desktop_id in desktop_ids:
+                    continue
+                desktop_ids.add(desktop_id)
+                if command and command != name and command not in keywords.split(";"):
+                    keywords = f"{keywords};{command}" if keywords else command
+            elif app_dir.kind == "exec" and name in commands:
+                continue
+            if not name or name in names:
+                continue
+            names.add(name)
+            apps.append((name, os.path.join(app_dir.path, filename), keywords, icon))
+    return apps
+
+
+def write_apps_index(path, dirs, apps):
+    """写出应用索引文件（结果与目录缓存）"""
+    entries = [entry for app_dir in dirs for entry in app_dir.entries]
+    offsets = array("I", [0])
+    for app_dir in dirs:
+        offsets.append(offsets[-1] + len(app_dir.entries))
+    store.write_sections(path, [
+        ("APPNAME", store._string_table([app[0] for app in apps])),
+        ("APPPATH", store._string_table([app[1] for app in apps])),
+        ("APPKEYW", store._string_table([app[2] for app in apps])),
+        ("APPICON", store._string_table([app[3] for app in apps])),
+        ("DIRPATH", store._string_table([app_dir.path for app_dir in dirs])),
+        ("DIRKIND", array("B", [KINDS.index(app_dir.kind) for app_dir in dirs]).tobytes()),
+        ("DIRPRNT", array("i", [app_dir.parent for app_dir in dirs]).tobytes()),
+        ("DIRMTIM", array("q", [app_dir.mtime_ns for app_dir in dirs]).tobytes()),
+        ("DIRENTS", offsets.tobytes()),
+        ("ENTNAME", store._string_table([entry[0] for entry in entries])),
+        ("ENTFILE", store._string_table([entry[1] for entry in entries])),
+        ("ENTKEYW", store._string_table([entry[2] for entry in entries])),
+        ("ENTICON", store._string_table([entry[3] for entry in entries])),
+        ("ENTCMD", store._string_table([entry[4] for entry in entries])),
+        ("ENTMTIM", array("q", [entry[5] for entry in entries]).tobytes()),
+    ], magic=APPS_MAGIC, version=APPS_VERSION)
+
+
+class AppIndexFile(store.SectionFile):
+    """通过 mmap 打开的应用索引文件"""
+
+    def __init__(self, path):
+        super().__init__(path, APPS_MAGIC, APPS_VERSION)
+
+    def _parse(self):
+        self.names = self.string_table("APPNAME")
+        self.paths = self.string_table("APPPATH")
+        self.keywords = self.string_table("APPKEYW")
+        self.icons = self.string_table("APPICON")
+
+    def apps(self):
+        """返回 [(应用名, 路径, 关键词, 图标)]"""
+        return list(zip(self.names, self.paths, self.keywords, self.icons))
+
+    def dir_cache(self):
+        """读取目录缓存，返回 {目录: AppDir}"""
+        paths = self.string_table("DIRPATH")
+        kinds = self.section("DIRKIND")
+        parents = self.array_section("DIRPRNT", "i")
+        mtimes = self.array_section("DIRMTIM", "q")
+        offsets = self.array_section("DIRENTS", "I")
+        columns = [list(self.string_table(name)) for name in ("ENTNAME", "ENTFILE", "ENTKEYW", "ENTICON", "ENTCMD")]
+        columns.append(list(self.array_section("ENTMTIM", "q")))
+        entries = list(zip(*columns))
+        dirs = []
+        for index, path in enumerate(paths):
+            dirs.append(AppDir(path, KINDS[kinds[index]], mtimes[index],
+                               entries[offsets[index]:offsets[index + 1]], []))
+        for index, app_dir in enumerate(dirs):
+            parent = parents[index]
+            if parent >= 0:
+                dirs[parent].subdirs.append(os.path.basename(app_dir.path))
+        return {app_dir.path: app_dir for app_dir in dirs}
@@ -0,0 +1,86 @@
+"""搜索结果缓存：按估计的内存占用淘汰的 LRU
+
+条目带有版本（索引每次变化版本都会增加），版本与当前不一致的条目视为过期；
+结果随当前时间变化的条目（如 modified:<7d）另有存活时间。
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+from .metrics import metrics
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024   # 默认最多占用的内存（估计值）
+SIZE_SAMPLE = 256                      # 估计大列表的大小时抽样的元素数
+
+
+def estimate_size(value):
+    """粗略估计由列表、元组、字典、字符串、数字与数组组成的值占用的内存（字节）
+
+    大列表按抽样的 SIZE_SAMPLE 个元素的平均大小推算，不逐个计算。
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        size = sys.getsizeof(value)
+        if len(value) <= SIZE_SAMPLE:
+            return size + sum(map(estimate_size, value))
+        sample = value[::len(value) // SIZE_SAMPLE]
+        return size + sum(map(estimate_size, sample)) * len(value) // len(sample)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """按内存占用淘汰的 LRU 缓存 {键: (版本, 值, 估计大小, 过期时间)}
+
+    get 时版本不一致或已过期的条目直接删除；总大小超过 max_bytes 时淘汰最久未使用的条目，
+    单个超过 max_bytes 的值不缓存。多个线程（后台服务的各连接）可以共用。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, generation):
+        """返回缓存的值；没有、版本不一致或已过期时返回 None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != generation or (entry[3] is not None and time.monotonic() >= entry[3]):
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, generation, value, size=None, ttl=None):
+        """缓存一个值；size 为 None 时用 estimate_size 估计，ttl 为存活秒数（None 表示直到版本变化）"""
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (generation, value, size, expires)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, entry = self.entries.popitem(last=False)
+                self.size -= entry[2]
+                metrics.inc("quickfile_search_cache_evictions_total", 1, "因超出内存上限被淘汰的缓存条目数")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
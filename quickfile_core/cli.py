@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import contextlib
+
+from .engine import IndexEngine
+from .search import SearchEngine
+from .query import QueryError, parse_size
+from .segment import DEFAULT_EXCLUDES, DEFAULT_MAX_FILE_SIZE, parse_refresh
+from .watcher import IndexWatcher
+from .governor import parse_idle_window
+from .metrics import metrics, Profiler
+from .daemon import IndexDaemon, DaemonClient, DaemonError, RemoteSearchEngine
+from .utils import load_json, format_file_info, format_size
+
+
+def max_size_arg(text):
+    """--max-size 参数：10mb、1g 等，0 表示不限"""
+    try:
+        return parse_size(text) or None
+    except QueryError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def refresh_arg(text):
+    """--refresh 参数：watch、manual 或间隔秒数"""
+    try:
+        return parse_refresh(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="quickfile", description="QuickFile 命令行工具")
+    parser.add_argument("--data-dir", help="数据目录（默认 ~/.quickfile）")
+    parser.add_argument("--metrics", metavar="文件",
+                        help="结束时把运行指标写入文件（.prom 结尾为 Prometheus 文本格式，否则为 JSON）")
+    parser.add_argument("--metrics-port", type=int, metavar="端口",
+                        help="运行期间在 127.0.0.1 上以 Prometheus 文本格式提供 /metrics")
+    parser.add_argument("--profile", metavar="目录",
+                        help="用 cProfile 与 tracemalloc 采集性能数据，结束时写入该目录")
+    subparsers = parser.add_subparsers(dest="command")
+
+    index_parser = subparsers.add_parser("index", help="建立文件与应用程序索引")
+    index_parser.add_argument("roots", nargs="*",
+                              help="要更新的根目录（默认全部已配置的根目录）；未配置的目录作为新的根目录加入配置")
+    index_parser.add_argument("-j", "--workers", type=int, help="每个根目录的遍历线程数")
+    index_parser.add_argument("-i", "--incremental", action="store_true",
+                              help="增量刷新：只重新扫描发生变化的目录")
+    index_parser.add_argument("-p", "--processes", type=int,
+                              help="多进程分片构建的进程数（按磁盘或顶层子目录分片）")
+    index_parser.add_argument("--shard-timeout", type=float, help="多进程构建时单个分片的最长耗时（秒）")
+    index_parser.add_argument("--restart", action="store_true",
+                              help="忽略上次被中断的构建进度，重新完整构建")
+    index_parser.add_argument("--content", action="store_true", help="同时建立文本文件的内容（全文）索引")
+    index_parser.add_argument("--rate", type=float, help="每秒最多处理的文件数")
+    index_parser.add_argument("--low-priority", action="store_true", help="以低 CPU 与 I/O 优先级运行（nice/ionice）")
+    index_parser.add_argument("--idle-window", type=parse_idle_window, metavar="开始-结束",
+                              help="只在每天的这个时段内运行，例如 22-7")
+    index_parser.add_argument("--max-load", type=float, help="系统 1 分钟平均负载超过此值时暂停")
+
+    daemon_parser = subparsers.add_parser("daemon", help="运行后台索引服务，界面与命令行连接它共用同一份索引")
+    daemon_parser.add_argument("--save-interval", type=float, default=300, help="自动保存索引的间隔（秒）")
+    daemon_parser.add_argument("--no-watch", action="store_true", help="不实时监视文件变化")
+    daemon_parser.add_argument("--stop", action="store_true", help="停止正在运行的后台服务")
+    daemon_parser.add_argument("--status", action="store_true", help="显示后台服务的状态")
+
+    roots_parser = subparsers.add_parser("roots", help="列出、添加或移除索引根目录（每个根目录是独立的索引段）")
+    roots_parser.add_argument("--add", metavar="目录", help="添加根目录，已存在时修改它的配置")
+    roots_parser.add_argument("--remove", metavar="目录", help="移除根目录及其索引")
+    roots_parser.add_argument("--exclude", action="append", default=[], metavar="规则",
+                              help="gitignore 风格的排除规则（可重复），加在默认规则之后，例如 node_modules/ 或 *.log")
+    roots_parser.add_argument("--no-default-excludes", action="store_true", help="不使用默认的排除规则")
+    roots_parser.add_argument("--max-size", type=max_size_arg, default=DEFAULT_MAX_FILE_SIZE,
+                              help="不索引大于此大小的文件，例如 100mb（0 表示不限）")
+    roots_parser.add_argument("--refresh", type=refresh_arg, default="watch",
+                              help="刷新策略：watch（实时监视）、manual（只在运行 index 时刷新）或间隔秒数")
+
+    watch_parser = subparsers.add_parser("watch", help="实时监视文件变化并更新索引")
+    watch_parser.add_argument("roots", nargs="*", help="要监视的根目录（默认刷新策略为 watch 的根目录）")
+    watch_parser.add_argument("--save-interval", type=float, default=300, help="自动保存索引的间隔（秒）")
+
+    search_parser = subparsers.add_parser("search", help="搜索索引")
+    search_parser.add_argument("query", help="搜索关键词，可使用查询语言（如 \"ext:pdf size:>10mb report\"）")
+    search_parser.add_argument("-t", "--type", default="all",
+                               choices=["all", "file", "app", "workspace", "command", "content"],
+                               help="搜索类型")
+    search_parser.add_argument("-n", "--limit", type=int, default=50, help="最多显示的结果数（0 表示不限）")
+    search_parser.add_argument("--revalidate", action="store_true",
+                               help="重新读取显示的文件的大小与修改时间，并从索引中删除已消失的文件")
+    search_parser.add_argument("--local", action="store_true", help="不连接后台服务，在本进程中加载索引搜索")
+    return parser
+
+
+def cmd_index(engine, args):
+    """执行 index 子命令；Ctrl+C 时停止并保存已完成的部分，之后用 -i 继续"""
+    client = DaemonClient.connect(engine.data_dir)
+    if client is not None:
+        # 后台服务持有索引，由它更新，避免两个进程先后覆盖同一个索引文件
+        with contextlib.closing(client):
+            roots = [os.path.abspath(root) for root in args.roots] or None
+            started = client.request("index", incremental=args.incremental, roots=roots)["started"]
+        print("后台服务正在运行，已交给后台服务更新索引" if started else "后台服务正在更新索引", file=sys.stderr)
+        return 0
+    governor = engine.governor
+    governor.files_per_second = args.rate
+    governor.low_priority = args.low_priority
+    governor.idle_window = args.idle_window
+    governor.max_load = args.max_load
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: governor.stop())
+    try:
+        return run_index(engine, args)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+
+def run_index(engine, args):
+    """按参数构建或增量刷新索引"""
+    engine.governor.start()
+    if args.workers:
+        engine.walker_workers = args.workers
+    if args.processes:
+        engine.build_processes = args.processes
+    if args.shard_timeout:
+        engine.shard_timeout = args.shard_timeout
+    # 完整构建被停止时，未完成的目录保留旧索引中的文件，因此同样先加载旧索引（只映射，开销很小）
+    engine.load_file_index()
+    engine.update_file_index(args.roots or None, incremental=args.incremental, resume=not args.restart)
+    engine.save_file_index()
+    if engine.governor.is_stopped():
+        print(f"索引已停止，已保存进度（{engine.governor.stats()}），运行 index -i 继续", file=sys.stderr)
+        return 130
+    if args.content:
+        engine.build_content_index()
+    engine.build_apps_index()
+    engine.save_apps_index()
+    return 0
+
+
+def cmd_roots(engine, args):
+    """执行 roots 子命令；后台服务在运行时交给它处理（它会立即为新的根目录建立索引）"""
+    client = DaemonClient.connect(engine.data_dir)
+    try:
+        if args.add:
+            excludes = ([] if args.no_default_excludes else list(DEFAULT_EXCLUDES)) + args.exclude
+            options = {"excludes": excludes, "max_file_size": args.max_size, "refresh": args.refresh}
+            path = os.path.abspath(args.add)
+            if client is not None:
+                client.request("add_root", path=path, options=options)
+                print(f"已添加索引根目录 {path}，后台服务正在建立它的索引", file=sys.stderr)
+            else:
+                # 新根目录位于已有的根目录之中时要从外层的段移除这部分文件，因此先加载索引
+                engine.load_file_index()
+                engine.add_root(path, **options)
+                engine.save_file_index()
+                print(f"已添加索引根目录 {path}，运行 index {path} 建立它的索引", file=sys.stderr)
+            return 0
+        if args.remove:
+            path = os.path.abspath(args.remove)
+            if client is not None:
+                removed = client.request("remove_root", path=path)["removed"]
+            else:
+                # 外层的段要在下次刷新时重新收录这部分文件，因此先加载索引，移除后保存
+                engine.load_file_index()
+                removed = engine.remove_root(path)
+                if removed:
+                    engine.save_file_index()
+            print(f"已移除索引根目录 {path}" if removed else f"{path} 不是索引根目录", file=sys.stderr)
+            return 0 if removed else 1
+        if client is not None:
+            roots = client.request("roots")["roots"]
+        else:
+            engine.load_file_index()
+            roots = engine.root_status()
+        for root in roots:
+            files = f"{root['files']} 个文件" if root["indexed"] else "未索引"
+            max_size = format_size(root["max_file_size"]) if root["max_file_size"] else "不限"
+            print(f"{root['path']}\t{files}\t刷新: {root['refresh']}\t大小上限: {max_size}\t"
+                  f"排除规则: {len(root['excludes'])} 条")
+        return 0
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if client is not None:
+            client.close()
+
+
+def cmd_watch(engine, args):
+    """执行 watch 子命令：前台运行监视服务，Ctrl+C 退出时保存索引"""
+    if IndexDaemon.is_running(engine.data_dir):
+        print("后台服务正在运行，它已在监视文件变化", file=sys.stderr)
+        return 1
+    engine.load_file_index()
+    if not engine.file_count():
+        print("索引不存在，请先运行 index", file=sys.stderr)
+        return 1
+    watcher = IndexWatcher(engine, roots=args.roots or None)
+    watcher.on_change = lambda added, removed: print(f"新增 {added} 个，删除 {removed} 个", file=sys.stderr)
+    watcher.start()
+    try:
+        while True:
+            time.sleep(args.save_interval)
+            if engine.dirty:
+                engine.save_file_index()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if engine.dirty:
+            engine.save_file_index()
+    return 0
+
+
+def cmd_daemon(engine, args):
+    """执行 daemon 子命令：前台运行后台服务（Ctrl+C 退出），或停止/查询正在运行的服务"""
+    if args.stop or args.status:
+        client = DaemonClient.connect(engine.data_dir)
+        if client is None:
+            print("后台服务没有运行", file=sys.stderr)
+            return 1
+        with contextlib.closing(client):
+            if args.stop:
+                client.request("stop")
+                print("已请求后台服务停止", file=sys.stderr)
+            else:
+                for key, value in client.request("status").items():
+                    if key != "ok":
+                        print(f"{key}\t{value}")
+        return 0
+
+    daemon = IndexDaemon(engine, save_interval=args.save_interval, watch=not args.no_watch)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_search(engine, args):
+    """执行 search 子命令；后台服务在运行时通过它搜索"""
+    client = None if args.local else DaemonClient.connect(engine.data_dir)
+    if client is not None:
+        search_engine = RemoteSearchEngine(client)
+        index = client
+    else:
+        engine.load_file_index()
+        engine.load_apps_index()
+        workspaces = load_json(os.path.join(engine.data_dir, "workspaces.json"), {})
+        commands = load_json(os.path.join(engine.data_dir, "commands.json"), {})
+        search_engine = SearchEngine(engine, workspaces, commands)
+        index = engine
+    try:
+        results = search_engine.search(args.query, args.type, limit=args.limit or None)
+    except QueryError as e:
+        print(f"查询有误: {e}", file=sys.stderr)
+        if client is not None:
+            client.close()
+        return 2
+    for name, item_type, path, info in results:
+        if args.revalidate and item_type == "文件":
+            try:
+                stats = index.revalidate_file(path)
+            except OSError as e:
+                print(f"无法验证 {path}: {e}", file=sys.stderr)
+            else:
+                if stats is None:
+                    continue  # 文件已消失，已从索引中删除
+                info = format_file_info(*stats)
+        print(f"{item_type}\t{name}\t{path}\t{info}")
+    print(f"共找到 {search_engine.match_count} 个结果", file=sys.stderr)
+    if client is not None:
+        client.close()
+    elif engine.dirty:
+        engine.save_file_index()
+    return 0
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return 1
+
+    server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    profiler = Profiler(args.profile) if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        engine = IndexEngine(args.data_dir, status_callback=lambda msg: print(msg, file=sys.stderr))
+        return run_command(engine, args)
+    finally:
+        if profiler:
+            paths = profiler.stop()
+            print(f"性能分析结果已保存: {', '.join(paths)}", file=sys.stderr)
+        if args.metrics:
+            metrics.write(args.metrics)
+        if server:
+            server.shutdown()
+
+
+def run_command(engine, args):
+    """执行子命令"""
+    if args.command == "index":
+        return cmd_index(engine, args)
+    if args.command == "watch":
+        return cmd_watch(engine, args)
+    if args.command == "roots":
+        return cmd_roots(engine, args)
+    if args.command == "daemon":
+        return cmd_daemon(engine, args)
+    return cmd_search(engine, args)
@@ -0,0 +1,410 @@
+"""文件内容（全文）索引
+
+在文件名索引建立之后运行：逐个读取文本类文件（分块流式读取，不整体载入内存），
+切分为词元后写入倒排表。英文、数字等按单词切分并转为小写；
+中日韩文字没有空格分词，按相邻两字（bigram）切分，另外索引每个单字，单字查询也能找到。
+
+倒排表按段（segment）存储在 content 目录中，每次更新写出新段，旧段不修改：
+
+    DOCPATH   文档路径字符串表（段内文档编号即下标）
+    DOCSIZE   文档大小 (i64)
+    DOCMTIM   文档修改时间 (f64)
+    TERMS     按字典序排列的词元字符串表
+    TERMOFF   每个词元的倒排数据在 POSTINGS 中的起始位置 (u64，共 词元数+1 个)
+    POSTINGS  倒排数据：文档编号的差值，按 7 位变长整数（varint）压缩
+
+manifest.json 记录段的先后顺序。同一路径出现在多个段中时以最新的段为准；
+段的数量超过上限时合并最新的若干小段，失效文档过多时整体合并。
+查询时在每个段的有序词元表上二分查找，耗时与词元数量成对数关系，而不是逐个文件扫描。
+"""
+
+import os
+import re
+import bisect
+import codecs
+import heapq
+import threading
+from array import array
+
+from .utils import load_json, save_json
+from . import store
+
+
+SEGMENT_MAGIC = b"QFCONTNT"
+SEGMENT_VERSION = 2              # 2: 中日韩文字另外索引单字
+
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".xml", ".yaml", ".yml",
+    ".toml", ".cfg", ".conf", ".html", ".htm", ".css", ".js", ".ts", ".jsx", ".tsx",
+    ".py", ".java", ".c", ".h", ".cpp", ".hpp", ".cs", ".go", ".rs", ".rb", ".php",
+    ".sh", ".bat", ".ps1", ".sql", ".tex", ".srt", ".properties", ".vue", ".kt", ".swift",
+}
+CHUNK_SIZE = 64 * 1024          # 每次读取的字节数
+MAX_TOKEN_LENGTH = 64           # 超过此长度的单词不索引（多为编码数据）
+MAX_CARRY = 1024                # 块边界处最多保留多少个字符拼接到下一块
+SEGMENT_POSTINGS = 2000000      # 内存中累计多少条倒排记录后写出一个段
+MAX_SEGMENTS = 8                # 段数量超过此值时合并最新的小段
+MERGE_FACTOR = 4                # 每次合并的段数
+PREFIX_EXPANSIONS = 64          # 查询最后一个单词按前缀匹配时最多展开的词元数
+
+CJK_RANGES = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯"
+TOKEN_PATTERN = re.compile(f"[{CJK_RANGES}]+|[^\\W_{CJK_RANGES}]+")
+CJK_PATTERN = re.compile(f"[{CJK_RANGES}]")
+
+
+def tokenize(text, unigrams=True):
+    """切分文本，逐个产出词元
+
+    unigrams 为 False 时（查询）连续两个以上的中日韩文字只产出 bigram，单字词元只用于单独一个字的查询。
+    """
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if CJK_PATTERN.match(word):
+            if len(word) == 1 or unigrams:
+                yield from word
+            for i in range(len(word) - 1):
+                yield word[i:i + 2]
+        elif len(word) <= MAX_TOKEN_LENGTH:
+            yield word.lower()
+
+
+def is_text_file(path):
+    """按扩展名判断是否为文本类文件"""
+    return os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS
+
+
+def read_tokens(path, chunk_size=CHUNK_SIZE):
+    """分块读取文件并返回其中不重复的词元集合；看起来是二进制文件时返回 None"""
+    tokens = set()
+    with open(path, "rb") as f:
+        first = f.read(chunk_size)
+        if b"\0" in first:
+            return None
+        # 先按 UTF-8 解码，失败时按 GB18030（兼容 GBK/GB2312）解码
+        encoding = "utf-8-sig"
+        try:
+            first.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(first) - 4:
+                encoding = "gb18030"
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        carry = ""
+        chunk = first
+        while chunk:
+            text = carry + decoder.decode(chunk)
+            # 末尾可能是被截断的单词，留到下一块一起切分
+            carry = ""
+            match = re.search(r"\w+$", text)
+            if match and len(match.group()) <= MAX_CARRY:
+                carry = match.group()
+                text = text[:match.start()]
+            tokens.update(tokenize(text))
+            chunk = f.read(chunk_size)
+        tokens.update(tokenize(carry + decoder.decode(b"", final=True)))
+    return tokens
+
+
+def encode_postings(doc_ids):
+    """把升序的文档编号编码为差值 varint"""
+    out = bytearray()
+    previous = 0
+    for doc_id in doc_ids:
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data):
+    """解码差值 varint，返回文档编号列表"""
+    doc_ids = []
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            doc_ids.append(previous)
+            value = shift = 0
+    return doc_ids
+
+
+def write_segment(path, docs, postings):
+    """写出一个段：docs 为 [(路径, 大小, 修改时间)]，postings 为 {词元: 升序文档编号}"""
+    terms = sorted(postings)
+    offsets = array("Q", [0])
+    chunks = []
+    total = 0
+    for term in terms:
+        data = encode_postings(postings[term])
+        chunks.append(data)
+        total += len(data)
+        offsets.append(total)
+    store.write_sections(path, [
+        ("DOCPATH", store._string_table([doc[0] for doc in docs])),
+        ("DOCSIZE", array("q", [doc[1] for doc in docs]).tobytes()),
+        ("DOCMTIM", array("d", [doc[2] for doc in docs]).tobytes()),
+        ("TERMS", store._string_table(terms)),
+        ("TERMOFF", offsets.tobytes()),
+        ("POSTINGS", b"".join(chunks)),
+    ], magic=SEGMENT_MAGIC, version=SEGMENT_VERSION)
+
+
+class Segment(store.SectionFile):
+    """通过 mmap 打开的内容索引段"""
+
+    def __init__(self, path):
+        super().__init__(path, SEGMENT_MAGIC, SEGMENT_VERSION)
+
+    def _parse(self):
+        self.doc_paths = self.string_table("DOCPATH")
+        self.doc_size = self.array_section("DOCSIZE", "q")
+        self.doc_mtime = self.array_section("DOCMTIM", "d")
+        self.terms = self.string_table("TERMS")
+        self.term_offsets = self.array_section("TERMOFF", "Q")
+        self.postings = self.section("POSTINGS")
+        self.live = None            # 有效文档标记（bytearray），由 ContentIndex 计算
+
+    def lookup(self, term):
+        """返回包含该词元的文档编号"""
+        index = bisect.bisect_left(self.terms, term)
+        if index < len(self.terms) and self.terms[index] == term:
+            return self.postings_at(index)
+        return []
+
+    def lookup_prefix(self, prefix, limit=PREFIX_EXPANSIONS):
+        """返回包含以 prefix 开头的任一词元的文档编号"""
+        index = bisect.bisect_left(self.terms, prefix)
+        doc_ids = set()
+        for index in range(index, min(index + limit, len(self.terms))):
+            if not self.terms[index].startswith(prefix):
+                break
+            doc_ids.update(self.postings_at(index))
+        return sorted(doc_ids)
+
+    def postings_at(self, index):
+        return decode_postings(self.postings[self.term_offsets[index]:self.term_offsets[index + 1]])
+
+
+class ContentIndex:
+    """内容索引：管理 content 目录中的段、增量更新、段合并与查询"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        self.segments = None        # 按从旧到新排列的 Segment，第一次使用时打开
+        self.next_segment = 1
+        self.generation = 0         # 有效文档每变化一次加 1，缓存的搜索结果据此失效
+        self.lock = threading.RLock()  # 保护段列表：更新与合并替换段时，查询不能读取已关闭的段
+
+    def open(self):
+        """打开 manifest 中记录的全部段"""
+        with self.lock:
+            if self.segments is None:
+                self._open_segments()
+
+    def _open_segments(self):
+        manifest = load_json(self.manifest_file, {})
+        self.next_segment = manifest.get("next_segment", 1)
+        self.segments = []
+        removed = False
+        for name in manifest.get("segments", []):
+            try:
+                self.segments.append(Segment(os.path.join(self.directory, name)))
+            except OSError as e:
+                print(f"打开内容索引段 {name} 失败: {e}")
+            except store.IndexFormatError as e:
+                # 损坏或旧版本的段无法再使用，删除后其中的文件在下次更新内容索引时重新索引
+                print(f"内容索引段 {name} 不可用（{e}），已删除，其中的文件将重新索引")
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                removed = True
+        if removed:
+            self.save_manifest()
+        self.compute_live()
+
+    def close(self):
+        """释放全部段的映射"""
+        with self.lock:
+            for segment in self.segments or []:
+                segment.close()
+            self.segments = None
+
+    def compute_live(self):
+        """同一路径只有最新段中的文档有效"""
+        seen = set()
+        for segment in reversed(self.segments):
+            live = bytearray(len(segment.doc_paths))
+            for doc_id, path in enumerate(segment.doc_paths):
+                if path not in seen:
+                    seen.add(path)
+                    live[doc_id] = 1
+            segment.live = live
+        self.generation += 1
+
+    def documents(self):
+        """返回 {路径: (大小, 修改时间)}（各路径的最新版本）"""
+        self.open()
+        docs = {}
+        with self.lock:
+            for segment in self.segments:
+                for doc_id, path in enumerate(segment.doc_paths):
+                    if segment.live[doc_id]:
+                        docs[path] = (segment.doc_size[doc_id], segment.doc_mtime[doc_id])
+        return docs
+
+    def save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        save_json(self.manifest_file, {
+            "segments": [os.path.basename(segment.path) for segment in self.segments],
+            "next_segment": self.next_segment,
+        })
+
+    def new_segment_path(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"seg-{self.next_segment:06d}.qfc")
+        self.next_segment += 1
+        return path
+
+    # 更新
+    def update(self, files, max_size, excluded_extensions=(), is_live=None, status=None, governor=None):
+        """索引新增或修改过的文件，返回新索引的文件数
+
+        files 为 [(路径, 大小, 修改时间)]（通常来自文件名索引），只处理文本类、不超过 max_size 且
+        扩展名未被排除的文件；大小和修改时间与已索引版本一致的文件跳过。
+        is_live(路径) 用于合并段时丢弃已从文件索引中删除的文档；
+        governor（ResourceGovernor）用于限速，被停止时已读取的文件照常写入。
+        """
+        self.open()
+        indexed = self.documents()
+        docs = []
+        postings = {}
+        pending = 0
+        count = 0
+        for path, size, mtime in files:
+            extension = os.path.splitext(path)[1].lower()
+            if extension not in TEXT_EXTENSIONS or extension in excluded_extensions or size > max_size:
+                continue
+            if indexed.get(path) == (size, mtime):
+                continue
+            try:
+                tokens = read_tokens(path)
+            except (PermissionError, OSError):
+                continue
+            if governor is not None and not governor.throttle(1):
+                break
+            if tokens is None:
+                continue
+            doc_id = len(docs)
+            docs.append((path, size, mtime))
+            for token in tokens:
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = array("I")
+                posting.append(doc_id)
+            pending += len(tokens)
+            count += 1
+            if count % 100 == 0 and status:
+                status(f"已索引 {count} 个文件的内容...")
+            if pending >= SEGMENT_POSTINGS:
+                self.add_segment(docs, postings)
+                docs, postings, pending = [], {}, 0
+        if docs:
+            self.add_segment(docs, postings)
+        with self.lock:
+            self.maybe_merge(is_live)
+        return count
+
+    def add_segment(self, docs, postings):
+        """写出新段并记录到 manifest"""
+        path = self.new_segment_path()
+        write_segment(path, docs, postings)
+        with self.lock:
+            self.segments.append(Segment(path))
+            self.compute_live()
+            self.save_manifest()
+
+    def maybe_merge(self, is_live=None):
+        """段过多时合并最新的若干段；失效文档超过一半时整体合并"""
+        total = sum(len(segment.live) for segment in self.segments)
+        live = sum(sum(segment.live) for segment in self.segments)
+        if len(self.segments) > 1 and total and live * 2 < total:
+            self.merge(0, is_live)
+        while len(self.segments) > MAX_SEGMENTS:
+            self.merge(len(self.segments) - MERGE_FACTOR, is_live)
+
+    def merge(self, start, is_live=None):
+        """把 start 之后的全部段合并为一个新段（只保留有效文档）"""
+        merging = self.segments[start:]
+        docs = []
+        remaps = []
+        for segment in merging:
+            remap = {}
+            for doc_id, path in enumerate(segment.doc_paths):
+                if segment.live[doc_id] and (is_live is None or is_live(path)):
+                    remap[doc_id] = len(docs)
+                    docs.append((path, segment.doc_size[doc_id], segment.doc_mtime[doc_id]))
+            remaps.append(remap)
+
+        # 各段的词元表已排序，k 路归并后按段的先后拼接倒排表，新编号自然保持升序
+        def terms(i):
+            for index, term in enumerate(merging[i].terms):
+                yield term, i, index
+
+        postings = {}
+        for term, i, index in heapq.merge(*(terms(i) for i in range(len(merging)))):
+            remap = remaps[i]
+            doc_ids = [remap[doc_id] for doc_id in merging[i].postings_at(index) if doc_id in remap]
+            if doc_ids:
+                postings.setdefault(term, []).extend(doc_ids)
+
+        path = self.new_segment_path()
+        write_segment(path, docs, postings)
+        merged = Segment(path)
+        self.segments = self.segments[:start] + [merged]
+        self.compute_live()
+        self.save_manifest()
+        for segment in merging:
+            segment.close()
+            try:
+                os.remove(segment.path)
+            except OSError as e:
+                print(f"删除内容索引段失败: {e}")
+
+    # 查询
+    def search(self, query, cancel_event=None):
+        """返回内容包含查询中全部词元的文档 [(路径, 大小, 修改时间)]
+
+        查询的最后一个单词按前缀匹配，方便边输入边搜索。
+        """
+        self.open()
+        tokens = list(dict.fromkeys(tokenize(query, unigrams=False)))
+        if not tokens:
+            return []
+        last = tokens[-1]
+        prefix = not CJK_PATTERN.match(last) and query == query.rstrip()
+        results = []
+        with self.lock:
+            for segment in self.segments:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                matched = None
+                for token in tokens:
+                    if token == last and prefix:
+                        doc_ids = segment.lookup_prefix(token)
+                    else:
+                        doc_ids = segment.lookup(token)
+                    matched = set(doc_ids) if matched is None else matched.intersection(doc_ids)
+                    if not matched:
+                        break
+                for doc_id in sorted(matched or ()):
+                    if segment.live[doc_id]:
+                        results.append((segment.doc_paths[doc_id], segment.doc_size[doc_id],
+                                        segment.doc_mtime[doc_id]))
+        return results
@@ -0,0 +1,430 @@
+"""后台索引服务与客户端
+
+每个 QuickFile 窗口各自加载索引、各自可能开始遍历磁盘。后台服务（python -m quickfile_core daemon）
+独占索引：加载一次后常驻内存，并运行监视器与增量更新；界面与命令行作为客户端连接，
+启动时不必加载索引，多个前端共用同一份内存。
+
+通信使用 multiprocessing.connection：POSIX 上为数据目录中的 Unix 域套接字 quickfile.sock，
+Windows 上为命名管道。连接时用数据目录中 daemon.key（仅当前用户可读）做 HMAC 认证，
+之后每条消息是一个 JSON 对象（不使用 pickle）：
+
+    请求  {"op": "search", "query": "report", "type": "file", "limit": 50}
+    响应  {"ok": true, "results": [[名称, 类型, 路径, 信息], ...], "total": 123, "generation": 7}
+    出错  {"ok": false, "error": "..."}
+
+每个连接一个线程，搜索在索引快照上进行（见 FileTable.snapshot），监视器写入时读取不被阻塞。
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import threading
+from multiprocessing.connection import Listener, Client
+
+from .search import SearchEngine, SearchCancelled
+from .query import QueryError
+from .watcher import IndexWatcher
+from .metrics import metrics
+from .utils import load_json
+
+
+SOCKET_NAME = "quickfile.sock"
+KEY_NAME = "daemon.key"
+REFRESH_CHECK_INTERVAL = 10     # 检查按间隔刷新的根目录是否到期的间隔（秒）
+
+
+def daemon_address(data_dir):
+    """返回 (地址, 协议族)：POSIX 上为 Unix 域套接字，Windows 上为命名管道"""
+    if os.name == "nt":
+        digest = hashlib.sha1(os.path.abspath(data_dir).lower().encode("utf-8")).hexdigest()[:12]
+        return rf"\\.\pipe\quickfile-{digest}", "AF_PIPE"
+    return os.path.join(data_dir, SOCKET_NAME), "AF_UNIX"
+
+
+def load_key(data_dir, create=False):
+    """读取（或生成）连接认证密钥；不存在且不生成时返回 None"""
+    path = os.path.join(data_dir, KEY_NAME)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            return None
+    key = os.urandom(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+class DaemonError(Exception):
+    """后台服务返回的错误"""
+
+
+class DaemonClient:
+    """后台服务的客户端（线程安全，请求按顺序发送）
+
+    提供与 IndexEngine 相同的 revalidate_file()，可直接交给 Revalidator。
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, data_dir):
+        """连接数据目录对应的后台服务，服务没有运行时返回 None"""
+        address, family = daemon_address(data_dir)
+        key = load_key(data_dir)
+        if key is None or (family == "AF_UNIX" and not os.path.exists(address)):
+            return None
+        try:
+            return cls(Client(address, family=family, authkey=key))
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None  # 上次异常退出留下的套接字文件
+        except (OSError, EOFError) as e:
+            print(f"连接后台服务失败: {e}", file=sys.stderr)
+            return None
+
+    def request(self, op, **params):
+        """发送一个请求并等待响应，返回响应字典；服务返回错误时抛出 DaemonError（查询语法错误为 QueryError）"""
+        params["op"] = op
+        with self.lock:
+            self.connection.send_bytes(json.dumps(params, ensure_ascii=False).encode("utf-8"))
+            response = json.loads(self.connection.recv_bytes().decode("utf-8"))
+        if not response.get("ok"):
+            if response.get("oserror"):
+                raise OSError(response.get("error"))
+            if response.get("queryerror"):
+                raise QueryError(response.get("error"))
+            raise DaemonError(response.get("error", "未知错误"))
+        return response
+
+    def search(self, query, search_type="all", limit=None):
+        """返回 (结果列表, 匹配总数)"""
+        response = self.request("search", query=query, type=search_type, limit=limit)
+        return [tuple(item) for item in response["results"]], response["total"]
+
+    def revalidate_file(self, path):
+        stats = self.request("revalidate", path=path)["stats"]
+        return tuple(stats) if stats is not None else None
+
+    def record_launch(self, key):
+        self.request("launched", key=key)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class RemoteLaunchHistory:
+    """把打开记录转交给后台服务（与 LaunchHistory.record 接口一致）"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def record(self, key):
+        try:
+            self.client.record_launch(key)
+        except Exception as e:
+            print(f"记录打开历史失败: {e}")
+
+
+class RemoteSearchEngine:
+    """通过后台服务搜索，接口与 SearchEngine 一致（可交给 TypeaheadSearcher）
+
+    工作区与自定义命令由后台服务从数据目录中的 workspaces.json / commands.json 读取。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.workspaces = {}
+        self.custom_commands = {}
+        self.launch_history = RemoteLaunchHistory(client)
+        self.match_count = 0
+
+    def search(self, query, search_type="all", cancel_event=None, limit=None):
+        results, self.match_count = self.client.search(query, search_type, limit)
+        # 请求发出后无法中途取消，只丢弃过期的结果
+        if cancel_event and cancel_event.is_set():
+            raise SearchCancelled(query)
+        return results
+
+
+class IndexDaemon:
+    """后台索引服务：持有 IndexEngine，运行监视器并响应客户端请求"""
+
+    def __init__(self, engine, save_interval=300, watch=True):
+        self.engine = engine
+        self.save_interval = save_interval    # 自动保存实时更新过的索引的间隔（秒）
+        self.watch = watch
+        self.address, self.family = daemon_address(engine.data_dir)
+        self.search_engine = SearchEngine(engine)
+        self.watcher = IndexWatcher(engine)
+        self.listener = None
+        self.stopped = threading.Event()
+        self.index_thread = None
+        self.config_cache = {}                # {文件名: (mtime, 内容)}
+
+    # 生命周期
+    def start(self):
+        """加载索引、开始监听；没有可用索引时在后台建立"""
+        if self.is_running(self.engine.data_dir):
+            raise RuntimeError(f"后台服务已在运行: {self.address}")
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            os.remove(self.address)  # 上次异常退出留下的套接字文件
+        key = load_key(self.engine.data_dir, create=True)
+        self.listener = Listener(self.address, family=self.family, authkey=key)
+
+        engine = self.engine
+        engine.load_file_index()
+        engine.load_apps_index()
+        # 常驻服务不保留 mmap：复制为可修改的数组，之后的读取都在快照上进行，不阻塞写入
+        engine.detach_segments()
+        if not engine.file_count() or not engine.apps_index or engine.has_unfinished_build():
+            self.start_indexing(incremental=False)
+        elif self.watch:
+            self.watcher.start()
+
+        threading.Thread(target=self.accept_loop, name="quickfile-daemon", daemon=True).start()
+        threading.Thread(target=self.save_loop, name="quickfile-daemon-save", daemon=True).start()
+        threading.Thread(target=self.refresh_loop, name="quickfile-daemon-refresh", daemon=True).start()
+        engine.set_status(f"后台服务已启动: {self.address}")
+
+    def serve_forever(self):
+        """启动并阻塞直到 shutdown()（或收到 stop 请求）"""
+        self.start()
+        try:
+            while not self.stopped.wait(1.0):
+                pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """停止监听与监视器，保存实时更新过的索引"""
+        if self.listener is None:
+            return
+        self.stopped.set()
+        self.engine.governor.stop()
+        listener = self.listener
+        self.listener = None
+        self.wake_accept()
+        listener.close()
+        self.watcher.stop()
+        if self.index_thread is not None:
+            self.index_thread.join()
+        if self.engine.dirty:
+            self.engine.save_file_index()
+        self.engine.set_status("后台服务已停止")
+
+    def wake_accept(self):
+        """accept() 阻塞时关闭监听不能可靠地唤醒它：自己连接一次
+
+        接受连接的线程可能已经退出，因此不等待认证完成（否则会一直等待服务端的认证消息）。
+        """
+        try:
+            if self.family == "AF_UNIX":
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(self.address)
+            else:
+                threading.Thread(target=self._connect_once, daemon=True).start()
+        except OSError:
+            pass
+
+    def _connect_once(self):
+        try:
+            Client(self.address, family=self.family, authkey=load_key(self.engine.data_dir)).close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def is_running(data_dir):
+        """数据目录对应的后台服务是否在运行"""
+        client = DaemonClient.connect(data_dir)
+        if client is None:
+            return False
+        client.close()
+        return True
+
+    def is_indexing(self):
+        return self.index_thread is not None and self.index_thread.is_alive()
+
+    def start_indexing(self, incremental=True, roots=None):
+        """在后台线程中更新索引（roots 为 None 时更新全部根目录及应用索引），完成后开始实时监视；返回是否已开始"""
+        if self.is_indexing():
+            return False
+
+        def run():
+            if roots:
+                self.engine.governor.start()
+                self.engine.update_file_index(roots, incremental=incremental)
+                self.engine.save_file_index()
+            else:
+                self.engine.build_all_indexes(incremental)
+            if self.watch and not self.stopped.is_set():
+                self.restart_watcher()
+
+        self.index_thread = threading.Thread(target=run, name="quickfile-daemon-index", daemon=True)
+        self.index_thread.start()
+        return True
+
+    def restart_watcher(self):
+        """根目录配置改变后重新建立监视"""
+        self.watcher.stop()
+        self.watcher.start()
+
+    def refresh_loop(self):
+        """增量刷新按间隔刷新（refresh 为秒数）且已到期的根目录"""
+        while not self.stopped.wait(REFRESH_CHECK_INTERVAL):
+            if self.is_indexing() or not self.engine.due_segments():
+                continue
+            try:
+                self.engine.refresh_due_segments()
+            except Exception as e:
+                print(f"定期刷新失败: {e}", file=sys.stderr)
+
+    def save_loop(self):
+        """定期保存监视器更新过的索引"""
+        while not self.stopped.wait(self.save_interval):
+            if self.engine.dirty:
+                self.engine.save_file_index()
+
+    # 连接处理
+    def accept_loop(self):
+        while not self.stopped.is_set():
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                if self.stopped.is_set():
+                    return
+                print(f"接受连接失败: {e}", file=sys.stderr)
+                continue
+            if self.stopped.is_set():
+                connection.close()
+                return
+            threading.Thread(target=self.handle, args=(connection,), name="quickfile-daemon-client",
+                             daemon=True).start()
+
+    def handle(self, connection):
+        """处理一个客户端的全部请求，直到客户端断开"""
+        # 每个连接单独的 SearchEngine（match_count 不在连接之间共享），打开历史与结果缓存共用
+        search_engine = SearchEngine(self.engine)
+        search_engine.launch_history = self.search_engine.launch_history
+        search_engine.cache = self.search_engine.cache
+        with connection:
+            while not self.stopped.is_set():
+                try:
+                    data = connection.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                started = time.perf_counter()
+                op = None
+                try:
+                    request = json.loads(data.decode("utf-8"))
+                    op = request.get("op")
+                    handler = getattr(self, f"op_{op}", None)
+                    if handler is None:
+                        raise ValueError(f"未知的请求: {op}")
+                    response = handler(request, search_engine)
+                    response["ok"] = True
+                except OSError as e:
+                    response = {"ok": False, "oserror": True, "error": str(e)}
+                except QueryError as e:
+                    response = {"ok": False, "queryerror": True, "error": str(e)}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                metrics.observe("quickfile_daemon_request_seconds", time.perf_counter() - started,
+                                "后台服务处理一个请求的耗时", {"op": op if response["ok"] else "error"})
+                try:
+                    connection.send_bytes(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+                except (EOFError, OSError):
+                    return
+
+    def load_config(self, name):
+        """读取数据目录中的 JSON 配置（按修改时间缓存）"""
+        path = os.path.join(self.engine.data_dir, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        cached = self.config_cache.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = self.config_cache[name] = (mtime, load_json(path, {}))
+        return cached[1]
+
+    # 请求
+    def op_ping(self, request, search_engine):
+        return {"pid": os.getpid(), "files": self.engine.file_count(), "generation": self.engine.generation}
+
+    def op_status(self, request, search_engine):
+        engine = self.engine
+        indexing = self.is_indexing()
+        return {
+            "pid": os.getpid(),
+            "files": engine.file_count(),
+            "roots": len(engine.segments),
+            "apps": len(engine.apps_index),
+            "generation": engine.generation,
+            "dirty": engine.dirty,
+            "indexing": indexing,
+            "paused": engine.governor.is_paused(),
+            "progress": engine.governor.stats() if indexing else None,
+        }
+
+    def op_search(self, request, search_engine):
+        search_engine.workspaces = self.load_config("workspaces.json")
+        search_engine.custom_commands = self.load_config("commands.json")
+        results = search_engine.search(request.get("query", ""), request.get("type", "all"),
+                                       limit=request.get("limit"))
+        return {"results": results, "total": search_engine.match_count, "generation": self.engine.generation}
+
+    def op_revalidate(self, request, search_engine):
+        return {"stats": self.engine.revalidate_file(request["path"])}
+
+    def op_launched(self, request, search_engine):
+        self.search_engine.launch_history.record(request["key"])
+        return {}
+
+    def op_index(self, request, search_engine):
+        self.engine.governor.resume()
+        return {"started": self.start_indexing(request.get("incremental", True), request.get("roots"))}
+
+    def op_roots(self, request, search_engine):
+        return {"roots": self.engine.root_status()}
+
+    def op_add_root(self, request, search_engine):
+        if self.is_indexing():
+            raise RuntimeError("正在更新索引，请稍后再修改根目录")
+        segment = self.engine.add_root(request["path"], **request.get("options", {}))
+        return {"path": segment.path, "started": self.start_indexing(True, [segment.path])}
+
+    def op_remove_root(self, request, search_engine):
+        if self.is_indexing():
+            raise RuntimeError("正在更新索引，请稍后再修改根目录")
+        removed = self.engine.remove_root(request["path"])
+        if removed and self.watch:
+            self.restart_watcher()
+        return {"removed": removed}
+
+    def op_pause(self, request, search_engine):
+        self.engine.governor.pause()
+        return {}
+
+    def op_resume(self, request, search_engine):
+        self.engine.governor.resume()
+        return {}
+
+    def op_save(self, request, search_engine):
+        self.engine.save_file_index()
+        return {}
+
+    def op_metrics(self, request, search_engine):
+        return {"metrics": metrics.snapshot()}
+
+    def op_stop(self, request, search_engine):
+        # 在另一个线程中停止，先把响应发回去
+        threading.Thread(target=self.stopped.set, daemon=True).start()
+        return {}
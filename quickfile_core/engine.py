@@ -0,0 +1,536 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import default_data_dir, load_json, save_json
+from .table import FileTable, FileTableBuilder
+from . import store
+from .segment import IndexRoot, IndexSegment, normalize_root
+from .content import ContentIndex, is_text_file
+from .governor import ResourceGovernor
+from .metrics import metrics
+from .apps import AppScanner, AppIndexFile, collect_apps, write_apps_index
+
+
+class IndexEngine:
+    """文件与应用程序索引引擎（不依赖 tkinter，可在无界面环境运行）
+
+    文件索引按根目录分成独立的段（见 segment 模块），根目录及其排除规则、大小上限与刷新策略
+    保存在数据目录的 roots.json 中；没有该文件时每个磁盘一个根目录，使用默认的排除规则。
+    """
+
+    def __init__(self, data_dir=None, status_callback=None):
+        # 数据存储
+        self.segments = []            # 文件索引段（IndexSegment），与根目录配置的顺序相同
+        self.apps_index = {}          # 应用程序索引 {应用名: 路径}
+        self.app_details = {}         # 应用的关键词与图标 {应用名: ([关键词], 图标)}，只记录有其中之一的应用
+        self.app_dirs = None          # 上次扫描的应用目录（AppDir 列表），保存时作为下次增量扫描的缓存
+        self.status_callback = status_callback
+        self.lock = threading.RLock()  # 保护段列表（增删根目录）；各段的读写由段自己的锁保护
+        self._generation = 0           # 段被替换或删除时累加其版本，保证 generation 只增不减
+
+        # 文件路径
+        self.data_dir = data_dir or default_data_dir()
+        self.roots_file = os.path.join(self.data_dir, "roots.json")
+        self.segments_dir = os.path.join(self.data_dir, "segments")
+        self.apps_file = os.path.join(self.data_dir, "apps_index.bin")
+        self.legacy_apps_file = os.path.join(self.data_dir, "apps_index.json")  # 旧版应用索引，加载时自动迁移
+        # 旧版单一文件索引（二进制与更早的 JSON），加载时按根目录拆分为段
+        self.single_index_file = os.path.join(self.data_dir, "file_index.bin")
+        self.single_journal_file = os.path.join(self.data_dir, "file_index.journal")
+        self.legacy_index_file = os.path.join(self.data_dir, "file_index.json")
+        self.legacy_snapshots_file = os.path.join(self.data_dir, "dir_snapshots.json")
+        self.content_index = ContentIndex(os.path.join(self.data_dir, "content"))
+
+        # 并行遍历配置
+        self.walker_workers = None    # 每个根目录的线程数，None 表示按 CPU 核心数自动选择
+        self.drive_workers = {}       # {根目录: 线程数}，例如为网络盘设置更高并发
+        self.build_processes = None   # 多进程分片构建的进程数，None 或 1 表示在本进程内构建
+        self.shard_timeout = 3600     # 多进程构建时单个分片的最长耗时（秒），超时的分片保留旧索引
+
+        # 资源调度：限速、低优先级、暂停/继续、空闲时段（见 ResourceGovernor）
+        self.governor = ResourceGovernor(status_callback=self.set_status)
+
+        # 内容索引配置
+        self.index_content = False    # 是否在文件名索引之后建立文本文件的内容索引
+        self.content_max_size = 1024 * 1024 * 10  # 大于10MB的文件不索引内容
+
+        # 创建数据目录
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self.load_roots()
+
+    def set_status(self, message):
+        """报告当前进度（由前端决定如何显示）"""
+        if self.status_callback:
+            self.status_callback(message)
+
+    # 根目录与段
+    def load_roots(self):
+        """读取根目录配置并创建对应的段（尚未加载索引）"""
+        config = load_json(self.roots_file, None)
+        roots = None
+        if config is not None:
+            try:
+                roots = [IndexRoot.from_dict(item) for item in config]
+            except Exception as e:
+                print(f"读取索引根目录配置失败: {e}")
+        if roots is None:
+            roots = [IndexRoot(drive) for drive in self.get_drives()]
+        with self.lock:
+            self.segments = [IndexSegment(self, root) for root in self.unique_roots(roots)]
+
+    @staticmethod
+    def unique_roots(roots):
+        """去掉重复的根目录（后面的配置优先）"""
+        by_path = {}
+        for root in roots:
+            by_path.pop(root.path, None)
+            by_path[root.path] = root
+        return list(by_path.values())
+
+    def save_roots(self):
+        """把当前根目录配置写入 roots.json"""
+        save_json(self.roots_file, [segment.root.to_dict() for segment in self.segments])
+
+    def roots(self):
+        """当前的根目录配置（IndexRoot 列表）"""
+        return [segment.root for segment in self.segments]
+
+    def configure_roots(self, roots):
+        """替换全部根目录配置：未变的段保留，配置改变或被移除的段删除其索引文件"""
+        roots = self.unique_roots(roots)
+        with self.lock:
+            current = {segment.root.segment_name(): segment for segment in self.segments}
+            segments = []
+            for root in roots:
+                segment = current.pop(root.segment_name(), None)
+                if segment is None:
+                    segment = IndexSegment(self, root)
+                else:
+                    segment.root = root  # 刷新策略可能改变
+                segments.append(segment)
+            removed = list(current.values())
+            for segment in removed:
+                self._generation += segment.generation + 1
+                segment.delete_files()
+            added = [segment for segment in segments if segment not in self.segments]
+            self.segments = segments
+            # 新的根目录位于已有的段之中时，把这部分文件从外层的段移除，避免重复
+            for segment in added:
+                outer = self.segment_for(os.path.dirname(segment.path), exclude=segment)
+                if outer is not None:
+                    outer.apply_changes(removed_dirs=[segment.path])
+            # 被移除的根目录位于其他段之中时，外层的段下次刷新要重新列出它的上级目录才会进入它
+            for segment in removed:
+                outer = self.segment_for(os.path.dirname(segment.path))
+                if outer is not None:
+                    outer.forget_dir(os.path.dirname(segment.path))
+        self.save_roots()
+
+    def add_root(self, path, **options):
+        """添加（或重新配置）一个根目录，返回对应的段；options 为 IndexRoot 的参数"""
+        root = IndexRoot(path, **options)
+        roots = [r for r in self.roots() if r.path != root.path] + [root]
+        self.configure_roots(roots)
+        return self.find_segment(root.path)
+
+    def remove_root(self, path):
+        """移除一个根目录及其索引段，返回是否存在
+
+        外层的根目录在下次增量刷新时重新收录这部分文件。
+        """
+        path = normalize_root(path)
+        roots = [r for r in self.roots() if r.path != path]
+        if len(roots) == len(self.segments):
+            return False
+        self.configure_roots(roots)
+        return True
+
+    def find_segment(self, path):
+        """根目录恰好为 path 的段，没有时返回 None"""
+        path = normalize_root(path)
+        for segment in self.segments:
+            if segment.path == path:
+                return segment
+        return None
+
+    def segment_for(self, path, segments=None, exclude=None):
+        """path 所属的段：包含它的最深的根目录，不在任何根目录之下时返回 None"""
+        best = None
+        for segment in self.segments if segments is None else segments:
+            if segment is not exclude and segment.contains(path) and (best is None or len(segment.path) > len(best.path)):
+                best = segment
+        return best
+
+    def nested_roots(self, segment):
+        """位于某个段之内的其他根目录（该段遍历时不进入）"""
+        return [other.path for other in self.segments if other is not segment and other.path != segment.path
+                and segment.contains(other.path)]
+
+    def select_segments(self, roots=None):
+        """要处理的段：roots 为 None 时全部；未配置的目录作为新的根目录加入配置"""
+        if not roots:
+            return list(self.segments)
+        selected = []
+        for path in roots:
+            segment = self.find_segment(path)
+            if segment is None:
+                segment = self.add_root(path)
+                self.set_status(f"已添加索引根目录 {segment.path}")
+            selected.append(segment)
+        return selected
+
+    def watched_segments(self):
+        """刷新策略为实时监视的段"""
+        return [segment for segment in self.segments if segment.root.refresh == "watch"]
+
+    def due_segments(self):
+        """按间隔刷新且已到刷新时间的段"""
+        now = time.monotonic()
+        return [segment for segment in self.segments
+                if segment.root.refresh_interval() and now - segment.refreshed_at >= segment.root.refresh_interval()]
+
+    @property
+    def generation(self):
+        """文件索引的版本：任何一段变化都会使它增加"""
+        return self._generation + sum(segment.generation for segment in self.segments)
+
+    @property
+    def dirty(self):
+        """是否有段自上次保存后被修改"""
+        return any(segment.dirty for segment in self.segments)
+
+    def root_status(self):
+        """各根目录的配置与文件数（命令行与后台服务的状态显示）"""
+        return [dict(segment.root.to_dict(), files=len(segment.file_index),
+                     indexed=os.path.exists(segment.index_file)) for segment in self.segments]
+
+    def file_count(self):
+        """全部段的文件总数"""
+        return sum(len(segment.file_index) for segment in self.segments)
+
+    def has_unfinished_build(self):
+        """是否有被中断（崩溃或关闭）的完整构建等待继续"""
+        return any(segment.has_unfinished_build() for segment in self.segments)
+
+    @contextlib.contextmanager
+    def readers(self):
+        """读取全部段：with engine.readers() as [(段, 表, 版本)]: ...（读取方式见 IndexSegment.reader）"""
+        with contextlib.ExitStack() as stack:
+            yield [(segment,) + stack.enter_context(segment.reader()) for segment in list(self.segments)]
+
+    def detach_segments(self):
+        """把全部段的映射数据复制为可修改的数组（常驻进程不保留 mmap，读取都在快照上进行）"""
+        for segment in list(self.segments):
+            with segment.lock:
+                segment.mutable_file_index()
+
+    # 索引持久化
+    def load_file_index(self):
+        """加载全部段（mmap 映射，启动时只读取文件头）；旧版单一索引先拆分为段"""
+        try:
+            if not os.path.exists(self.single_index_file) and os.path.exists(self.legacy_index_file):
+                self.migrate_legacy_index()
+            if os.path.exists(self.single_index_file):
+                self.split_single_index()
+            self.remove_orphan_segments()
+        except Exception as e:
+            print(f"迁移旧版文件索引失败: {e}")
+        loaded = sum(segment.load() for segment in list(self.segments))
+        if loaded:
+            self.set_status(f"已加载文件索引，包含 {self.file_count()} 个文件（{loaded} 个根目录）")
+
+    def migrate_legacy_index(self):
+        """把旧版 file_index.json（及 dir_snapshots.json）转换为二进制格式"""
+        with open(self.legacy_index_file, 'r', encoding='utf-8') as f:
+            file_index = json.load(f)
+        dir_snapshots = {}
+        if os.path.exists(self.legacy_snapshots_file):
+            try:
+                with open(self.legacy_snapshots_file, 'r', encoding='utf-8') as f:
+                    dir_snapshots = json.load(f)
+            except Exception as e:
+                print(f"读取旧版目录快照失败: {e}")
+        store.save_table(self.single_index_file, FileTable.from_dict(file_index), dir_snapshots)
+        for path in (self.legacy_index_file, self.legacy_snapshots_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.set_status(f"已将旧版索引迁移为二进制格式，包含 {len(file_index)} 个文件")
+
+    def split_single_index(self):
+        """把旧版的单一 file_index.bin 按根目录拆分为段文件（只有一个根目录时直接改名）"""
+        if len(self.segments) == 1:
+            segment = self.segments[0]
+            os.replace(self.single_index_file, segment.index_file)
+            if os.path.exists(self.single_journal_file):
+                os.replace(self.single_journal_file, segment.journal_file)
+            self.set_status("已将文件索引转换为按根目录分段的格式")
+            return
+        table = store.load_table(self.single_index_file)
+        try:
+            snapshots = table.mapped.dir_snapshots()
+            builders = {}
+            dir_ids = {}
+            for dir_id, dir_path in enumerate(table.dirs):
+                segment = self.segment_for(dir_path)
+                if segment is not None:
+                    builder = builders.setdefault(segment, FileTableBuilder())
+                    dir_ids[dir_id] = (builder, builder.add_dir(dir_path))
+            names = table.get_names()
+            for row in range(len(table.file_dir)):
+                target = dir_ids.get(table.file_dir[row])
+                if target is not None:
+                    builder, dir_id = target
+                    builder.add_file(dir_id, names[table.file_name[row]], table.file_size[row], table.file_mtime[row])
+            for segment in self.segments:
+                segment_snapshots = {path: snapshot for path, snapshot in snapshots.items()
+                                     if self.segment_for(path) is segment}
+                builder = builders.get(segment, FileTableBuilder())
+                store.save_table(segment.index_file, builder.build(), segment_snapshots)
+        finally:
+            table.close()
+        os.remove(self.single_index_file)
+        if os.path.exists(self.single_journal_file):
+            os.remove(self.single_journal_file)  # 各段的进度无法从单一日志中区分，重新构建
+        self.set_status(f"已将文件索引拆分为 {len(self.segments)} 个根目录的段")
+
+    def remove_orphan_segments(self):
+        """删除已不在配置中的段文件（根目录被移除或遍历配置改变）"""
+        if not os.path.isdir(self.segments_dir):
+            return
+        current = set()
+        for segment in self.segments:
+            current.add(os.path.basename(segment.index_file))
+            current.add(os.path.basename(segment.journal_file))
+        for name in os.listdir(self.segments_dir):
+            if name not in current and name.endswith((".bin", ".journal")):
+                try:
+                    os.remove(os.path.join(self.segments_dir, name))
+                except OSError as e:
+                    print(f"删除旧的索引段 {name} 失败: {e}")
+
+    def load_apps_index(self):
+        """加载应用程序索引（只读取结果，不读取目录缓存）"""
+        try:
+            if os.path.exists(self.apps_file):
+                with metrics.timer("quickfile_index_load_seconds", "加载索引的耗时", {"index": "apps"}):
+                    index_file = AppIndexFile(self.apps_file)
+                    try:
+                        self.set_apps(index_file.apps())
+                    finally:
+                        index_file.close()
+                self.set_status(f"已加载应用索引，包含 {len(self.apps_index)} 个应用")
+            elif os.path.exists(self.legacy_apps_file):
+                with open(self.legacy_apps_file, 'r', encoding='utf-8') as f:
+                    self.set_apps([(name, path, "", "") for name, path in json.load(f).items()])
+                self.set_status(f"已加载旧版应用索引，包含 {len(self.apps_index)} 个应用")
+        except Exception as e:
+            print(f"加载应用索引失败: {e}")
+            self.set_apps([])
+
+    def set_apps(self, apps):
+        """替换应用索引，apps 为 [(应用名, 路径, 关键词, 图标)]"""
+        apps_index = {}
+        app_details = {}
+        for name, path, keywords, icon in apps:
+            apps_index[name] = path
+            if keywords or icon:
+                app_details[name] = (keywords.split(";") if keywords else [], icon)
+        self.apps_index = apps_index
+        self.app_details = app_details
+
+    def save_file_index(self):
+        """原子地保存有变化的段（未变化的段不重写）"""
+        saved = 0
+        for segment in list(self.segments):
+            if not segment.dirty:
+                continue
+            try:
+                segment.save()
+                saved += 1
+            except Exception as e:
+                print(f"保存文件索引 {segment.path} 失败: {e}")
+        if saved:
+            self.set_status(f"文件索引已保存，包含 {self.file_count()} 个文件")
+
+    def save_apps_index(self):
+        """保存应用程序索引（结果与目录缓存，原子写入）"""
+        try:
+            apps = []
+            for name, path in self.apps_index.items():
+                keywords, icon = self.app_details.get(name, ([], ""))
+                apps.append((name, path, ";".join(keywords), icon))
+            with metrics.timer("quickfile_index_save_seconds", "保存索引的耗时", {"index": "apps"}):
+                write_apps_index(self.apps_file, self.app_dirs or [], apps)
+            if os.path.exists(self.legacy_apps_file):
+                os.remove(self.legacy_apps_file)
+            self.set_status(f"应用索引已保存，包含 {len(self.apps_index)} 个应用")
+        except Exception as e:
+            print(f"保存应用索引失败: {e}")
+
+    # 索引构建
+    def build_all_indexes(self, incremental=False):
+        """构建并保存所有索引，返回耗时（秒）
+
+        incremental 为 True 时，已有目录快照的段只重新扫描发生变化的目录
+        （上次完整构建被中断的段先把它继续完成）。
+        """
+        start_time = time.time()
+        self.governor.start()
+
+        # 构建文件索引
+        self.update_file_index(incremental=incremental)
+        self.save_file_index()
+        if self.governor.is_stopped():
+            self.set_status(f"索引已停止，已保存进度（{self.governor.stats()}），下次更新索引时继续")
+            return time.time() - start_time
+
+        # 构建内容索引（只处理新增或修改过的文件）
+        if self.index_content:
+            self.build_content_index()
+
+        # 构建应用程序索引
+        self.build_apps_index()
+        self.save_apps_index()
+
+        elapsed = time.time() - start_time
+        self.set_status(f"索引完成，共耗时 {elapsed:.2f} 秒")
+        return elapsed
+
+    def get_drives(self):
+        """获取所有磁盘驱动器"""
+        if os.name == 'nt':  # Windows系统
+            import win32api
+            drives = win32api.GetLogicalDriveStrings()
+            return drives.split('\000')[:-1]
+        return ['/']  # Linux/Unix/Mac系统
+
+    def run_segments(self, segments, work):
+        """对每个段执行 work(段)，返回结果列表
+
+        多个段同时进行（各自的遍历线程池互不影响，与以前各磁盘并行遍历相同）；
+        多进程分片构建时依次进行，避免进程数成倍增加。
+        """
+        if len(segments) <= 1 or (self.build_processes and self.build_processes > 1):
+            return [work(segment) for segment in segments]
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix="quickfile-segment") as pool:
+            return list(pool.map(work, segments))
+
+    def update_file_index(self, roots=None, incremental=True, resume=True):
+        """更新指定根目录（默认全部）的段：能增量刷新的刷新，其余完整构建，返回 (新增数, 删除数)"""
+        results = self.run_segments(self.select_segments(roots),
+                                    lambda segment: segment.update(incremental, resume))
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+    def build_file_index(self, roots=None, resume=True):
+        """完整构建指定根目录（默认全部）的段，返回文件数（见 IndexSegment.build）"""
+        return sum(self.run_segments(self.select_segments(roots), lambda segment: segment.build(resume)))
+
+    def refresh_file_index(self, roots=None):
+        """增量刷新指定根目录（默认全部）的段，返回 (新增数, 删除数)"""
+        results = self.run_segments(self.select_segments(roots), IndexSegment.refresh)
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+    def build_content_index(self):
+        """增量更新内容索引：索引大小或修改时间变化过的文本文件，返回新索引的文件数"""
+        started = time.perf_counter()
+        try:
+            files = []
+            with self.readers() as tables:
+                for segment, table, generation in tables:
+                    for name_id, name in enumerate(table.get_names()):
+                        if is_text_file(name):
+                            for row in table.rows_for(name_id):
+                                files.append((table.path(row), table.file_size[row], table.file_mtime[row]))
+
+            def is_live(path):
+                segment = self.segment_for(path)
+                if segment is None:
+                    return False
+                with segment.lock:
+                    return segment.file_index.find_row(path) >= 0
+
+            count = self.content_index.update(files, self.content_max_size, is_live=is_live,
+                                              status=self.set_status, governor=self.governor)
+            self.set_status(f"内容索引完成，新索引 {count} 个文件")
+            metrics.observe("quickfile_index_build_seconds", time.perf_counter() - started, "建立索引的耗时",
+                            {"mode": "content"})
+            return count
+        except Exception as e:
+            print(f"构建内容索引失败: {e}")
+            return 0
+
+    def refresh_due_segments(self):
+        """增量刷新按间隔刷新且已到时间的段，返回 (新增数, 删除数)"""
+        return self.refresh_file_index([segment.path for segment in self.due_segments()])
+
+    def apply_changes(self, added=(), removed=(), removed_dirs=()):
+        """批量应用文件系统事件，按路径分给所属的段
+
+        added 为 [(路径, 大小, 修改时间)]，removed 为文件路径列表，removed_dirs 为被删除的目录树。
+        返回 (新增数, 删除数)。
+        """
+        batches = {}
+        for item in added:
+            segment = self.segment_for(item[0])
+            if segment is not None:
+                batches.setdefault(segment, ([], [], []))[0].append(item)
+        for path in removed:
+            segment = self.segment_for(path)
+            if segment is not None:
+                batches.setdefault(segment, ([], [], []))[1].append(path)
+        for path in removed_dirs:
+            # 目录所属的段，以及根目录位于这个目录之下的段
+            owner = self.segment_for(path)
+            prefix = path.rstrip(os.sep) + os.sep
+            for segment in self.segments:
+                if segment is owner or segment.path.startswith(prefix):
+                    batches.setdefault(segment, ([], [], []))[2].append(path)
+        added_count = removed_count = 0
+        for segment, (segment_added, segment_removed, segment_dirs) in batches.items():
+            counts = segment.apply_changes(segment_added, segment_removed, segment_dirs)
+            added_count += counts[0]
+            removed_count += counts[1]
+        return added_count, removed_count
+
+    def revalidate_file(self, path):
+        """重新读取单个已索引文件的大小与修改时间，并更新索引；文件已消失时从索引中删除
+
+        返回 (大小, 修改时间)，文件已消失时返回 None；其他错误（如无权限）抛出 OSError。
+        """
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+        segment = self.segment_for(path)
+        if segment is not None:
+            segment.revalidate_file(path, st)
+        return (st.st_size, st.st_mtime) if st is not None else None
+
+    def build_apps_index(self):
+        """构建应用程序索引：只重新读取 mtime 变化的目录（见 apps.AppScanner）"""
+        started = time.perf_counter()
+        cache = {}
+        if os.path.exists(self.apps_file):
+            try:
+                index_file = AppIndexFile(self.apps_file)
+                try:
+                    cache = index_file.dir_cache()
+                finally:
+                    index_file.close()
+            except Exception as e:
+                print(f"读取应用索引缓存失败: {e}")
+
+        scanner = AppScanner()
+        self.app_dirs = scanner.scan(cache)
+        self.set_apps(collect_apps(self.app_dirs))
+        count = len(self.apps_index)
+        self.set_status(f"已索引 {count} 个应用程序（重新读取 {scanner.rescanned} 个目录）")
+        metrics.observe("quickfile_index_build_seconds", time.perf_counter() - started, "建立索引的耗时",
+                        {"mode": "apps"})
+        metrics.inc("quickfile_apps_dirs_rescanned_total", scanner.rescanned, "重建应用索引时重新读取的目录数")
+        metrics.inc("quickfile_apps_desktop_parsed_total", scanner.reparsed, "重新解析的 .desktop 文件数")
+        return count
@@ -0,0 +1,223 @@
+"""建立索引时的资源调度
+
+在共享的构建服务器上全速遍历整个磁盘会占满 I/O，影响其他任务。ResourceGovernor 包在索引构建外面：
+
+- 限速：每秒最多处理多少个文件（目录至少按 1 个计），超出时让遍历线程等待；
+  遍历结果队列有上限，消费端等待时工作线程也会随之停下，磁盘访问一同减速；
+- 低优先级：降低遍历线程的 CPU 优先级（nice）和 I/O 优先级（Linux ionice 空闲级别，
+  Windows 后台模式，macOS 后台线程）；
+- 暂停 / 继续 / 停止：停止时已完成的目录照常写入索引并记录快照，
+  下次增量刷新从未完成的目录继续；
+- 空闲时段与系统负载：只在指定的时间段内、系统负载低于上限时运行，否则等待。
+"""
+
+import os
+import sys
+import time
+import ctypes
+import platform
+import threading
+
+
+# ioprio_set 的系统调用号（Python 没有封装）
+IOPRIO_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "riscv64": 30,
+                   "armv7l": 314, "ppc64le": 273, "s390x": 282}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+LOW_PRIORITY_NICE = 10
+WAIT_INTERVAL = 0.5             # 暂停或等待空闲时段时检查状态的间隔（秒）
+
+
+def parse_idle_window(text):
+    """把 "22-7" 解析为 (22, 7)（表示 22 点到次日 7 点）"""
+    start, end = text.split("-")
+    start, end = int(start), int(end)
+    if not (0 <= start < 24 and 0 <= end <= 24):
+        raise ValueError(f"无效的时间段: {text}")
+    return start, end
+
+
+def lower_thread_priority():
+    """降低当前线程的 CPU 与 I/O 优先级（失败时忽略）
+
+    Linux 上 nice 与 I/O 优先级按线程生效，并由之后创建的线程继承。
+    """
+    system = platform.system()
+    try:
+        if system == "Linux":
+            tid = threading.get_native_id()
+            current = os.getpriority(os.PRIO_PROCESS, tid)
+            if current < LOW_PRIORITY_NICE:
+                os.setpriority(os.PRIO_PROCESS, tid, LOW_PRIORITY_NICE)
+            number = IOPRIO_SYSCALLS.get(platform.machine())
+            if number is not None:
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.syscall(number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+        elif system == "Windows":
+            import win32api
+            import win32process
+            win32process.SetThreadPriority(win32api.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+        elif system == "Darwin" and hasattr(os, "PRIO_DARWIN_THREAD"):
+            os.setpriority(os.PRIO_DARWIN_THREAD, 0, os.PRIO_DARWIN_BG)
+    except Exception as e:
+        print(f"降低索引线程优先级失败: {e}", file=sys.stderr)
+
+
+class ResourceGovernor:
+    """索引构建的限速、优先级、暂停/继续与空闲时段调度
+
+    索引构建每处理一批文件调用一次 throttle(数量)；返回 False 表示已请求停止，调用方应保存进度后退出。
+    """
+
+    def __init__(self, files_per_second=None, low_priority=False, idle_window=None, max_load=None,
+                 status_callback=None):
+        self.files_per_second = files_per_second  # 每秒最多处理的文件数，None 表示不限
+        self.low_priority = low_priority          # 是否以低 CPU/I/O 优先级运行
+        self.idle_window = idle_window            # (开始小时, 结束小时)，None 表示任何时间
+        self.max_load = max_load                  # 1 分钟平均负载超过此值时等待（仅 POSIX）
+        self.status_callback = status_callback
+        self.running = threading.Event()          # 未暂停时置位
+        self.running.set()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """开始新一轮构建：清零统计"""
+        self.processed = 0
+        self.active_time = 0.0          # 不含暂停与等待的运行时间
+        self.resumed_at = time.monotonic()
+        self.budget_start = self.resumed_at
+        self.budget_count = 0
+        self.waiting = None             # 正在等待的原因
+
+    def start(self):
+        """在索引线程中调用：清除停止标志、清零统计，并按配置降低当前线程优先级"""
+        self.stopped.clear()
+        self.reset()
+        if self.low_priority:
+            lower_thread_priority()
+
+    def thread_initializer(self):
+        """遍历工作线程的初始化函数（Windows、macOS 上优先级不继承，需每个线程单独设置）"""
+        if self.low_priority:
+            lower_thread_priority()
+
+    def process_config(self, processes):
+        """多进程构建时传给每个子进程的配置（总速度上限平均分给各进程）"""
+        rate = self.files_per_second
+        return dict(
+            files_per_second=rate / processes if rate else None,
+            low_priority=self.low_priority,
+            idle_window=self.idle_window,
+            max_load=self.max_load,
+        )
+
+    # 控制
+    def pause(self):
+        """暂停索引（在下一次 throttle 时生效）"""
+        self.running.clear()
+
+    def resume(self):
+        """继续索引"""
+        self.running.set()
+
+    def stop(self):
+        """停止索引；已完成的部分会被保存，下次增量刷新时继续"""
+        self.stopped.set()
+        self.running.set()
+
+    def is_paused(self):
+        return not self.running.is_set()
+
+    def is_stopped(self):
+        return self.stopped.is_set()
+
+    # 调度
+    def in_idle_window(self, now=None):
+        """当前时间是否在允许运行的时间段内"""
+        if self.idle_window is None:
+            return True
+        start, end = self.idle_window
+        hour = time.localtime(now).tm_hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def overloaded(self):
+        """系统负载是否超过上限"""
+        if self.max_load is None or not hasattr(os, "getloadavg"):
+            return False
+        return os.getloadavg()[0] > self.max_load
+
+    def wait_reason(self):
+        """需要等待的原因，可以运行时返回 None"""
+        if self.is_paused():
+            return "已暂停"
+        if not self.in_idle_window():
+            start, end = self.idle_window
+            return f"等待空闲时段 {start}:00-{end}:00"
+        if self.overloaded():
+            return f"系统负载超过 {self.max_load}，等待中"
+        return None
+
+    def throttle(self, count=1):
+        """记录处理了 count 个文件，必要时等待；返回 False 表示已请求停止"""
+        with self.lock:
+            self.processed += count
+            self.budget_count += count
+        if self.is_stopped():
+            return False
+        self._wait_until_allowed()
+        if self.is_stopped():
+            return False
+        rate = self.files_per_second
+        if rate:
+            delay = self.budget_start + self.budget_count / rate - time.monotonic()
+            if delay > 0:
+                # 等待期间请求停止时立即返回
+                self.stopped.wait(delay)
+        return not self.is_stopped()
+
+    def _wait_until_allowed(self):
+        reason = self.wait_reason()
+        if reason is None:
+            return
+        self.active_time += time.monotonic() - self.resumed_at
+        while reason is not None and not self.is_stopped():
+            if reason != self.waiting:
+                self.waiting = reason
+                self.report(f"索引{reason}（{self.stats()}）")
+            if self.is_paused():
+                self.running.wait(WAIT_INTERVAL)
+            else:
+                self.stopped.wait(WAIT_INTERVAL)
+            reason = self.wait_reason()
+        self.waiting = None
+        # 等待期间不计入速度，也不累积可突发的额度
+        self.resumed_at = self.budget_start = time.monotonic()
+        self.budget_count = 0
+        if not self.is_stopped():
+            self.report(f"索引继续（{self.stats()}）")
+
+    # 统计
+    def elapsed(self):
+        """不含暂停与等待的运行时间（秒）"""
+        if self.waiting is not None:
+            return self.active_time
+        return self.active_time + time.monotonic() - self.resumed_at
+
+    def stats(self):
+        """进度与吞吐量，例如 "已处理 12000 个文件，平均 850 个/秒" """
+        elapsed = self.elapsed()
+        rate = self.processed / elapsed if elapsed > 0 else 0
+        text = f"已处理 {self.processed} 个文件，平均 {rate:.0f} 个/秒"
+        if self.files_per_second:
+            text += f"（上限 {self.files_per_second:g} 个/秒）"
+        return text
+
+    def report(self, message):
+        if self.status_callback:
+            self.status_callback(message)
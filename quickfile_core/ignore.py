@@ -0,0 +1,202 @@
+"""gitignore 风格的排除规则
+
+每条规则一行，语法与 .gitignore 相同的子集：
+
+    node_modules/       名为 node_modules 的目录（任意层级）
+    *.log               任意层级中匹配的文件或目录（不含 / 的规则只比较名称）
+    /build              只匹配根目录下的 build（含 / 的规则按相对根目录的路径比较）
+    docs/**/tmp         ** 匹配任意层目录
+    !keep.log           取反：重新包含前面规则排除的条目（已排除目录中的条目无法重新包含）
+    # 注释              空行与 # 开头的行被忽略
+
+* 与 ? 不跨越 /，[abc] 为字符集合。后面的规则优先。
+没有取反规则时编译为扩展名集合、名称集合与合并后的正则表达式，每个条目只需少量查找。
+"""
+
+import os
+import re
+import sys
+
+
+def glob_to_regex(pattern):
+    """把一条规则的通配符部分转换为正则表达式（不含锚点）"""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                if pattern.startswith("**/", i):
+                    parts.append("(?:.*/)?")
+                    i += 3
+                    continue
+                parts.append(".*")
+                i += 2
+                continue
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+class IgnoreRule:
+    """一条已解析的规则"""
+
+    __slots__ = ("pattern", "negate", "dir_only", "anchored", "regex")
+
+    def __init__(self, pattern, negate, dir_only, anchored, flags):
+        self.pattern = pattern
+        self.negate = negate
+        self.dir_only = dir_only
+        self.anchored = anchored
+        self.regex = re.compile(glob_to_regex(pattern) + r"\Z", flags)
+
+    def matches(self, name, rel_path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(rel_path if self.anchored else name) is not None
+
+
+class IgnoreRules:
+    """一组排除规则；路径按相对 base 的路径比较（分隔符统一为 /）
+
+    ignore_case 默认在 Windows 与 macOS 上为 True（文件系统通常不区分大小写）。
+    """
+
+    EXTENSION_PATTERN = re.compile(r"^\*\.[^*?\[\]/\\.]+$")
+    LITERAL_PATTERN = re.compile(r"^[^*?\[\]\\]+$")
+
+    def __init__(self, patterns=(), base=None, ignore_case=None):
+        if ignore_case is None:
+            ignore_case = os.name == "nt" or sys.platform == "darwin"
+        self.ignore_case = ignore_case
+        self.base = base
+        flags = re.IGNORECASE if ignore_case else 0
+        self.rules = []
+        for line in patterns:
+            rule = self.parse(line, flags)
+            if rule is not None:
+                self.rules.append(rule)
+        self.has_negation = any(rule.negate for rule in self.rules)
+        self.anchored = any(rule.anchored for rule in self.rules)
+        self._compile_fast(flags)
+
+    @staticmethod
+    def parse(line, flags):
+        """解析一行规则，空行与注释返回 None"""
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            return None
+        return IgnoreRule(line, negate, dir_only, anchored, flags)
+
+    def _compile_fast(self, flags):
+        """没有取反规则时把规则合并：扩展名集合、名称集合，其余合并为一个正则表达式"""
+        self.file_extensions = set()
+        self.file_names = set()
+        self.dir_names = set()
+        file_name_patterns = []
+        dir_name_patterns = []
+        file_path_patterns = []
+        dir_path_patterns = []
+        if self.has_negation:
+            return
+        for rule in self.rules:
+            pattern = rule.pattern
+            if not rule.anchored:
+                if self.EXTENSION_PATTERN.match(pattern):
+                    extension = pattern[1:]
+                    if not rule.dir_only:
+                        self.file_extensions.add(self.fold(extension))
+                    dir_name_patterns.append(glob_to_regex(pattern))
+                    continue
+                if self.LITERAL_PATTERN.match(pattern):
+                    if not rule.dir_only:
+                        self.file_names.add(self.fold(pattern))
+                    self.dir_names.add(self.fold(pattern))
+                    continue
+            regex = glob_to_regex(pattern)
+            if rule.anchored:
+                dir_path_patterns.append(regex)
+                if not rule.dir_only:
+                    file_path_patterns.append(regex)
+            else:
+                dir_name_patterns.append(regex)
+                if not rule.dir_only:
+                    file_name_patterns.append(regex)
+
+        def combine(patterns):
+            return re.compile("(?:" + "|".join(patterns) + r")\Z", flags) if patterns else None
+
+        self.file_name_regex = combine(file_name_patterns)
+        self.dir_name_regex = combine(dir_name_patterns)
+        self.file_path_regex = combine(file_path_patterns)
+        self.dir_path_regex = combine(dir_path_patterns)
+
+    def fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def relative(self, dir_path, name):
+        """条目相对 base 的路径"""
+        base = self.base
+        if base and (dir_path == base or dir_path.startswith(base)):
+            dir_path = dir_path[len(base):]
+        rel = dir_path.strip("/\\")
+        if os.sep != "/":
+            rel = rel.replace(os.sep, "/")
+        return f"{rel}/{name}" if rel else name
+
+    def excludes(self, dir_path, name, is_dir):
+        """dir_path 目录中名为 name 的条目是否被排除"""
+        if not self.rules:
+            return False
+        rel_path = self.relative(dir_path, name) if self.anchored else name
+        if self.has_negation:
+            excluded = False
+            for rule in self.rules:
+                if rule.negate == excluded and rule.matches(name, rel_path, is_dir):
+                    excluded = not rule.negate
+            return excluded
+        folded = self.fold(name)
+        if is_dir:
+            if folded in self.dir_names:
+                return True
+            name_regex, path_regex = self.dir_name_regex, self.dir_path_regex
+        else:
+            if folded in self.file_names:
+                return True
+            dot = folded.rfind(".")
+            if dot >= 0 and folded[dot:] in self.file_extensions:
+                return True
+            name_regex, path_regex = self.file_name_regex, self.file_path_regex
+        if name_regex is not None and name_regex.match(name):
+            return True
+        return path_regex is not None and path_regex.match(rel_path) is not None
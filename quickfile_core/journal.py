@@ -0,0 +1,139 @@
+"""完整构建文件索引时的进度日志（预写日志）
+
+完整构建要遍历整个磁盘，以前只在最后保存一次，中途崩溃或关闭窗口时全部白做。
+构建过程中每完成一批目录就把它们追加到 file_index.journal 并 fsync：
+
+    第一行    {"roots": [...], "started": 时间}
+    之后每行  [[目录, mtime_ns, inode, [子目录名], [[文件名, 大小, 修改时间], ...]], ...]
+
+每行前面是该行 JSON 的 CRC32（十六进制），崩溃时写了一半的最后一行校验失败，读取时丢弃。
+下次启动时从日志恢复已完成的目录及其快照，再从根目录以这些快照遍历：签名未变的已完成目录
+只 stat 一次、不再列出内容，中断期间发生变化的目录和尚未完成的前沿（frontier，即已完成目录中
+尚未完成的子目录与尚未完成的根目录）之下的目录正常扫描。索引保存成功后删除日志。
+"""
+
+import os
+import json
+import time
+import zlib
+
+
+BATCH_FILES = 20000     # 每累计这么多个文件写一次日志
+BATCH_INTERVAL = 5.0    # 或者距上次写入超过这么多秒
+
+
+class IndexJournal:
+    """file_index.journal 的读写"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.roots = []
+        self.dirs = {}          # 已完成的目录 {目录: [mtime_ns, inode, [子目录名]]}
+        self.files = {}         # 已完成目录中的文件 {目录: [(文件名, 大小, 修改时间)]}
+        self.valid_size = 0     # 日志中完整记录的总字节数
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _write(self, record):
+        data = json.dumps(record, separators=(",", ":"))
+        line = f"{zlib.crc32(data.encode('utf-8', 'surrogatepass')):08x} {data}\n"
+        self.file.write(line.encode("utf-8", "surrogatepass"))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def begin(self, roots):
+        """开始新的构建：清空旧日志并记录根目录"""
+        self.close()
+        self.roots = list(roots)
+        self.dirs = {}
+        self.files = {}
+        self.file = open(self.path, "wb")
+        self._write({"roots": self.roots, "started": time.time()})
+
+    def resume(self):
+        """读取已有日志，之后的批次追加在末尾；日志不可用时返回 False"""
+        self.close()
+        if not self.load():
+            return False
+        self.file = open(self.path, "r+b")
+        # 截掉没有写完的最后一行，否则之后追加的记录在下次读取时会被一同丢弃
+        self.file.truncate(self.valid_size)
+        self.file.seek(self.valid_size)
+        return True
+
+    def append(self, batch):
+        """追加一批已完成的目录 [(目录, mtime_ns, inode, [子目录名], [(文件名, 大小, 修改时间)])]"""
+        if not batch:
+            return
+        # 写入的批次不再保留在内存中（构建过程本身已持有这些数据）
+        self._write([[path, mtime_ns, inode, subdirs, [list(f) for f in files]]
+                     for path, mtime_ns, inode, subdirs, files in batch])
+
+    def load(self):
+        """读取日志中的根目录与已完成的目录，返回是否成功"""
+        self.roots = []
+        self.dirs = {}
+        self.files = {}
+        self.valid_size = 0
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except OSError as e:
+            print(f"读取索引日志失败: {e}")
+            return False
+        records = []
+        for line in lines[:-1]:  # 最后一段没有换行，一定是没有写完的记录
+            checksum, _, data = line.partition(b" ")
+            try:
+                if int(checksum, 16) != zlib.crc32(data):
+                    break
+                records.append(json.loads(data.decode("utf-8", "surrogatepass")))
+            except ValueError:
+                break  # 崩溃时没有写完的最后一行
+            self.valid_size += len(line) + 1
+        if not records or not isinstance(records[0], dict):
+            return False
+        self.roots = records[0].get("roots", [])
+        for batch in records[1:]:
+            for path, mtime_ns, inode, subdirs, files in batch:
+                self.dirs[path] = [mtime_ns, inode, subdirs]
+                self.files[path] = [tuple(f) for f in files]
+        return True
+
+    def frontier(self):
+        """待扫描的目录（在 load 之后调用）：已完成目录中尚未完成的子目录，以及尚未完成的根目录"""
+        pending = [root for root in self.roots if root not in self.dirs]
+        for path, snapshot in self.dirs.items():
+            for name in snapshot[2]:
+                child = os.path.join(path, name)
+                if child not in self.dirs:
+                    pending.append(child)
+        # 子目录可能先于父目录完成；位于另一个待扫描目录之下的目录会随它一起遍历，不再单独列出
+        pending_set = set(pending)
+        return [path for path in pending if not self._has_ancestor_in(path, pending_set)]
+
+    @staticmethod
+    def _has_ancestor_in(path, paths):
+        parent = os.path.dirname(path)
+        while parent != path:
+            if parent in paths:
+                return True
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """索引已保存，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除索引日志失败: {e}")
@@ -0,0 +1,266 @@
+"""运行指标：计数器与直方图，以及可选的 cProfile/tracemalloc 采集
+
+用户反馈“搜索很慢”时，状态栏文字和 print 无法说明慢在哪里。各模块把关键路径上的数据记在全局的
+metrics 中（遍历的目录与文件数、stat 失败数、被排除的条目数，搜索的候选数、匹配数与各阶段耗时，
+索引加载与保存的耗时等），可以写入本地文件，也可以在 localhost 上以 Prometheus 文本格式提供。
+
+热路径上先用局部变量累加，每个目录或每次搜索只更新一次指标，开销可以忽略。
+多进程分片构建时子进程中的遍历计数不汇总到父进程。
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+
+# 耗时直方图的桶上限（秒）与数量直方图的桶上限
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    """按固定桶统计的分布（Prometheus 风格的累计桶）"""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """按桶估计分位数（返回所在桶的上限，落在最后一个桶时返回 None）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= target:
+                return self.buckets[index] if index < len(self.buckets) else None
+        return None
+
+
+class MetricsRegistry:
+    """指标注册表：按 (名称, 标签) 保存计数器与直方图"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}       # {(名称, 标签): 指标}
+        self.help = {}          # {名称: (类型, 说明)}
+        self.started = time.time()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = factory()
+                    self.help.setdefault(name, (kind, help_text))
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        """返回（必要时创建）计数器"""
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text="", labels=None, buckets=TIME_BUCKETS):
+        """返回（必要时创建）直方图"""
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def inc(self, name, amount=1, help_text="", labels=None):
+        self.counter(name, help_text, labels).inc(amount)
+
+    def observe(self, name, value, help_text="", labels=None, buckets=TIME_BUCKETS):
+        self.histogram(name, help_text, labels, buckets).observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, help_text="", labels=None):
+        """with metrics.timer("quickfile_index_save_seconds"): ... 记录代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help_text, labels)
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+            self.help = {}
+            self.started = time.time()
+
+    # 导出
+    def snapshot(self):
+        """所有指标的当前值（可直接转为 JSON）"""
+        result = {}
+        for (name, labels), metric in sorted(self.metrics.items()):
+            key = name + _label_text(labels)
+            if isinstance(metric, Counter):
+                result[key] = metric.value
+            else:
+                result[key] = {
+                    "count": metric.count,
+                    "sum": round(metric.sum, 6),
+                    "mean": round(metric.sum / metric.count, 6) if metric.count else None,
+                    "p50": metric.quantile(0.5),
+                    "p99": metric.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in metric.buckets] + ["+Inf"], metric.counts)),
+                }
+        return result
+
+    def prometheus_text(self):
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        described = set()
+        for (name, labels), metric in sorted(self.metrics.items()):
+            if name not in described:
+                described.add(name)
+                kind, help_text = self.help.get(name, ("untyped", ""))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if isinstance(metric, Counter):
+                lines.append(f"{name}{_label_text(labels)} {metric.value}")
+                continue
+            total = 0
+            for bound, count in zip(list(metric.buckets) + ["+Inf"], metric.counts):
+                total += count
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {total}")
+            lines.append(f"{name}_sum{_label_text(labels)} {metric.sum}")
+            lines.append(f"{name}_count{_label_text(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """写入本地文件：.prom 结尾时为 Prometheus 文本格式，否则为 JSON"""
+        try:
+            if path.endswith(".prom"):
+                data = self.prometheus_text()
+            else:
+                data = json.dumps({"started": self.started, "written": time.time(), "metrics": self.snapshot()},
+                                  ensure_ascii=False, indent=2)
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"保存运行指标失败: {e}")
+
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程中以 HTTP 提供 /metrics（Prometheus 文本格式），返回服务器对象（shutdown() 停止）"""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="quickfile-metrics", daemon=True).start()
+        return server
+
+
+metrics = MetricsRegistry()
+
+
+class Profiler:
+    """cProfile 与 tracemalloc 采集（按需开启，开销较大）
+
+    cProfile 只记录调用 start() 的线程；tracemalloc 记录整个进程的内存分配。
+    stop() 把结果写入 output_dir：profile.prof（可用 pstats/snakeviz 查看）、
+    profile.txt（按累计耗时排序的前若干个函数）与 memory.txt（峰值内存与分配最多的代码行）。
+    """
+
+    def __init__(self, output_dir, top=40):
+        self.output_dir = output_dir
+        self.top = top
+        self.profile = None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+        tracemalloc.start(10)
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        """停止采集并写出结果，返回写出的文件列表"""
+        import io
+        import pstats
+        import tracemalloc
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        paths = []
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            prof_path = os.path.join(self.output_dir, "profile.prof")
+            self.profile.dump_stats(prof_path)
+            paths.append(prof_path)
+
+            text = io.StringIO()
+            pstats.Stats(self.profile, stream=text).sort_stats("cumulative").print_stats(self.top)
+            text_path = os.path.join(self.output_dir, "profile.txt")
+            with open(text_path, "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            paths.append(text_path)
+
+            memory_path = os.path.join(self.output_dir, "memory.txt")
+            with open(memory_path, "w", encoding="utf-8") as f:
+                f.write(f"当前 {current / 1048576:.1f} MB，峰值 {peak / 1048576:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:self.top]:
+                    f.write(f"{stat}\n")
+            paths.append(memory_path)
+        except Exception as e:
+            print(f"保存性能分析结果失败: {e}")
+        self.profile = None
+        return paths
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
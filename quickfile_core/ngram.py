@@ -0,0 +1,167 @@
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:  # 可选依赖：没有 numpy 时逐个检查位掩码
+    numpy = None
+
+
+NUMPY_MIN_CANDIDATES = 64   # 候选数少于此值时逐个检查比转换为 numpy 数组更快
+
+_fold_table = None
+
+
+def _get_fold_table():
+    """大小写折叠补充表：re.IGNORECASE 视为相同、但 str.lower() 结果不同的字符（如 ſ/s、ς/σ）"""
+    global _fold_table
+    if _fold_table is None:
+        table = {}
+        for code in range(min(sys.maxunicode, 0x1FFFF) + 1):
+            char = chr(code)
+            lower = char.lower()
+            folded = char.upper().lower()
+            if len(lower) == 1 and len(folded) == 1 and folded != lower:
+                table[code] = folded
+            elif len(lower) > 1:
+                # 如 İ.lower() 为两个字符，re 按单字符小写 i 比较
+                table[code] = folded[0] if len(folded) == 1 else lower[0]
+        # 大写形式为多个字符、但 re 仍视为相同的几对字符
+        table.update({0x1FD3: "\u0390", 0x1FE3: "\u03b0", 0xFB05: "\ufb06"})
+        _fold_table = table
+    return _fold_table
+
+
+def fold_text(text):
+    """把文本折叠为与 re.IGNORECASE 匹配规则一致的小写形式"""
+    if text.isascii():
+        # 补充表中没有 ASCII 字符，lower() 即可
+        return text.lower()
+    table = _get_fold_table()
+    return text.translate(table).lower().translate(table)
+
+
+class CharBits(dict):
+    """{折叠后的字符: 位掩码中的一位}
+
+    小写字母与数字各占一位（0-35），其余字符按码点散列到剩余的 28 位（36-63）。
+    """
+
+    def __init__(self):
+        super().__init__((char, 1 << bit) for bit, char in enumerate("abcdefghijklmnopqrstuvwxyz0123456789"))
+
+    def __missing__(self, char):
+        bit = self[char] = 1 << (36 + ord(char) % 28)
+        return bit
+
+
+_char_bits = CharBits()
+
+
+def char_mask(folded):
+    """折叠后文本的字符集合位掩码（64 位）：名称缺少查询中的某个字符时，(名称掩码 & 查询掩码) != 查询掩码"""
+    # 不同字符可能共用一位，先去重再求和即为按位或
+    return sum(set(map(_char_bits.__getitem__, folded)))
+
+
+def fold_names(names):
+    """返回 (折叠后的文件名列表, 字符集合位掩码 array('Q'))
+
+    折叠结果与原名相同时（多数文件名本来就是小写）列表中直接引用原来的字符串，不另占内存。
+    """
+    folded_names = []
+    masks = array("Q")
+    for name in names:
+        folded = fold_text(name)
+        masks.append(char_mask(folded))
+        folded_names.append(name if folded == name else folded)
+    return folded_names, masks
+
+
+def filter_by_mask(masks, candidates, query_mask):
+    """返回 candidates 中位掩码包含 query_mask 全部位的编号（保持顺序）；candidates 为 None 时检查全部编号
+
+    安装了 numpy 且候选较多时向量化检查；candidates 为 array('I') 或 memoryview 时不复制。
+    """
+    everything = candidates is None
+    if everything:
+        candidates = range(len(masks))
+    if not query_mask:
+        return list(candidates)
+    if numpy is not None and len(candidates) >= NUMPY_MIN_CANDIDATES:
+        if everything:
+            values = numpy.frombuffer(masks, dtype=numpy.uint64)
+            return numpy.flatnonzero((values & numpy.uint64(query_mask)) == numpy.uint64(query_mask)).tolist()
+        if isinstance(candidates, (array, memoryview)):
+            ids = numpy.frombuffer(candidates, dtype=numpy.uint32)
+        else:
+            ids = numpy.fromiter(candidates, dtype=numpy.uint32, count=len(candidates))
+        query_mask = numpy.uint64(query_mask)
+        values = numpy.frombuffer(masks, dtype=numpy.uint64)[ids]
+        return ids[(values & query_mask) == query_mask].tolist()
+    return [name_id for name_id in candidates if masks[name_id] & query_mask == query_mask]
+
+
+class NgramIndex:
+    """文件名字符倒排索引：{折叠后的字符: 含该字符的文件名编号（升序）}
+
+    模糊搜索按子序列匹配（"rpt" 可匹配 "report"），查询中的连续 n-gram 不一定出现在文件名里，
+    因此只能用单字符倒排表做无损的预筛选：匹配的文件名必然包含查询中的每个字符。
+    取最稀有的字符的倒排表作为候选集，用字符集合位掩码排除缺少其他字符的文件名，再交给正则检查。
+    """
+
+    def __init__(self, postings=None):
+        self.postings = postings or {}  # {字符: array('I') 或 memoryview}
+
+    @classmethod
+    def build(cls, names, folded_names=None):
+        """为文件名序列建立倒排表（编号即序列中的位置）；folded_names 为 fold_names 的结果时不再重新折叠"""
+        lists = {}
+        for name_id, name in enumerate(names):
+            folded = folded_names[name_id] if folded_names is not None else fold_text(name)
+            for char in set(folded):
+                posting = lists.get(char)
+                if posting is None:
+                    posting = lists[char] = array("I")
+                posting.append(name_id)
+        return cls(lists)
+
+    def shortest_posting(self, query):
+        """返回查询中最稀有的字符的倒排表（文件名编号升序）；某个字符不在索引中时返回空列表
+
+        其余字符不再逐个与倒排表求交集，由调用方用字符集合位掩码一次检查（见 FileTable.candidate_names）。
+        """
+        shortest = None
+        for char in set(fold_text(query)):
+            posting = self.postings.get(char)
+            if posting is None:
+                return []
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+        return shortest if shortest is not None else []
+
+    def detach(self):
+        """把基于 mmap 的倒排表复制为数组"""
+        for char, posting in list(self.postings.items()):
+            if not isinstance(posting, array):
+                copied = array("I")
+                copied.frombytes(posting.cast("B"))
+                self.postings[char] = copied
+
+    def to_sections(self):
+        """编码为 (字符表, 起始偏移数组, 倒排数据) 三部分"""
+        keys = sorted(self.postings)
+        offsets = array("I", [0])
+        data = array("I")
+        for key in keys:
+            data.extend(self.postings[key])
+            offsets.append(len(data))
+        return keys, offsets, data
+
+    @classmethod
+    def from_sections(cls, keys, offsets, data):
+        """从 mmap 中的三部分重建（倒排表为零拷贝切片）"""
+        postings = {}
+        for index, key in enumerate(keys):
+            postings[key] = data[offsets[index]:offsets[index + 1]]
+        return cls(postings)
@@ -0,0 +1,110 @@
+"""拼音与首字母搜索
+
+含汉字的名称另有两个搜索键：全拼（每个音节首字母大写）与首字母，例如
+"报告2024.docx" → "BaoGao2024.docx" 与 "BG2024.docx"，查询 "baogao" 或 "bg" 都能找到它。
+全拼中音节首字母大写，Scorer 把它当作驼峰边界加分，"bg" 匹配全拼时与匹配首字母得分相近。
+
+文件名的搜索键在建立索引时生成（PinyinKeys）并写入索引文件，搜索时只做位掩码筛选与匹配；
+应用、工作区与命令数量少，搜索时现场转换（带缓存）。
+读音表见 pinyin_data，多音字只取第一个读音。
+"""
+
+import re
+from array import array
+from functools import lru_cache
+
+from .ngram import fold_text, char_mask, filter_by_mask
+from .pinyin_data import READINGS
+
+
+HANZI_PATTERN = re.compile("[\u3007\u4e00-\u9fff]")
+LETTER_PATTERN = re.compile("[a-z]")
+
+_readings = None
+
+
+def get_readings():
+    """返回 {汉字: 拼音}，第一次使用时解析读音表"""
+    global _readings
+    if _readings is None:
+        readings = {}
+        for line in READINGS.splitlines():
+            syllable, chars = line.split(" ", 1)
+            for char in chars:
+                readings.setdefault(char, syllable)
+        _readings = readings
+    return _readings
+
+
+def romanize(text):
+    """返回 (全拼, 首字母)；不含汉字时返回 None。汉字以外的字符原样保留，读音表中没有的汉字也原样保留"""
+    if HANZI_PATTERN.search(text) is None:
+        return None
+    readings = get_readings()
+    full = []
+    initials = []
+    for char in text:
+        syllable = readings.get(char)
+        if syllable is None:
+            full.append(char)
+            initials.append(char)
+        else:
+            full.append(syllable.capitalize())
+            initials.append(syllable[0].upper())
+    return "".join(full), "".join(initials)
+
+
+@lru_cache(maxsize=4096)
+def cached_romanize(text):
+    """romanize 的缓存版本（应用、工作区等在每次搜索时都要转换的名称）"""
+    return romanize(text)
+
+
+def is_pinyin_query(folded):
+    """折叠后的查询是否可能是拼音：含字母且不含汉字"""
+    return LETTER_PATTERN.search(folded) is not None and HANZI_PATTERN.search(folded) is None
+
+
+class PinyinKeys:
+    """含汉字的文件名的拼音搜索键，按文件名编号升序排列
+
+    首字母是全拼的子序列，匹配首字母的查询必然也匹配全拼，
+    因此只保存全拼折叠后的字符集合位掩码，筛选与正则检查都在全拼上做。
+    """
+
+    def __init__(self, name_ids=None, full=None, initials=None, masks=None):
+        self.name_ids = name_ids if name_ids is not None else array("I")   # 文件名编号
+        self.full = full if full is not None else []                        # 全拼
+        self.initials = initials if initials is not None else []            # 首字母
+        self.masks = masks if masks is not None else array("Q")             # 全拼的字符集合位掩码
+
+    @classmethod
+    def build(cls, names, start=0):
+        """为文件名序列中含汉字的文件名生成搜索键（编号为 start 加上序列中的位置）"""
+        keys = cls()
+        for name_id, name in enumerate(names, start):
+            romanized = romanize(name)
+            if romanized is not None:
+                keys.add(name_id, romanized[0], romanized[1], char_mask(fold_text(romanized[0])))
+        return keys
+
+    def add(self, name_id, full, initials, mask):
+        self.name_ids.append(name_id)
+        self.full.append(full)
+        self.initials.append(initials)
+        self.masks.append(mask)
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def candidates(self, query_mask):
+        """返回全拼包含查询中全部字符的条目位置（升序）；全拼与首字母由调用方按需取出（映射加载时才解码）"""
+        return filter_by_mask(self.masks, None, query_mask)
+
+    def detach(self):
+        """把基于 mmap 的搜索键复制到内存"""
+        if not isinstance(self.name_ids, array):
+            self.name_ids = array("I", self.name_ids)
+            self.full = list(self.full)
+            self.initials = list(self.initials)
+            self.masks = array("Q", self.masks)
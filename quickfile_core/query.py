@@ -0,0 +1,689 @@
+"""查询语言
+
+不含下列语法的查询仍按原来的方式，把整段文字当作一个模糊（子序列）查询。
+
+    report                  文件名模糊匹配 report（子序列，与普通查询相同，含汉字的文件名也按拼音匹配）
+    "annual report"         文件名包含这段文字（不区分大小写）
+    re:^IMG_\\d+\\.jpg$       文件名匹配正则表达式（不区分大小写，含空格时加引号：re:"a b"）
+    ext:pdf  ext:jpg;png    扩展名（多个以 ; 或 , 分隔）
+    size:>10mb  size:<=1k  size:1mb..1gb  size:0
+                            文件大小（b、k/kb、m/mb、g/gb、t/tb，按 1024 换算）
+    modified:<7d  modified:>1y  modified:today
+                            修改时间距今（s、min、h、d、w、mo、y）：< 表示更近，> 表示更早
+    modified:2024-05-01  modified:>=2024-01  modified:2024-01-01..2024-03-31
+                            修改日期：< 表示之前，> 表示之后
+    path:src/               所在目录的路径包含这段文字（/ 与 \\ 等同）
+    dir:~/projects          位于该目录之下（含子目录）
+    a b  或  a AND b        同时满足
+    a OR b  或  a | b       满足其一
+    NOT a  或  -a  或  !a   不满足
+    ( ... )                 分组
+
+执行时（FilePlan）先从最有选择性的条件取候选行：文件名条件用文件名倒排索引取候选文件名，
+扩展名、大小与修改时间在索引文件中的排序索引里直接取出一段行号，路径条件先筛选目录再取目录中的行；
+其余条件只在这些候选行上逐行检查，文件名与目录的检查结果按编号缓存。
+"""
+
+import os
+import re
+import time
+import datetime
+
+from .ngram import fold_text
+from .scoring import Scorer
+from .pinyin import cached_romanize
+
+
+FIELDS = {"ext", "size", "modified", "path", "dir", "re"}
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+AGE_UNITS = {"s": 1, "min": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "mo": 30 * 86400, "y": 365 * 86400}
+SIZE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*([a-z]*)$")
+AGE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*([a-z]+)$")
+DATE_PATTERN = re.compile(r"^(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?$")
+COMPARATORS = (">=", "<=", ">", "<", "=")
+
+
+class QueryError(ValueError):
+    """查询语法错误"""
+
+
+# 条件
+class Predicate:
+    """查询中的一个条件；level 为 "name"（只看文件名）、"dir"（只看所在目录）或 "row"（看大小、修改时间）"""
+
+    level = "name"
+    attribute = False       # 是否为文件属性条件（应用、工作区等没有这些属性）
+
+    def test_name(self, name):
+        return True
+
+    def test_dir(self, dir_path):
+        return True
+
+    def test_row(self, table, row):
+        return True
+
+
+class FuzzyTerm(Predicate):
+    """模糊匹配文件名（子序列，不区分大小写）；可能是拼音时也匹配含汉字的文件名的全拼与首字母"""
+
+    def __init__(self, text):
+        self.text = text
+        self.regex = re.compile(".*?".join(map(re.escape, text)), re.IGNORECASE)
+        self.scorer = Scorer(text)
+        self.pinyin = self.scorer.pinyin
+
+    def test_name(self, name):
+        if self.regex.search(name) is not None:
+            return True
+        return self.pinyin and self.scorer.score_pinyin(cached_romanize(name)) is not None
+
+    def score(self, name):
+        """名称的得分，不匹配时返回 None"""
+        return self.scorer.score_name(name) if self.pinyin else self.scorer.score(name)
+
+    def candidates(self, table):
+        candidates = table.candidate_names(self.text)
+        if self.pinyin:
+            # 拼音的候选由索引中的拼音位掩码筛选，逐个检查时再现场转换
+            literal = set(candidates)
+            candidates += sorted({keys.name_ids[position] for keys, positions in table.pinyin_candidates(self.text)
+                                  for position in positions} - literal)
+        return candidates
+
+
+class LiteralTerm(FuzzyTerm):
+    """文件名包含一段文字（不区分大小写）"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.regex = re.compile(re.escape(text), re.IGNORECASE)
+        self.pinyin = False
+
+
+class RegexTerm(Predicate):
+    """文件名匹配正则表达式"""
+
+    def __init__(self, pattern):
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise QueryError(f"正则表达式有误: {e}")
+
+    def test_name(self, name):
+        return self.regex.search(name) is not None
+
+    def candidates(self, table):
+        # 正则无法用倒排索引预筛选，逐个检查文件名（仍比逐行检查少）
+        return range(table.name_count())
+
+
+class ExtTerm(Predicate):
+    """扩展名"""
+
+    attribute = True
+
+    def __init__(self, value):
+        extensions = [ext.strip().lstrip(".") for ext in re.split("[;,]", value) if ext.strip(". ")]
+        if not extensions:
+            raise QueryError("ext: 后面缺少扩展名")
+        self.extensions = extensions
+        self.suffixes = tuple("." + fold_text(ext) for ext in extensions)
+
+    def test_name(self, name):
+        return fold_text(name).endswith(self.suffixes)
+
+
+class RangeTerm(Predicate):
+    """大小或修改时间在 [low, high) 之中（None 表示不限）"""
+
+    level = "row"
+    attribute = True
+
+    def __init__(self, column, low, high):
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def test_row(self, table, row):
+        if self.column == "size":
+            value = table.file_size[row]
+            if value < 0:
+                return False
+        else:
+            value = table.file_mtime[row]
+            if value <= 0:
+                return False
+        return (self.low is None or value >= self.low) and (self.high is None or value < self.high)
+
+
+class PathTerm(Predicate):
+    """所在目录的路径包含一段文字"""
+
+    level = "dir"
+    attribute = True
+
+    def __init__(self, text):
+        self.text = fold_text(text.replace("/", os.sep).replace("\\", os.sep))
+
+    def test_dir(self, dir_path):
+        return self.text in fold_text(os.path.join(dir_path, ""))
+
+
+class DirTerm(Predicate):
+    """位于某个目录之下（含子目录）"""
+
+    level = "dir"
+    attribute = True
+
+    def __init__(self, path):
+        path = os.path.normcase(os.path.abspath(os.path.expanduser(path)))
+        self.path = path
+        self.prefix = os.path.join(path, "")
+
+    def test_dir(self, dir_path):
+        dir_path = os.path.normcase(dir_path)
+        return dir_path == self.path or dir_path.startswith(self.prefix)
+
+
+# 条件的组合
+class AndNode:
+    def __init__(self, children):
+        self.children = children
+
+
+class OrNode:
+    def __init__(self, children):
+        self.children = children
+
+
+class NotNode:
+    def __init__(self, child):
+        self.child = child
+
+
+def _walk(node, negated=False):
+    """逐个产出 (条件, 是否在 NOT 之下)"""
+    if isinstance(node, (AndNode, OrNode)):
+        for child in node.children:
+            yield from _walk(child, negated)
+    elif isinstance(node, NotNode):
+        yield from _walk(node.child, not negated)
+    else:
+        yield node, negated
+
+
+# 值的解析
+def _split_comparator(value):
+    for comparator in COMPARATORS:
+        if value.startswith(comparator):
+            return comparator, value[len(comparator):].strip()
+    return "", value
+
+
+def parse_size(text):
+    """解析 10mb、1.5g、512 等大小（按 1024 换算）"""
+    match = SIZE_PATTERN.match(text.lower())
+    if not match or match.group(2) not in SIZE_UNITS:
+        raise QueryError(f"无法识别的大小: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def _date_range(text):
+    """把 2024、2024-05 或 2024-05-01 转为 [起始, 结束) 的时间戳"""
+    match = DATE_PATTERN.match(text)
+    if not match:
+        return None
+    year, month, day = int(match.group(1)), int(match.group(2) or 1), int(match.group(3) or 1)
+    try:
+        start = datetime.datetime(year, month, day)
+        if match.group(3):
+            end = start + datetime.timedelta(days=1)
+        elif match.group(2):
+            end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            end = datetime.datetime(year + 1, 1, 1)
+    except ValueError:
+        raise QueryError(f"无效的日期: {text}")
+    return start.timestamp(), end.timestamp()
+
+
+def _age_range(text, now):
+    """把 7d、today 等转为 [起始, 结束) 的时间戳；第二个值表示是否为“距今”形式"""
+    text = text.lower()
+    if text in ("today", "yesterday"):
+        midnight = datetime.datetime.combine(datetime.date.today(), datetime.time()).timestamp()
+        if text == "today":
+            return (midnight, None), False
+        return (midnight - 86400, midnight), False
+    match = AGE_PATTERN.match(text)
+    if match and match.group(2) in AGE_UNITS:
+        return (now - float(match.group(1)) * AGE_UNITS[match.group(2)], None), True
+    dates = _date_range(text)
+    if dates is None:
+        raise QueryError(f"无法识别的时间: {text}")
+    return dates, False
+
+
+def size_term(value):
+    """size:>10mb、size:1mb..1gb、size:0"""
+    if ".." in value:
+        low, high = value.split("..", 1)
+        return RangeTerm("size", parse_size(low) if low else None, parse_size(high) + 1 if high else None)
+    comparator, text = _split_comparator(value)
+    size = parse_size(text)
+    low, high = {
+        ">": (size + 1, None), ">=": (size, None), "<": (None, size), "<=": (None, size + 1),
+    }.get(comparator, (size, size + 1))
+    return RangeTerm("size", low, high)
+
+
+def modified_term(value, now=None):
+    """modified:<7d（7 天之内）、modified:>2024-01-01（该日之后）、modified:2024-01..2024-03"""
+    now = now or time.time()
+    if ".." in value:
+        low_text, high_text = value.split("..", 1)
+        low = _age_range(low_text, now) if low_text else None
+        high = _age_range(high_text, now) if high_text else None
+        if (low and low[1]) or (high and high[1]):
+            # 距今时长的范围：modified:1d..7d 表示 1 到 7 天之前
+            return RangeTerm("mtime", high[0][0] if high else None, low[0][0] if low else None)
+        return RangeTerm("mtime", low[0][0] if low else None, high[0][1] if high else None)
+    comparator, text = _split_comparator(value)
+    (start, end), relative = _age_range(text, now)
+    if relative:
+        # 距今的时长：< 表示更近（起始时间之后），> 表示更早
+        if comparator in (">", ">="):
+            return RangeTerm("mtime", None, start)
+        return RangeTerm("mtime", start, None)
+    low, high = {
+        ">": (end, None), ">=": (start, None), "<": (None, start), "<=": (None, end),
+    }.get(comparator, (start, end))
+    return RangeTerm("mtime", low, high)
+
+
+def field_term(field, value):
+    if not value:
+        raise QueryError(f"{field}: 后面缺少内容")
+    if field == "ext":
+        return ExtTerm(value)
+    if field == "size":
+        return size_term(value)
+    if field == "modified":
+        return modified_term(value)
+    if field == "path":
+        return PathTerm(value)
+    if field == "dir":
+        return DirTerm(value)
+    return RegexTerm(value)
+
+
+# 词法与语法分析
+def tokenize(text):
+    """切分查询，返回 [(类型, 值)]，类型为 ( ) AND OR NOT word literal field"""
+    tokens = []
+    depth = 0
+    position = 0
+    length = len(text)
+    while position < length:
+        char = text[position]
+        if char.isspace():
+            position += 1
+            continue
+        if char == "(":
+            tokens.append(("(", char))
+            depth += 1
+            position += 1
+            continue
+        if char == ")" and depth:
+            tokens.append((")", char))
+            depth -= 1
+            position += 1
+            continue
+        if char in "-!" and position + 1 < length and not text[position + 1].isspace():
+            tokens.append(("NOT", char))
+            position += 1
+            continue
+        if char == '"':
+            end = text.find('"', position + 1)
+            end = length if end < 0 else end
+            tokens.append(("literal", text[position + 1:end]))
+            position = end + 1
+            continue
+
+        end = position
+        while end < length and not text[end].isspace():
+            end += 1
+        word = text[position:end]
+        field, colon, value = word.partition(":")
+        if colon and field.lower() in FIELDS and value.startswith('"'):
+            # 带引号的值可以包含空格：path:"My Documents"
+            start = position + len(field) + 2
+            close = text.find('"', start)
+            close = length if close < 0 else close
+            tokens.append(("field", (field.lower(), text[start:close])))
+            position = close + 1
+            continue
+        # 分组中的词末尾多出的右括号属于分组
+        while depth and word.endswith(")") and word.count(")") > word.count("("):
+            word = word[:-1]
+            end -= 1
+        position = end
+        field, colon, value = word.partition(":")
+        if colon and field.lower() in FIELDS:
+            tokens.append(("field", (field.lower(), value)))
+        elif word in ("AND", "&&"):
+            tokens.append(("AND", word))
+        elif word in ("OR", "|", "||"):
+            tokens.append(("OR", word))
+        elif word == "NOT":
+            tokens.append(("NOT", word))
+        else:
+            tokens.append(("word", word))
+    return tokens
+
+
+class Parser:
+    """递归下降：or := and (OR and)*；and := unary+；unary := NOT unary | ( or ) | 条件"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise QueryError(f"多余的 {self.tokens[self.position][1]}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else OrNode(children)
+
+    def parse_and(self):
+        children = []
+        while self.peek() not in (None, ")", "OR"):
+            if self.peek() == "AND":
+                self.take()
+                continue
+            children.append(self.parse_unary())
+        if not children:
+            raise QueryError("缺少查询条件")
+        return children[0] if len(children) == 1 else AndNode(children)
+
+    def parse_unary(self):
+        kind, value = self.take()
+        if kind == "NOT":
+            if self.peek() in (None, ")", "OR", "AND"):
+                raise QueryError("NOT 后面缺少条件")
+            return NotNode(self.parse_unary())
+        if kind == "(":
+            node = self.parse_or()
+            if self.peek() == ")":
+                self.take()
+            return node
+        if kind == "field":
+            return field_term(*value)
+        if kind == "literal":
+            if not value:
+                raise QueryError("引号中没有内容")
+            return LiteralTerm(value)
+        if kind == "word":
+            return FuzzyTerm(value)
+        raise QueryError(f"{value} 的位置不对")
+
+
+class Query:
+    """解析后的查询
+
+    plain 为 True 时查询不含任何语法，按原来的方式把整段文字作为一个模糊查询。
+    """
+
+    def __init__(self, text, root, plain):
+        self.text = text
+        self.root = root
+        self.plain = plain
+        terms = list(_walk(root))
+        # 参与打分的文件名条件：不在 NOT 之下的模糊词与引号中的文字
+        self.scored = [term for term, negated in terms if isinstance(term, FuzzyTerm) and not negated]
+        self.has_attributes = any(term.attribute for term, _ in terms)
+        # 含修改时间条件时结果可能随当前时间变化（如 modified:<7d）
+        self.relative_time = any(isinstance(term, RangeTerm) and term.column == "mtime" for term, _ in terms)
+
+    def matches_name(self, name):
+        """只看名称时是否满足（用于应用、工作区与命令；含文件属性条件的查询不匹配它们）"""
+        return not self.has_attributes and self._eval_name(self.root, name)
+
+    def _eval_name(self, node, name):
+        if isinstance(node, AndNode):
+            return all(self._eval_name(child, name) for child in node.children)
+        if isinstance(node, OrNode):
+            return any(self._eval_name(child, name) for child in node.children)
+        if isinstance(node, NotNode):
+            return not self._eval_name(node.child, name)
+        return node.test_name(name)
+
+    def match_name(self, name):
+        """满足时返回名称的得分，否则返回 None（用于应用、工作区与命令）"""
+        return self.score_name(name) if self.matches_name(name) else None
+
+    def score_name(self, name):
+        """名称的得分：各个模糊词得分之和（没有模糊词时为 0）"""
+        score = 0
+        for term in self.scored:
+            term_score = term.score(name)
+            if term_score is not None:
+                score += term_score
+        return score
+
+    def content_text(self):
+        """全文搜索使用的文字：不在 NOT 之下的普通词与引号中的文字"""
+        return " ".join(term.text for term in self.scored)
+
+    def attribute_filter(self):
+        """最外层 AND 中的文件属性条件（全文搜索时用来过滤结果）"""
+        children = self.root.children if isinstance(self.root, AndNode) else [self.root]
+        return [child for child in children if isinstance(child, Predicate) and child.attribute]
+
+
+def parse_query(text):
+    """解析查询文字，语法有误时抛出 QueryError"""
+    text = text.strip()
+    tokens = tokenize(text)
+    if all(kind == "word" for kind, _ in tokens):
+        return Query(text, FuzzyTerm(text), True)
+    return Query(text, Parser(tokens).parse(), False)
+
+
+def _all(tests):
+    if len(tests) == 1:
+        return tests[0]
+    if len(tests) == 2:
+        first, second = tests
+        return lambda row: first(row) and second(row)
+    return lambda row: all(test(row) for test in tests)
+
+
+def _any(tests):
+    if len(tests) == 2:
+        first, second = tests
+        return lambda row: first(row) or second(row)
+    return lambda row: any(test(row) for test in tests)
+
+
+class FilePlan:
+    """在一个 FileTable 上执行查询：先从索引中取出候选行，再逐行检查其余条件
+
+    AND 取开销最小的条件作为驱动（见 cost），其他能直接从排序索引取行的条件（扩展名、大小、修改时间、目录）
+    估计行数不超过驱动的 INTERSECT_RATIO 倍时先做集合求交。
+    取行时已经精确满足的条件不再逐行检查，例如 "ext:pdf size:>10mb" 只需求交，不必检查任何一行。
+    """
+
+    INTERSECT_RATIO = 20
+    NAME_CHECK_COST = 20        # 检查一个候选文件名的开销约为从排序索引取一行的多少倍
+
+    def __init__(self, query, table):
+        self.query = query
+        self.table = table
+        self.name_caches = {}       # {条件: {文件名编号: 是否满足}}
+        self.dir_sets = {}          # {条件: 满足的目录编号集合}
+        self.matches = None         # rows() 之后：检查其余条件的函数，None 表示候选行全部满足
+
+    def rows(self):
+        """返回候选行，并设置 matches；无法缩小范围时返回全部有效行"""
+        root = self.query.root
+        plan = self.plan(root)
+        if plan is None:
+            self.matches = self.compile(root)
+            table = self.table
+            return table._alive_rows(range(table._row_count()))
+        estimate, fetch, indexed, satisfied = plan
+        if root in satisfied:
+            self.matches = None
+        elif isinstance(root, AndNode):
+            self.matches = _all([self.compile(child) for child in root.children if child not in satisfied])
+        else:
+            self.matches = self.compile(root)
+        return fetch()
+
+    # 逐行检查
+    def compile(self, node):
+        """把条件树编译为 row -> bool 的函数"""
+        table = self.table
+        if isinstance(node, AndNode):
+            return _all([self.compile(child) for child in node.children])
+        if isinstance(node, OrNode):
+            return _any([self.compile(child) for child in node.children])
+        if isinstance(node, NotNode):
+            child_test = self.compile(node.child)
+            return lambda row: not child_test(row)
+        if node.level == "row":
+            values = table.file_size if node.column == "size" else table.file_mtime
+            # 大小 -1、修改时间 0 表示未知，不满足任何范围
+            if node.column == "size":
+                low = max(node.low, 0) if node.low is not None else 0
+            else:
+                low = node.low if node.low is not None and node.low > 0 else 1e-9
+            high = node.high if node.high is not None else float("inf")
+            return lambda row: low <= values[row] < high
+        if node.level == "dir":
+            dir_ids = self.matching_dirs(node)
+            file_dir = table.file_dir
+            return lambda row: file_dir[row] in dir_ids
+
+        names, file_name = table.names, table.file_name
+        cache = self.name_caches.setdefault(node, {})
+        test_name = node.test_name
+
+        def test(row):
+            name_id = file_name[row]
+            result = cache.get(name_id)
+            if result is None:
+                result = cache[name_id] = test_name(names[name_id])
+            return result
+        return test
+
+    def matching_dirs(self, node):
+        dir_ids = self.dir_sets.get(node)
+        if dir_ids is None:
+            dir_ids = self.dir_sets[node] = {dir_id for dir_id, dir_path in enumerate(self.table.dirs)
+                                             if node.test_dir(dir_path)}
+        return dir_ids
+
+    # 候选行
+    def plan(self, node):
+        """返回 (估计行数, 取出候选行的函数, 是否直接从排序索引取行, 取出的行必然满足的条件集合)
+
+        无法缩小范围时返回 None。
+        """
+        table = self.table
+        if isinstance(node, AndNode):
+            plans = sorted((plan for plan in map(self.plan, node.children) if plan is not None), key=self.cost)
+            if not plans:
+                return None
+            driver = plans[0]
+            limit = self.INTERSECT_RATIO * max(driver[0], 1)
+            others = [plan for plan in plans[1:] if plan[2] and plan[0] <= limit]
+            satisfied = set(driver[3]).union(*(plan[3] for plan in others))
+            if all(child in satisfied for child in node.children):
+                satisfied.add(node)
+            if not others:
+                return driver[0], driver[1], driver[2], satisfied
+            # 估计求交后的行数：假设各条件相互独立
+            estimate = driver[0]
+            for plan in others:
+                estimate = estimate * plan[0] // max(1, len(table))
+
+            def intersect():
+                rows = driver[1]()
+                for plan in others:
+                    if not rows:
+                        break
+                    keep = set(plan[1]())
+                    rows = [row for row in rows if row in keep]
+                return rows
+            return estimate, intersect, driver[2], satisfied
+        if isinstance(node, OrNode):
+            plans = [self.plan(child) for child in node.children]
+            if any(plan is None for plan in plans):
+                return None
+            exact = all(child in plan[3] for child, plan in zip(node.children, plans))
+            return (sum(plan[0] for plan in plans), lambda: list(set().union(*(plan[1]() for plan in plans))),
+                    all(plan[2] for plan in plans), {node} if exact else set())
+        if isinstance(node, NotNode):
+            child = node.child
+            if not isinstance(child, RangeTerm):
+                return None
+            # 范围之外：[不限, low) 与 [high, 不限)；未知的值排在最前面，同样在其中
+            ranges = [(None, child.low)] if child.low is not None else []
+            if child.high is not None:
+                ranges.append((child.high, None))
+            return (sum(table.count_in_range(child.column, low, high) for low, high in ranges),
+                    lambda: list(set().union(*(table.rows_in_range(child.column, low, high)
+                                               for low, high in ranges))), True, {node})
+        if node.level == "row":
+            # 下限为空时排序索引中的范围包含未知的值，仍需逐行检查
+            exact = node.low is not None and node.low > 0
+            return (table.count_in_range(node.column, node.low, node.high),
+                    lambda: table.rows_in_range(node.column, node.low, node.high), True, {node} if exact else set())
+        if node.level == "dir":
+            dir_ids = self.matching_dirs(node)
+            return (len(dir_ids) * len(table) // max(1, len(table.dirs)), lambda: table.rows_in_dirs(dir_ids), True,
+                    {node})
+        if isinstance(node, ExtTerm):
+            keys = {suffix[1:] for suffix in node.suffixes}
+            # 扩展名本身含 . 时（如 tar.gz）按最后一段取行，仍需逐行检查
+            exact = all("." not in key for key in keys)
+            keys = {key.rpartition(".")[2] for key in keys}
+            return (table.count_with_extensions(keys), lambda: table.rows_with_extensions(keys), True,
+                    {node} if exact else set())
+        candidates = node.candidates(table)
+        rows_per_name = len(table) / max(1, table.name_count())
+        return int(len(candidates) * rows_per_name), lambda: self.name_rows(node, candidates), False, {node}
+
+    def cost(self, plan):
+        """取出候选行的大致开销：排序索引按行切片，文件名条件要逐个检查候选文件名"""
+        return plan[0] if plan[2] else plan[0] * self.NAME_CHECK_COST
+
+    def name_rows(self, term, candidates):
+        """检查候选文件名，返回满足条件的文件名的全部行（检查结果留给逐行检查使用）"""
+        names = self.table.names
+        cache = self.name_caches.setdefault(term, {})
+        rows = []
+        for name_id in candidates:
+            result = cache[name_id] = term.test_name(names[name_id])
+            if result:
+                rows.extend(self.table.rows_for(name_id))
+        return rows
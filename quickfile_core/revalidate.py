@@ -0,0 +1,56 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Revalidator:
+    """按需重新验证搜索结果中的文件
+
+    搜索结果的大小与修改时间直接取自索引，可能已经过时。界面只把当前可见的文件交给 submit()，
+    由有界线程池在后台 stat，结果通过 on_update(路径, (大小, 修改时间) 或 None) 回调；
+    已消失的文件同时从索引中删除。
+    """
+
+    def __init__(self, engine, on_update, workers=4, max_age=30):
+        self.engine = engine
+        self.on_update = on_update
+        self.max_age = max_age            # 多少秒内验证过的文件不再重复验证
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quickfile-stat")
+        self.lock = threading.Lock()
+        self.checked = {}                 # {路径: 上次验证时间}
+        self.pending = set()              # 已提交、尚未验证的路径
+        self.visible = set()              # 最近一次提交的路径，已不可见的文件不再验证
+
+    def submit(self, paths):
+        """提交一批需要验证的文件（通常是结果列表中可见的行）"""
+        now = time.monotonic()
+        with self.lock:
+            self.visible = set(paths)
+            if len(self.checked) > 10000:
+                self.checked = {p: t for p, t in self.checked.items() if now - t < self.max_age}
+            for path in paths:
+                if path in self.pending or now - self.checked.get(path, -self.max_age) < self.max_age:
+                    continue
+                self.pending.add(path)
+                self.executor.submit(self._check, path)
+
+    def _check(self, path):
+        """在线程池中验证单个文件"""
+        with self.lock:
+            self.pending.discard(path)
+            if path not in self.visible:
+                return
+        try:
+            stats = self.engine.revalidate_file(path)
+        except OSError:
+            return
+        except Exception as e:
+            print(f"验证文件失败: {e}")
+            return
+        with self.lock:
+            self.checked[path] = time.monotonic()
+        self.on_update(path, stats)
+
+    def shutdown(self):
+        """停止线程池，丢弃尚未开始的任务"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
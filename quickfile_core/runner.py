@@ -0,0 +1,212 @@
+"""命令执行与应用启动（不依赖 tkinter）
+
+CommandRunner 在后台线程中运行命令：多个命令可同时运行，stdout/stderr 一有输出就通过回调交给界面，
+支持取消与超时（结束整个进程组，子进程一并结束）。界面线程只提交与接收结果，不会被命令阻塞。
+
+launch_detached / open_path 启动与本进程完全分离的应用：不继承管道（输出丢弃），在新的会话或进程组中运行，
+启动器退出时不受影响。
+"""
+
+import os
+import sys
+import time
+import signal
+import codecs
+import locale
+import platform
+import threading
+import subprocess
+
+
+READ_SIZE = 4096
+KILL_GRACE = 2.0        # 取消或超时时先请求结束，这么多秒后仍未退出则强制结束
+
+
+def _popen_options():
+    """子进程的进程组选项：取消时可以结束整个进程树"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def launch_detached(args):
+    """启动与本进程分离的程序（args 为参数列表），返回进程号"""
+    options = dict(stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True)
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    process = subprocess.Popen(args, **options)
+    if os.name != "nt":
+        # 不等待退出也不留下僵尸进程
+        threading.Thread(target=process.wait, name="quickfile-reap", daemon=True).start()
+    return process.pid
+
+
+def open_path(path):
+    """用系统默认程序打开文件（不等待打开程序退出）"""
+    if platform.system() == "Windows":
+        os.startfile(path)
+    elif platform.system() == "Darwin":
+        launch_detached(["open", path])
+    else:
+        launch_detached(["xdg-open", path])
+
+
+class CommandJob:
+    """一个正在运行或已结束的命令"""
+
+    def __init__(self, job_id, command, timeout):
+        self.id = job_id
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self.started = time.time()
+        self.finished = None
+        self.returncode = None
+        self.cancelled = False
+        self.timed_out = False
+        self.error = None           # 无法启动时的错误信息
+
+    def is_running(self):
+        return self.finished is None
+
+    def status(self):
+        """结束状态的说明"""
+        if self.error:
+            return f"无法执行: {self.error}"
+        if self.is_running():
+            return "运行中"
+        if self.cancelled:
+            return "已取消"
+        if self.timed_out:
+            return f"超时（{self.timeout:g} 秒）已结束"
+        if self.returncode == 0:
+            return "执行成功"
+        return f"执行失败（退出码 {self.returncode}）"
+
+
+class CommandRunner:
+    """在后台线程中并发执行 shell 命令并流式回传输出
+
+    on_output(job, 流名称 "stdout"/"stderr", 文本) 与 on_exit(job) 在后台线程中调用，界面需自行切回主线程。
+    """
+
+    def __init__(self, on_output=None, on_exit=None, timeout=None):
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.timeout = timeout          # 默认超时（秒），None 表示不限
+        self.jobs = {}                  # {编号: CommandJob}，只保留运行中的命令
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.encoding = locale.getpreferredencoding(False)
+
+    def run(self, command, timeout=None, cwd=None):
+        """提交命令，立即返回 CommandJob"""
+        with self.lock:
+            job = CommandJob(self.next_id, command, timeout if timeout is not None else self.timeout)
+            self.next_id += 1
+            self.jobs[job.id] = job
+        threading.Thread(target=self._supervise, args=(job, cwd), name=f"quickfile-cmd-{job.id}",
+                         daemon=True).start()
+        return job
+
+    def running(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job):
+        """取消一个命令（结束其整个进程组）"""
+        job.cancelled = True
+        self._terminate(job)
+
+    def cancel_all(self):
+        for job in self.running():
+            self.cancel(job)
+
+    # 内部
+    def _supervise(self, job, cwd):
+        """启动进程、读取输出并等待结束（每个命令一个线程，stderr 另有一个读取线程）"""
+        try:
+            job.process = subprocess.Popen(job.command, shell=True, cwd=cwd, stdin=subprocess.DEVNULL,
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, **_popen_options())
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job)
+            return
+        if job.cancelled:
+            self._terminate(job)
+        stderr_reader = threading.Thread(target=self._pump, args=(job, job.process.stderr, "stderr"), daemon=True)
+        stderr_reader.start()
+        timer = None
+        if job.timeout:
+            timer = threading.Timer(job.timeout, self._on_timeout, args=(job,))
+            timer.daemon = True
+            timer.start()
+        self._pump(job, job.process.stdout, "stdout")
+        stderr_reader.join()
+        job.returncode = job.process.wait()
+        if timer:
+            timer.cancel()
+        self._finish(job)
+
+    def _pump(self, job, stream, name):
+        """读取一个输出流：有多少读多少（不等整行），按增量解码后回调"""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while True:
+                data = read(READ_SIZE)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text and self.on_output:
+                    self.on_output(job, name, text)
+            text = decoder.decode(b"", final=True)
+            if text and self.on_output:
+                self.on_output(job, name, text)
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+
+    def _on_timeout(self, job):
+        if job.is_running():
+            job.timed_out = True
+            self._terminate(job)
+
+    def _terminate(self, job):
+        """请求结束进程组；KILL_GRACE 秒后仍未退出则强制结束"""
+        process = job.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            if os.name == "nt":
+                # taskkill /T 连同子进程一起结束
+                subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                return
+            os.killpg(process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            return
+        except Exception as e:
+            print(f"结束命令失败: {e}", file=sys.stderr)
+            return
+
+        def kill_later():
+            try:
+                process.wait(KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        threading.Thread(target=kill_later, daemon=True).start()
+
+    def _finish(self, job):
+        job.finished = time.time()
+        with self.lock:
+            self.jobs.pop(job.id, None)
+        if self.on_exit:
+            self.on_exit(job)
@@ -0,0 +1,224 @@
+import os
+import math
+import time
+import heapq
+import threading
+
+from .ngram import fold_text
+from .pinyin import cached_romanize, is_pinyin_query
+from .utils import load_json, save_json
+
+
+# 评分参数（参考 fzf 的评分方式）
+SCORE_MATCH = 16            # 每个匹配字符
+SCORE_GAP_START = -3        # 匹配字符之间出现间隔
+SCORE_GAP_EXTENSION = -1    # 间隔每多一个字符
+BONUS_BOUNDARY = 8          # 匹配字符位于单词开头（开头或分隔符之后）
+BONUS_CAMEL = 7             # 匹配字符为驼峰命名中的大写字母
+BONUS_CONSECUTIVE = 4       # 与上一个匹配字符相邻
+BONUS_FIRST_CHAR = 2        # 第一个匹配字符的边界加分加倍系数
+BONUS_PREFIX = 100          # 查询是名称的前缀
+BONUS_EXACT = 200           # 查询与名称完全相同
+PENALTY_DEPTH = 1           # 文件所在目录每深一层扣分
+MAX_DEPTH_PENALTY = 10
+MAX_FRECENCY_BONUS = 60     # 启动历史最多加分
+PENALTY_KEYWORD = 30        # 应用只有关键词（而不是名称）与查询匹配时扣分
+PENALTY_PINYIN = 20         # 只有拼音（而不是名称本身）与查询匹配时扣分
+
+SEPARATORS = set(" _-./\\()[]{},;:+&@#")
+
+
+class LaunchHistory:
+    """启动历史：记录每个结果（按路径或命令）被打开的次数与最近时间，用于 frecency 排序
+
+    记录（界面线程、后台服务的连接）与搜索（输入时搜索的线程）可能同时进行，加载、修改与遍历都在锁内进行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None         # {路径: [次数, 最近打开时间]}，第一次使用时加载
+        self.generation = 0         # 每记录一次打开加 1（加分变化，缓存的搜索结果随之失效）
+        self.lock = threading.Lock()
+
+    def get_entries(self):
+        with self.lock:
+            if self.entries is None:
+                self.entries = load_json(self.path, {})
+            return self.entries
+
+    def record(self, key):
+        """记录一次打开并保存"""
+        entries = self.get_entries()
+        with self.lock:
+            count = entries.get(key, [0, 0])[0]
+            entries[key] = [count + 1, time.time()]
+            self.generation += 1
+            save_json(self.path, entries)
+
+    def boost(self, key, now=None):
+        """返回某个结果的 frecency 加分（次数越多、越近期，加分越高）"""
+        entry = self.get_entries().get(key)
+        if not entry:
+            return 0
+        count, last = entry
+        age = ((now or time.time()) - last) / 86400
+        if age < 4:
+            weight = 1.0
+        elif age < 14:
+            weight = 0.7
+        elif age < 31:
+            weight = 0.5
+        elif age < 90:
+            weight = 0.3
+        else:
+            weight = 0.1
+        return min(MAX_FRECENCY_BONUS, int(20 * math.log2(1 + count * weight)))
+
+    def boosts_by_name(self):
+        """按文件名分组的加分 {文件名: {目录: 加分}}，搜索文件时无需为每一行拼接路径"""
+        now = time.time()
+        boosts = {}
+        entries = self.get_entries()
+        with self.lock:
+            keys = list(entries)
+        for key in keys:
+            bonus = self.boost(key, now)
+            if bonus:
+                dir_path, name = os.path.split(key)
+                boosts.setdefault(name, {})[dir_path] = bonus
+        return boosts
+
+
+class Scorer:
+    """编译一次的模糊查询：在匹配的同时计算得分
+
+    匹配规则与原来的子序列正则一致（re.IGNORECASE）；
+    得分参考 fzf：连续匹配、单词边界与驼峰加分，间隔扣分，前缀与完全匹配额外加分。
+    查询可能是拼音（含字母且不含汉字）时，含汉字的名称还按全拼与首字母匹配（见 score_pinyin）。
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.folded = fold_text(query)
+        self.pinyin = is_pinyin_query(self.folded)
+
+    def score(self, text, folded=None):
+        """返回文本的得分，不匹配时返回 None；folded 为已折叠的文本（如索引中的折叠列）时不再重新折叠"""
+        query = self.folded
+        if folded is None:
+            folded = fold_text(text)
+        if folded == query:
+            return self._score_positions(text, range(len(query))) + BONUS_EXACT
+
+        # 正向扫描找到最早的完整匹配终点，再反向扫描找到最短的匹配窗口
+        index = 0
+        end = -1
+        for position, char in enumerate(folded):
+            if char == query[index]:
+                index += 1
+                if index == len(query):
+                    end = position + 1
+                    break
+        if end < 0:
+            return None
+        index = len(query) - 1
+        start = end - 1
+        for position in range(end - 1, -1, -1):
+            if folded[position] == query[index]:
+                index -= 1
+                if index < 0:
+                    start = position
+                    break
+
+        positions = []
+        index = 0
+        for position in range(start, end):
+            if index < len(query) and folded[position] == query[index]:
+                positions.append(position)
+                index += 1
+        score = self._score_positions(text, positions)
+        if start == 0 and end == len(query):
+            score += BONUS_PREFIX
+        return score
+
+    def score_pinyin(self, keys):
+        """按拼音搜索键 (全拼, 首字母) 计算得分：两者中较高的得分减去 PENALTY_PINYIN，不匹配时返回 None"""
+        if keys is None:
+            return None
+        scores = [score for score in map(self.score, keys) if score is not None]
+        return max(scores) - PENALTY_PINYIN if scores else None
+
+    def score_name(self, name):
+        """名称的得分；名称本身不匹配时再按拼音匹配（名称的拼音现场转换并缓存）"""
+        score = self.score(name)
+        if score is None and self.pinyin:
+            score = self.score_pinyin(cached_romanize(name))
+        return score
+
+    def _score_positions(self, text, positions):
+        """按匹配位置计算基础得分"""
+        score = 0
+        previous = -2
+        for i, position in enumerate(positions):
+            score += SCORE_MATCH
+            bonus = self._boundary_bonus(text, position)
+            if i == 0:
+                bonus *= BONUS_FIRST_CHAR
+            elif position == previous + 1:
+                bonus = max(bonus, BONUS_CONSECUTIVE)
+            else:
+                score += SCORE_GAP_START + SCORE_GAP_EXTENSION * (position - previous - 2)
+            score += bonus
+            previous = position
+        return score
+
+    @staticmethod
+    def _boundary_bonus(text, position):
+        if position == 0 or text[position - 1] in SEPARATORS:
+            return BONUS_BOUNDARY
+        if text[position].isupper() and text[position - 1].islower():
+            return BONUS_CAMEL
+        return 0
+
+
+def depth_penalty(dir_path):
+    """目录层级越深扣分越多（有上限）"""
+    return min(MAX_DEPTH_PENALTY, dir_path.count(os.sep)) * PENALTY_DEPTH
+
+
+class TopK:
+    """只保留得分最高的 K 个结果的小顶堆；limit 为 None 时保留全部
+
+    得分相同的结果保持加入的先后顺序。
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.heap = []              # (得分, -序号, 结果)
+        self.count = 0              # 加入过的结果总数（即匹配总数）
+
+    def accepts(self, score):
+        """得分为 score 的新结果能否进入前 K 个（用于在拼接路径等工作之前提前淘汰）"""
+        return self.limit is None or len(self.heap) < self.limit or score > self.heap[0][0]
+
+    def push(self, score, item):
+        self.count += 1
+        entry = (score, -self.count, item)
+        if self.limit is None or len(self.heap) < self.limit:
+            heapq.heappush(self.heap, entry)
+        elif score > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def skip(self):
+        """记录一个未进入前 K 个的匹配"""
+        self.count += 1
+
+    def merge(self, other):
+        """并入另一个 TopK 的结果（例如各索引段分别搜索的前 K 个），保持其中结果的先后顺序"""
+        for score, _, item in sorted(other.heap, key=lambda entry: entry[1], reverse=True):
+            self.push(score, item)
+        self.count += other.count - len(other.heap)
+
+    def results(self):
+        """按得分从高到低返回结果"""
+        return [item for _, _, item in sorted(self.heap, reverse=True)]
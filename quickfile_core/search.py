@@ -0,0 +1,479 @@
+import os
+import re
+import time
+import platform
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from .scoring import LaunchHistory, Scorer, TopK, depth_penalty, PENALTY_KEYWORD
+from .utils import format_file_info
+from .metrics import metrics, COUNT_BUCKETS
+from .query import parse_query, FilePlan, QueryError
+from .ngram import fold_text
+from .pinyin import PinyinKeys, cached_romanize
+from .cache import ResultCache, estimate_size
+
+
+CANCEL_CHECK_INTERVAL = 1024  # 每处理多少个条目检查一次取消标志
+RELATIVE_TIME_TTL = 60        # 含距今时间条件（如 modified:<7d）的查询结果缓存的秒数
+SEGMENT_WORKERS = min(8, os.cpu_count() or 1)  # 多个索引段并行搜索的线程数
+
+_segment_pool = None
+_segment_pool_lock = threading.Lock()
+
+
+def segment_pool():
+    """各索引段并行搜索共用的线程池（第一次使用时创建）"""
+    global _segment_pool
+    with _segment_pool_lock:
+        if _segment_pool is None:
+            _segment_pool = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS, thread_name_prefix="quickfile-search")
+        return _segment_pool
+
+
+class SearchCancelled(Exception):
+    """搜索被更新的查询取消"""
+
+
+class SearchEngine:
+    """基于 IndexEngine 的模糊搜索引擎（不依赖 tkinter）"""
+
+    def __init__(self, index_engine, workspaces=None, custom_commands=None):
+        self.index_engine = index_engine
+        self.workspaces = workspaces if workspaces is not None else {}
+        self.custom_commands = custom_commands if custom_commands is not None else {}
+        self.launch_history = LaunchHistory(os.path.join(index_engine.data_dir, "launches.json"))
+        # 文件与内容搜索的前 K 个结果，以及各段的文件名匹配（查询被延长时在其中缩小范围），见 cached_search
+        self.cache = ResultCache()
+        self.match_count = 0          # 上一次搜索匹配的结果总数（limit 之前）
+
+    def search(self, query, search_type="all", cancel_event=None, limit=None):
+        """执行搜索，返回按得分排序的 (名称, 类型, 路径, 信息) 列表
+
+        查询可以使用查询语言（ext:、size:、modified:、path:、dir:、re:、引号、AND/OR/NOT，见 query 模块），
+        语法有误时抛出 QueryError；不含语法的查询按原来的方式做模糊匹配。
+        limit 不为 None 时只返回得分最高的 limit 个结果（匹配总数见 match_count）。
+        cancel_event 被设置时抛出 SearchCancelled。
+        文件与内容的结果按查询缓存，索引或启动历史变化后失效；应用、工作区与命令数量少，每次重新匹配。
+        """
+        query = query.strip()
+        if not query:
+            self.match_count = 0
+            return []
+        started = time.perf_counter()
+        parsed = parse_query(query)
+
+        ranked = TopK(limit)
+        history = self.launch_history
+        if parsed.plain:
+            # 查询只编译一次：正则做快速筛选，Scorer 对筛选出的名称计算得分
+            pattern = '.*?'.join(map(re.escape, query))
+            regex = re.compile(pattern, re.IGNORECASE)
+            scorer = Scorer(query)
+
+            def match_name(name):
+                if regex.search(name):
+                    return scorer.score(name)
+                # 名称本身不匹配时再看含汉字的名称的拼音
+                return scorer.score_pinyin(cached_romanize(name)) if scorer.pinyin else None
+        else:
+            match_name = parsed.match_name
+
+        # 根据搜索类型执行不同搜索
+        ttl = RELATIVE_TIME_TTL if parsed.relative_time else None
+        if search_type in ["all", "file"]:
+            generation = (self.index_engine.generation, history.generation)
+            if parsed.plain:
+                self.cached_search(("file", query), generation, ranked, ttl,
+                                   lambda part: self.search_files(query, scorer, part, cancel_event))
+            else:
+                self.cached_search(("file", query), generation, ranked, ttl,
+                                   lambda part: self.search_files_query(parsed, part, cancel_event))
+
+        if search_type == "content":
+            # 全文搜索只在明确选择时进行，不参与“全部”
+            generation = (self.index_engine.content_index.generation, self.index_engine.generation,
+                          history.generation)
+            if parsed.plain:
+                self.cached_search(("content", query), generation, ranked, ttl,
+                                   lambda part: self.search_content(query, scorer, part, cancel_event))
+            else:
+                text = parsed.content_text()
+                if text:
+                    self.cached_search(("content", query), generation, ranked, ttl,
+                                       lambda part: self.search_content(text, Scorer(text), part, cancel_event,
+                                                                        parsed))
+
+        if search_type in ["all", "app"]:
+            # 搜索应用程序（名称不匹配时再看 .desktop 的关键词）
+            app_details = self.index_engine.app_details
+            for app_name, app_path in self.index_engine.apps_index.items():
+                score = match_name(app_name)
+                if score is None and app_name in app_details:
+                    scores = [keyword_score for keyword_score in map(match_name, app_details[app_name][0])
+                              if keyword_score is not None]
+                    if scores:
+                        score = max(scores) - PENALTY_KEYWORD
+                if score is not None:
+                    info = "应用程序"
+                    if platform.system() == "Windows" and app_path.endswith(".lnk"):
+                        info = "快捷方式"
+                    ranked.push(score + history.boost(app_path), (app_name, "应用", app_path, info))
+
+        if search_type in ["all", "workspace"]:
+            # 搜索工作区
+            for ws_name, items in self.workspaces.items():
+                score = match_name(ws_name)
+                if score is not None:
+                    ranked.push(score + history.boost(ws_name), (ws_name, "工作区", ws_name, f"{len(items)} 个项目"))
+
+        if search_type in ["all", "command"]:
+            # 搜索自定义命令
+            for cmd_name, cmd_data in self.custom_commands.items():
+                score = match_name(cmd_name)
+                if score is not None:
+                    cmd_type = cmd_data.get("type", "未知")
+                    cmd_desc = cmd_data.get("description", "")
+                    ranked.push(score + history.boost(cmd_data["command"]),
+                                (cmd_name, "命令", cmd_data["command"], f"{cmd_type} | {cmd_desc}"))
+
+        self.match_count = ranked.count
+        results = ranked.results()
+        metrics.observe("quickfile_search_seconds", time.perf_counter() - started, "单次搜索的总耗时",
+                        {"type": search_type})
+        metrics.observe("quickfile_search_matches", ranked.count, "单次搜索匹配的结果数",
+                        buckets=COUNT_BUCKETS)
+        return results
+
+    def cached_search(self, key, generation, ranked, ttl, search):
+        """把 key 对应的部分结果并入 ranked：缓存中有同一版本的结果时直接使用，否则执行 search(局部结果) 并缓存
+
+        缓存的是前 K 个结果（TopK，连同匹配总数），本次的 limit 不超过缓存时的 K（或缓存时不限）才能使用；
+        ttl 为缓存的秒数（None 表示直到版本变化）。
+        版本应在搜索之前取得：搜索期间索引有变化时，缓存的结果标记为旧版本，下次不会被使用。
+        """
+        cached = self.cache.get(key, generation)
+        limit = ranked.limit
+        if cached is not None and (cached.limit is None or (limit is not None and limit <= cached.limit)):
+            metrics.inc("quickfile_search_cache_total", 1, "搜索结果缓存的查找次数", {"result": "hit"})
+            ranked.merge(cached)
+            return
+        metrics.inc("quickfile_search_cache_total", 1, "搜索结果缓存的查找次数", {"result": "miss"})
+        part = TopK(limit)
+        search(part)
+        self.cache.put(key, generation, part, estimate_size(part.heap), ttl)
+        ranked.merge(part)
+
+    def fan_out(self, tables, ranked, search_segment):
+        """在各段上执行 search_segment(段, 表, 版本, 局部结果)，把各段的前 K 个合并到 ranked
+
+        只有一个段时直接在当前线程中执行；多个段时并行执行，每段保留自己的前 K 个，最后按得分合并。
+        """
+        if len(tables) == 1:
+            search_segment(*tables[0], ranked)
+            return
+        parts = [TopK(ranked.limit) for _ in tables]
+        futures = [segment_pool().submit(search_segment, *entry, part) for entry, part in zip(tables, parts)]
+        for future in futures:
+            future.result()  # 某段被取消时抛出 SearchCancelled
+        for part in parts:
+            ranked.merge(part)
+
+    def search_files(self, query, scorer, ranked, cancel_event=None):
+        """匹配文件名并把结果加入 ranked（各索引段并行搜索，见 fan_out）
+
+        先用字符倒排索引与字符集合位掩码取候选文件名，只对候选做正则匹配；
+        正则与得分都在索引中预先折叠大小写的文件名上计算，不再使用 re.IGNORECASE、也不再逐个折叠；
+        新查询是缓存中某个查询的延长时，匹配结果必然是它的子集，直接在它的匹配中筛选（见 narrowed_matches）。
+        查询可能是拼音时，再在索引中预先生成的全拼与首字母上匹配含汉字的文件名（得分低于名称本身匹配）；
+        同名文件的名称得分只算一次，再按所在目录的深度和启动历史调整；
+        大小与修改时间取自索引，不逐个 stat，需要时由 Revalidator 按需重新验证。
+        路径只为能进入前 K 个的结果拼接。
+        """
+        boosts = self.launch_history.boosts_by_name()
+        regex = re.compile(".*?".join(map(re.escape, scorer.folded)))
+        # 在索引的快照上搜索，监视器可以同时修改索引
+        with self.index_engine.readers() as tables:
+            self.fan_out(tables, ranked, lambda segment, table, generation, part: self.search_segment_files(
+                segment, table, generation, query, regex, scorer, boosts, part, cancel_event))
+
+    def search_segment_files(self, segment, table, generation, query, regex, scorer, boosts, ranked,
+                             cancel_event=None):
+        """在一个索引段中匹配文件名并把结果加入 ranked（regex 匹配折叠后的文件名）"""
+        started = time.perf_counter()
+        narrowed = self.narrowed_matches(segment, generation, query)
+        pinyin_candidates = None
+        if narrowed is not None:
+            candidates, pinyin_matches = narrowed
+            if pinyin_matches is not None:
+                pinyin_candidates = [(pinyin_matches, range(len(pinyin_matches)))]
+            metrics.inc("quickfile_search_narrowed_total", 1, "在缓存的前缀查询的匹配结果中缩小范围的搜索数")
+        else:
+            candidates = table.candidate_names(query)
+        if not scorer.pinyin:
+            pinyin_candidates = None
+        elif pinyin_candidates is None:
+            pinyin_candidates = table.pinyin_candidates(query)
+        candidates_done = time.perf_counter()
+
+        names, dirs = table.names, table.dirs
+        folded_names = table.get_name_columns()[0]
+        base_names = table.base_names
+        file_dir, file_size, file_mtime = table.file_dir, table.file_size, table.file_mtime
+        dir_penalties = {}
+
+        def push_rows(name_id, name_score):
+            """把一个匹配的文件名的全部行加入 ranked"""
+            filename = names[name_id]
+            name_boosts = boosts.get(filename)
+            for row in table.rows_for(name_id):
+                dir_id = file_dir[row]
+                penalty = dir_penalties.get(dir_id)
+                if penalty is None:
+                    penalty = dir_penalties[dir_id] = depth_penalty(dirs[dir_id])
+                score = name_score - penalty
+                if name_boosts:
+                    score += name_boosts.get(dirs[dir_id], 0)
+                if ranked.accepts(score):
+                    ranked.push(score, (filename, "文件", os.path.join(dirs[dir_id], filename),
+                                        format_file_info(file_size[row], file_mtime[row])))
+                else:
+                    ranked.skip()
+
+        name_ids = array("I")
+        for index, name_id in enumerate(candidates):
+            if cancel_event and index % CANCEL_CHECK_INTERVAL == 0 and cancel_event.is_set():
+                raise SearchCancelled(query)
+            # 基础部分之后新增的文件名不在折叠列中，现场折叠
+            folded = folded_names[name_id] if name_id < base_names else fold_text(names[name_id])
+            if not regex.search(folded):
+                continue
+            name_ids.append(name_id)
+            push_rows(name_id, scorer.score(names[name_id], folded))
+
+        # 拼音：首字母是全拼的子序列，正则只需检查全拼；名称本身已经匹配的文件名不再重复加入
+        pinyin_matches = None
+        if pinyin_candidates is not None:
+            pinyin_matches = PinyinKeys()
+            matched = set(name_ids)
+            checked = 0
+            for keys, positions in pinyin_candidates:
+                for position in positions:
+                    if cancel_event and checked % CANCEL_CHECK_INTERVAL == 0 and cancel_event.is_set():
+                        raise SearchCancelled(query)
+                    checked += 1
+                    full = keys.full[position]
+                    if not regex.search(fold_text(full)):
+                        continue
+                    name_id, initials = keys.name_ids[position], keys.initials[position]
+                    pinyin_matches.add(name_id, full, initials, keys.masks[position])
+                    if name_id not in matched:
+                        push_rows(name_id, scorer.score_pinyin((full, initials)))
+            metrics.observe("quickfile_search_pinyin_candidates", checked, "拼音位掩码筛选后的候选文件名数",
+                            buckets=COUNT_BUCKETS)
+        # 缓存本段的匹配，供之后延长的查询缩小范围
+        size = name_ids.itemsize * len(name_ids)
+        if pinyin_matches is not None:
+            size += (estimate_size(pinyin_matches.full) + estimate_size(pinyin_matches.initials)
+                     + 12 * len(pinyin_matches))
+        self.cache.put(("matches", segment.path, query), generation, (segment, name_ids, pinyin_matches), size)
+        finished = time.perf_counter()
+        metrics.observe("quickfile_search_phase_seconds", candidates_done - started, "文件名搜索各阶段的耗时",
+                        {"phase": "candidates"})
+        metrics.observe("quickfile_search_phase_seconds", finished - candidates_done, "文件名搜索各阶段的耗时",
+                        {"phase": "scoring"})
+        metrics.observe("quickfile_search_candidates", len(candidates), "倒排索引给出的候选文件名数",
+                        buckets=COUNT_BUCKETS)
+        metrics.observe("quickfile_search_name_matches", len(name_ids), "正则匹配的文件名数",
+                        buckets=COUNT_BUCKETS)
+
+    def narrowed_matches(self, segment, generation, query):
+        """返回缓存中 query 或其最长前缀在本段的匹配 (文件名编号, 拼音匹配的 PinyinKeys 或 None)，没有时返回 None
+
+        前缀查询的匹配必然包含 query 的全部匹配（子序列匹配），因此可以只在其中筛选。
+        """
+        for end in range(len(query), 0, -1):
+            cached = self.cache.get(("matches", segment.path, query[:end]), generation)
+            if cached is not None and cached[0] is segment:
+                return cached[1], cached[2]
+        return None
+
+    def search_files_query(self, parsed, ranked, cancel_event=None):
+        """按查询语言匹配文件并把结果加入 ranked（各索引段并行搜索，见 fan_out）
+
+        FilePlan 从索引中取出最有选择性的条件对应的候选行（扩展名与文件名走倒排索引，
+        大小与修改时间走排序索引，路径先筛选目录），其余条件只在候选行上检查；
+        文件名得分按文件名编号只算一次。
+        """
+        boosts = self.launch_history.boosts_by_name()
+        with self.index_engine.readers() as tables:
+            self.fan_out(tables, ranked, lambda segment, table, generation, part: self.search_segment_query(
+                table, parsed, boosts, part, cancel_event))
+
+    def search_segment_query(self, table, parsed, boosts, ranked, cancel_event=None):
+        """在一个索引段中按查询语言匹配文件并把结果加入 ranked"""
+        started = time.perf_counter()
+        plan = FilePlan(parsed, table)
+        rows = plan.rows()
+        matches = plan.matches
+        candidates_done = time.perf_counter()
+
+        names, dirs = table.names, table.dirs
+        file_dir, file_name = table.file_dir, table.file_name
+        file_size, file_mtime = table.file_size, table.file_mtime
+        # 文件名只在打分或进入前 K 个时才解码；有启动历史的文件名预先换成编号
+        boosted = {}
+        for filename, name_boosts in boosts.items():
+            name_id = table.find_name(filename)
+            if name_id >= 0:
+                boosted[name_id] = name_boosts
+        scored = bool(parsed.scored)
+        name_scores = {}
+        dir_penalties = {}
+        matched = 0
+        for index, row in enumerate(rows):
+            if cancel_event and index % CANCEL_CHECK_INTERVAL == 0 and cancel_event.is_set():
+                raise SearchCancelled(parsed.text)
+            if matches is not None and not matches(row):
+                continue
+            matched += 1
+            name_id = file_name[row]
+            score = 0
+            if scored:
+                score = name_scores.get(name_id)
+                if score is None:
+                    score = name_scores[name_id] = parsed.score_name(names[name_id])
+            dir_id = file_dir[row]
+            penalty = dir_penalties.get(dir_id)
+            if penalty is None:
+                penalty = dir_penalties[dir_id] = depth_penalty(dirs[dir_id])
+            score -= penalty
+            name_boosts = boosted.get(name_id)
+            if name_boosts:
+                score += name_boosts.get(dirs[dir_id], 0)
+            if ranked.accepts(score):
+                filename = names[name_id]
+                ranked.push(score, (filename, "文件", os.path.join(dirs[dir_id], filename),
+                                    format_file_info(file_size[row], file_mtime[row])))
+            else:
+                ranked.skip()
+        finished = time.perf_counter()
+        metrics.observe("quickfile_search_phase_seconds", candidates_done - started, "文件名搜索各阶段的耗时",
+                        {"phase": "candidates"})
+        metrics.observe("quickfile_search_phase_seconds", finished - candidates_done, "文件名搜索各阶段的耗时",
+                        {"phase": "scoring"})
+        metrics.observe("quickfile_query_candidate_rows", len(rows), "查询计划从索引中取出的候选行数",
+                        buckets=COUNT_BUCKETS)
+        metrics.observe("quickfile_query_matches", matched, "满足全部查询条件的文件数",
+                        buckets=COUNT_BUCKETS)
+
+    def search_content(self, query, scorer, ranked, cancel_event=None, parsed=None):
+        """在内容索引中查找包含查询中全部词语的文件并把结果加入 ranked
+
+        内容匹配的文件按文件名与查询的匹配得分、目录深度和启动历史排序；
+        已从文件名索引中删除的文件不再返回，大小与修改时间优先取文件名索引中的值。
+        parsed 为查询语言解析结果时，其中的文件属性条件（ext:、size: 等）用来过滤匹配的文件。
+        """
+        matches = self.index_engine.content_index.search(query, cancel_event)
+        if cancel_event and cancel_event.is_set():
+            raise SearchCancelled(query)
+        history = self.launch_history
+        with self.index_engine.readers() as tables:
+            by_segment = {segment: table for segment, table, generation in tables}
+            nodes = parsed.attribute_filter() if parsed else []
+            filters = {}  # {段: [编译后的条件]}，第一次用到某段时编译
+            for index, (path, size, mtime) in enumerate(matches):
+                if cancel_event and index % CANCEL_CHECK_INTERVAL == 0 and cancel_event.is_set():
+                    raise SearchCancelled(query)
+                segment = self.index_engine.segment_for(path, by_segment)
+                if segment is None:
+                    continue
+                table = by_segment[segment]
+                row = table.find_row(path)
+                if row < 0:
+                    continue
+                if nodes:
+                    tests = filters.get(segment)
+                    if tests is None:
+                        plan = FilePlan(parsed, table)
+                        tests = filters[segment] = [plan.compile(node) for node in nodes]
+                    if not all(test(row) for test in tests):
+                        continue
+                dir_path, filename = os.path.split(path)
+                score = (scorer.score_name(filename) or 0) - depth_penalty(dir_path) + history.boost(path)
+                ranked.push(score, (filename, "文件", path,
+                                    format_file_info(table.file_size[row], table.file_mtime[row])))
+
+
+class TypeaheadSearcher:
+    """边输入边搜索：在后台线程执行查询，新的查询会取消尚未完成的旧查询
+
+    submit() 可在每次按键时调用；输入停顿 delay 秒后才真正开始搜索。
+    结果通过 on_results(查询, 搜索类型, 结果, 匹配总数) 在后台线程中回调，界面需自行切回主线程；
+    查询语法有误时调用 on_error(查询, 错误信息)。
+    """
+
+    def __init__(self, search_engine, on_results, delay=0.15, limit=None, on_error=None):
+        self.search_engine = search_engine
+        self.on_results = on_results
+        self.on_error = on_error
+        self.delay = delay
+        self.limit = limit                # 最多返回的结果数，None 表示不限
+        self.condition = threading.Condition()
+        self.pending = None               # 等待执行的 (查询, 搜索类型)
+        self.submitted_at = 0.0
+        self.cancel_event = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="quickfile-search", daemon=True)
+        self.thread.start()
+
+    def submit(self, query, search_type="all", immediate=False):
+        """提交新查询，并取消正在执行的旧查询；immediate 为 True 时（按回车、选择历史记录）不等待输入停顿"""
+        with self.condition:
+            self.pending = (query, search_type)
+            self.submitted_at = time.monotonic() - (self.delay if immediate else 0)
+            self.cancel_event.set()
+            self.condition.notify()
+
+    def stop(self):
+        """停止后台线程"""
+        with self.condition:
+            self.stopped = True
+            self.cancel_event.set()
+            self.condition.notify()
+        self.thread.join()
+
+    def run(self):
+        """后台线程主循环：等待输入停顿后执行最新的查询"""
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                # 去抖：直到最后一次按键后 delay 秒内没有新查询
+                while not self.stopped:
+                    remaining = self.submitted_at + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.stopped:
+                    return
+                query, search_type = self.pending
+                self.pending = None
+                self.cancel_event = cancel_event = threading.Event()
+
+            try:
+                results = self.search_engine.search(query, search_type, cancel_event, self.limit)
+                total = self.search_engine.match_count
+            except SearchCancelled:
+                metrics.inc("quickfile_search_cancelled_total", 1, "被更新的输入取消的搜索数")
+                continue
+            except QueryError as e:
+                if self.on_error and not cancel_event.is_set():
+                    self.on_error(query, str(e))
+                continue
+            except Exception as e:
+                print(f"搜索失败: {e}")
+                continue
+            if not cancel_event.is_set():
+                self.on_results(query, search_type, results, total)
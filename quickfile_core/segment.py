@@ -0,0 +1,557 @@
+"""索引根目录与索引段
+
+每个索引根目录（IndexRoot）有自己的排除规则（gitignore 风格，见 ignore 模块）、文件大小上限与刷新策略，
+对应一个独立的索引段（IndexSegment）：单独的索引文件、目录快照、构建日志与锁。
+重建或刷新一个根目录只遍历并保存这个段，其余段不受影响；根目录嵌套时，外层的段不进入内层根目录。
+
+段文件保存在数据目录的 segments/ 下，文件名由根目录路径与遍历配置（排除规则、大小上限）的摘要组成，
+遍历配置改变后自然对应一个新的段，下次更新索引时完整构建。
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+from .ignore import IgnoreRules
+from .walker import ParallelWalker
+from .table import FileTable, FileTableBuilder
+from . import store
+from . import shard
+from .journal import IndexJournal, BATCH_FILES, BATCH_INTERVAL
+from .metrics import metrics
+
+
+DEFAULT_EXCLUDES = [
+    ".*/",
+    "System Volume Information/", "$Recycle.Bin/", "Windows/",
+    "Program Files/", "Program Files (x86)/", "AppData/",
+    "*.sys", "*.dll", "*.exe", "*.com", "*.tmp", "*.log", "*.bin",
+    "*.msi", "*.cab", "*.dat", "*.ini", "*.db", "*.sqlite",
+]
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024 * 100   # 大于100MB的文件不索引
+REFRESH_POLICIES = ("watch", "manual")      # 或者一个秒数：按该间隔定期增量刷新
+
+
+def normalize_root(path):
+    """根目录的规范形式（绝对路径，展开 ~）"""
+    return os.path.abspath(os.path.expanduser(path))
+
+
+def parse_refresh(value):
+    """解析刷新策略："watch"（实时监视）、"manual"（只在手动更新索引时刷新）或间隔秒数"""
+    if isinstance(value, str) and value in REFRESH_POLICIES:
+        return value
+    try:
+        interval = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的刷新策略: {value!r}（可用 watch、manual 或秒数）")
+    if interval <= 0:
+        raise ValueError(f"刷新间隔必须大于 0: {value!r}")
+    return int(interval) if interval == int(interval) else interval
+
+
+class IndexRoot:
+    """一个索引根目录的配置"""
+
+    def __init__(self, path, excludes=None, max_file_size=DEFAULT_MAX_FILE_SIZE, refresh="watch"):
+        self.path = normalize_root(path)
+        self.excludes = list(DEFAULT_EXCLUDES if excludes is None else excludes)
+        self.max_file_size = max_file_size    # None 表示不限
+        self.refresh = parse_refresh(refresh)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, str):
+            return cls(data)
+        return cls(data["path"], data.get("excludes"), data.get("max_file_size", DEFAULT_MAX_FILE_SIZE),
+                   data.get("refresh", "watch"))
+
+    def to_dict(self):
+        return {"path": self.path, "excludes": self.excludes, "max_file_size": self.max_file_size,
+                "refresh": self.refresh}
+
+    def refresh_interval(self):
+        """定期刷新的间隔（秒），不是按间隔刷新时为 None"""
+        return None if isinstance(self.refresh, str) else self.refresh
+
+    def segment_name(self):
+        """段文件名（不含扩展名）：路径的可读部分加上遍历配置的摘要"""
+        config = json.dumps([self.path, self.excludes, self.max_file_size], ensure_ascii=False)
+        digest = hashlib.sha1(config.encode("utf-8", "surrogatepass")).hexdigest()[:10]
+        slug = re.sub(r"[^0-9A-Za-z._-]+", "_", self.path).strip("_")[-48:] or "root"
+        return f"{slug}-{digest}"
+
+
+class IndexSegment:
+    """一个根目录的文件索引
+
+    共享的设置（遍历并发、多进程构建、资源调度、状态报告）取自所属的 IndexEngine。
+    """
+
+    def __init__(self, engine, root):
+        self.engine = engine
+        self.root = root
+        self.path = root.path
+        self.prefix = self.path if self.path.endswith(os.sep) else self.path + os.sep
+        self.rules = IgnoreRules(root.excludes, self.path)
+        name = root.segment_name()
+        self.index_file = os.path.join(engine.segments_dir, name + ".bin")
+        self.journal_file = os.path.join(engine.segments_dir, name + ".journal")  # 完整构建的进度日志
+        self.file_index = FileTable() # 文件索引（列式存储，见 FileTable），从磁盘加载时以 mmap 为基础
+        self._dir_snapshots = {}      # 目录快照 {目录: [mtime_ns, inode, [子目录名]]}，按需从索引文件读取
+        self.lock = threading.RLock()  # 保护 file_index 的并发读写（监视器与搜索）
+        self.dirty = False             # 自上次保存后索引是否有变化
+        self.generation = 0            # 文件索引每变化一次加 1，搜索据此判断缓存的结果是否过期
+        self.finished_journal = None   # 已完成构建的日志，索引保存成功后删除
+        self.refreshed_at = time.monotonic()  # 上次加载、构建或刷新的时间（按间隔刷新时使用）
+
+    def __repr__(self):
+        return f"IndexSegment({self.path!r})"
+
+    def set_status(self, message):
+        """报告进度；有多个根目录时加上根目录前缀"""
+        if len(self.engine.segments) > 1:
+            message = f"{self.path}: {message}"
+        self.engine.set_status(message)
+
+    def contains(self, path):
+        """路径是否位于本段的根目录之下（不考虑嵌套的其他根目录）"""
+        return path == self.path or path.startswith(self.prefix)
+
+    def excludes(self, path, is_dir):
+        """按本段的排除规则判断路径（只检查最后一级名称与相对路径，上级目录由遍历保证未被排除）"""
+        parent, name = os.path.split(path)
+        return self.rules.excludes(parent, name, is_dir)
+
+    def accepts_size(self, size):
+        """文件大小是否在本段的上限之内"""
+        return self.root.max_file_size is None or size <= self.root.max_file_size
+
+    @property
+    def dir_snapshots(self):
+        """目录快照，第一次访问时才从映射的索引文件中重建"""
+        if self._dir_snapshots is None:
+            mapped = self.file_index.mapped
+            self._dir_snapshots = mapped.dir_snapshots() if mapped is not None else {}
+        return self._dir_snapshots
+
+    @dir_snapshots.setter
+    def dir_snapshots(self, value):
+        self._dir_snapshots = value
+
+    def is_mapped(self):
+        """文件索引是否仍以只读 mmap 为基础"""
+        return self.file_index.mapped is not None
+
+    def replace_file_index(self, file_index, dir_snapshots):
+        """整体替换文件索引，并释放旧的映射"""
+        with self.lock:
+            old = self.file_index
+            self.file_index = file_index
+            self._dir_snapshots = dir_snapshots
+            self.generation += 1
+            old.close()
+
+    @contextlib.contextmanager
+    def reader(self):
+        """读取文件索引：with segment.reader() as (表, 版本): ...
+
+        索引已可修改（不再以 mmap 为基础）时给出快照，读取期间不持有锁，写入可以同时进行；
+        仍以 mmap 为基础时在读取期间持有锁，因为写入前的 detach 会释放映射。
+        读取期间在快照上建立的排序索引之后交回当前索引，下次读取不必重新排序。
+        """
+        self.lock.acquire()
+        locked = True
+        try:
+            table = self.file_index
+            generation = self.generation
+            if table.mapped is None:
+                table = table.snapshot()
+                self.lock.release()
+                locked = False
+            yield table, generation
+        finally:
+            if locked:
+                self.lock.release()
+            else:
+                with self.lock:
+                    table.publish_orders(self.file_index)
+
+    def mutable_file_index(self):
+        """需要修改索引前调用：把映射数据复制为可修改的数组"""
+        if self.is_mapped():
+            # 目录快照同样来自映射，释放前先读出
+            snapshots = self.dir_snapshots
+            self.file_index.detach()
+            self._dir_snapshots = snapshots
+        return self.file_index
+
+    # 持久化
+    def load(self):
+        """加载本段的索引文件（mmap 映射，只读取文件头），返回是否存在"""
+        try:
+            if os.path.exists(self.index_file):
+                with metrics.timer("quickfile_index_load_seconds", "加载索引的耗时", {"index": "file"}):
+                    self.replace_file_index(store.load_table(self.index_file), None)
+                self.refreshed_at = time.monotonic()
+                return True
+        except Exception as e:
+            print(f"加载文件索引 {self.index_file} 失败: {e}")
+            self.replace_file_index(FileTable(), {})
+        return False
+
+    def save(self):
+        """原子地保存本段（先写临时文件再替换，崩溃时旧索引保持完整）"""
+        with self.lock:
+            if os.name == 'nt':
+                # Windows 不允许替换仍被映射的文件
+                self.mutable_file_index()
+            with metrics.timer("quickfile_index_save_seconds", "保存索引的耗时", {"index": "file"}):
+                store.save_table(self.index_file, self.file_index, self.dir_snapshots)
+            self.dirty = False
+            if self.finished_journal is not None:
+                self.finished_journal.discard()
+                self.finished_journal = None
+
+    def delete_files(self):
+        """删除本段的索引文件与构建日志（根目录从配置中移除时）"""
+        with self.lock:
+            self.replace_file_index(FileTable(), {})
+            for path in (self.index_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # 构建
+    def walker_config(self):
+        """并行遍历器的参数（多进程构建时传给子进程）"""
+        engine = self.engine
+        return dict(
+            excludes=self.root.excludes,
+            base=self.path,
+            excluded_paths=engine.nested_roots(self),
+            max_file_size=self.root.max_file_size,
+            workers=engine.walker_workers,
+            drive_workers=engine.drive_workers,
+        )
+
+    def create_walker(self):
+        """按本段的排除规则与引擎的并发配置创建并行遍历器"""
+        return ParallelWalker(thread_initializer=self.engine.governor.thread_initializer, **self.walker_config())
+
+    def has_unfinished_build(self):
+        """是否有被中断（崩溃或关闭）的完整构建等待继续"""
+        return os.path.exists(self.journal_file)
+
+    def update(self, incremental=True, resume=True):
+        """增量刷新（已有快照且没有未完成的构建时）或完整构建，返回 (新增数, 删除数)"""
+        if incremental and self.dir_snapshots and not self.has_unfinished_build():
+            return self.refresh()
+        return self.build(resume=resume), 0
+
+    def build(self, resume=True):
+        """完整构建本段（遍历并行进行）；设置了 build_processes 时改为多进程分片构建，返回文件数
+
+        进度按批写入日志（见 journal 模块）；resume 为 True 且上次的构建被中断时，
+        从日志恢复已完成的目录，只遍历尚未完成的部分。
+        当前没有可用的索引时，已完成的目录随构建加入当前索引，构建过程中即可搜索。
+        按 governor 限速；被停止时已完成的目录照常生效，其余目录保留旧索引中的文件且不记录快照，
+        下次增量刷新时从这些目录继续。
+        """
+        engine = self.engine
+        if engine.build_processes and engine.build_processes > 1:
+            return self.build_sharded()
+        started = time.perf_counter()
+        governor = engine.governor
+        roots = [self.path]
+        count = 0
+        builder = FileTableBuilder()
+
+        journal = IndexJournal(self.journal_file)
+        resumed = resume and journal.exists() and journal.resume() and journal.roots == roots
+        if resumed:
+            self.set_status(f"从上次中断处继续：已完成 {len(journal.dirs)} 个目录，"
+                            f"还有 {len(journal.frontier())} 个待扫描的子树")
+        else:
+            journal.begin(roots)
+        # 快照只为本次遍历到的目录记录；日志中的目录要遍历到并确认未变化才沿用（中断期间可能已删除）
+        dir_snapshots = {}
+        publish = len(self.file_index) == 0
+        if publish and journal.files:
+            self.apply_changes(added=[(os.path.join(dir_path, name), size, mtime)
+                                      for dir_path, files in journal.files.items() for name, size, mtime in files])
+
+        unchanged = set()   # 日志中已完成、本次遍历确认未变化的目录，沿用日志中的文件
+        batch = []
+        batch_files = 0
+        committed_at = time.monotonic()
+
+        def commit():
+            nonlocal batch, batch_files, committed_at
+            journal.append(batch)
+            if publish:
+                self.apply_changes(added=[(os.path.join(dir_path, name), size, mtime)
+                                          for dir_path, _, _, _, files in batch for name, size, mtime in files])
+            batch = []
+            batch_files = 0
+            committed_at = time.monotonic()
+
+        # 继续时以日志中的快照遍历：已完成的目录只 stat 一次，中断期间发生变化的才重新列出
+        walker = self.create_walker()
+        snapshots = journal.dirs if resumed else None
+        for root, files, subdirs, signature in walker.walk(roots, snapshots=snapshots):
+            if signature is None:
+                # 目录已消失或无法访问
+                files = []
+            elif files is not None:
+                dir_snapshots[root] = [signature[0], signature[1], subdirs]
+                batch.append((root, signature[0], signature[1], subdirs, files))
+                batch_files += len(files)
+            else:
+                dir_snapshots[root] = list(journal.dirs[root])
+                unchanged.add(root)
+                files = []  # 日志中已完成且未变化的目录
+            if files:
+                # 更新索引：目录只登记一次，文件只记录目录编号与文件名
+                dir_id = builder.add_dir(root)
+                for file, size, mtime in files:
+                    builder.add_file(dir_id, file, size, mtime)
+
+                    count += 1
+                    if count % 1000 == 0:
+                        self.set_status(f"已索引 {count} 个文件（{governor.stats()}）...")
+            if batch_files >= BATCH_FILES or (batch and time.monotonic() - committed_at >= BATCH_INTERVAL):
+                commit()
+            if not governor.throttle(max(1, len(files))):
+                break
+        commit()
+        journal.close()
+
+        # 日志中恢复的目录（其余日志记录属于已删除或重新列出的目录，丢弃）
+        for dir_path, files in journal.files.items():
+            if dir_path in unchanged and files:
+                dir_id = builder.add_dir(dir_path)
+                for file, size, mtime in files:
+                    builder.add_file(dir_id, file, size, mtime)
+                count += len(files)
+
+        table = builder.build()
+        if governor.is_stopped():
+            with self.lock:
+                old = self.file_index
+                unfinished = {dir_id for dir_id, dir_path in enumerate(old.dirs) if dir_path not in dir_snapshots}
+                for row in old.rows_in_dirs(unfinished):
+                    table.add_file(old.path(row), old.file_size[row], old.file_mtime[row])
+            self._drop_unfinished_snapshots(dir_snapshots)
+        self.replace_file_index(table, dir_snapshots)
+        self.finished_journal = journal
+        self.dirty = True
+        self.refreshed_at = time.monotonic()
+        metrics.observe("quickfile_index_build_seconds", time.perf_counter() - started, "建立索引的耗时",
+                        {"mode": "full"})
+        return count
+
+    def build_sharded(self):
+        """多进程分片构建本段（见 shard 模块），返回文件数
+
+        失败或超时的分片保留旧索引中对应的文件，并且不记录其目录快照，下次增量刷新时重新扫描。
+        """
+        engine = self.engine
+        started = time.perf_counter()
+        shards = shard.plan_shards([self.path], self.create_walker(), engine.build_processes)
+        self.set_status(f"正在用 {engine.build_processes} 个进程构建索引，共 {len(shards)} 个分片...")
+        work_dir = tempfile.mkdtemp(prefix="shards-", dir=engine.data_dir)
+        try:
+            results, failed = shard.run_shards(shards, self.walker_config(), engine.build_processes,
+                                               work_dir, engine.shard_timeout, self.set_status,
+                                               engine.governor)
+            parts = [path for shard_id in sorted(results) for path in results[shard_id]]
+            table, dir_snapshots = shard.merge_partials(parts)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if failed:
+            with self.lock:
+                old = self.file_index
+                for shard_id, error in failed.items():
+                    path, recursive = shards[shard_id]
+                    print(f"分片 {path} 构建失败: {error}")
+                    prefixes = (path.rstrip(os.sep) + os.sep,) if recursive else ()
+                    for row in old.rows_in_dirs(old.dirs_under(prefixes, {path})):
+                        table.add_file(old.path(row), old.file_size[row], old.file_mtime[row])
+                    # 父目录也不记录快照，否则增量刷新会沿用快照中的子目录而不进入该分片
+                    dir_snapshots.pop(os.path.dirname(path), None)
+            self.set_status(f"{len(failed)} 个分片构建失败，已保留其旧索引")
+
+        self.replace_file_index(table, dir_snapshots)
+        # 多进程构建不写进度日志；之前中断的单进程构建已被这次构建取代
+        self.finished_journal = IndexJournal(self.journal_file)
+        self.dirty = True
+        self.refreshed_at = time.monotonic()
+        metrics.observe("quickfile_index_build_seconds", time.perf_counter() - started, "建立索引的耗时",
+                        {"mode": "sharded"})
+        return len(table)
+
+    @staticmethod
+    def _drop_unfinished_snapshots(snapshots):
+        """去掉还有子目录没有快照的目录快照（并逐级去掉其上级目录）
+
+        保存的快照只记录有快照的子目录，这些目录不去掉的话，增量刷新会沿用快照而不进入未完成的子目录。
+        """
+        pending = [path for path, snapshot in snapshots.items()
+                   if any(os.path.join(path, name) not in snapshots for name in snapshot[2])]
+        while pending:
+            path = pending.pop()
+            if snapshots.pop(path, None) is not None:
+                parent = os.path.dirname(path)
+                if parent != path and parent in snapshots:
+                    pending.append(parent)
+
+    def refresh(self):
+        """增量刷新本段：只重新列出 mtime/inode 变化的目录，按差异增删条目
+
+        目录的 mtime 只在其直接子项增删或改名时变化，因此文件内容改动不会触发重新扫描。
+        返回 (新增数, 删除数)。
+        """
+        started = time.perf_counter()
+        governor = self.engine.governor
+        roots = [self.path]
+        old_snapshots = self.dir_snapshots
+        new_snapshots = {}
+        changed = {}  # {目录: {文件名: (大小, 修改时间)}}
+
+        walker = self.create_walker()
+        visited = 0
+        for root, files, subdirs, signature in walker.walk(roots, snapshots=old_snapshots):
+            visited += 1
+            if visited % 1000 == 0:
+                self.set_status(f"已检查 {visited} 个目录（{governor.stats()}）...")
+            if signature is not None:
+                new_snapshots[root] = [signature[0], signature[1], subdirs]
+                if files is not None:
+                    changed[root] = {name: (size, mtime) for name, size, mtime in files}
+            if not governor.throttle(max(1, len(files or ()))):
+                break
+
+        # 消失的目录：旧快照中本次没有访问到的目录（包括被排除或已成为其他根目录的目录）
+        # （被停止时没有访问到的目录不一定已消失，保留其旧快照，下次刷新时再检查）
+        if not governor.is_stopped():
+            for path in old_snapshots:
+                if path not in new_snapshots:
+                    changed[path] = {}
+
+        # 按差异更新索引
+        added = removed = 0
+        if changed:
+            with self.lock:
+                self.mutable_file_index()
+                added, removed = self._apply_dir_diff(changed)
+                self.dirty = True
+
+        # 被停止时保留没有访问到的快照
+        for path, snapshot in old_snapshots.items():
+            if path not in new_snapshots and path not in changed:
+                new_snapshots[path] = snapshot
+        if governor.is_stopped():
+            self._drop_unfinished_snapshots(new_snapshots)
+        self.dir_snapshots = new_snapshots
+        self.refreshed_at = time.monotonic()
+        self.set_status(f"增量刷新完成：检查 {visited} 个目录，新增 {added} 个文件，删除 {removed} 个文件")
+        metrics.observe("quickfile_index_build_seconds", time.perf_counter() - started, "建立索引的耗时",
+                        {"mode": "incremental"})
+        return added, removed
+
+    def _apply_dir_diff(self, changed):
+        """把 {目录: {文件名: (大小, 修改时间)}} 的差异应用到文件索引，返回 (新增数, 删除数)"""
+        table = self.file_index
+        dir_paths = {}
+        for path in changed:
+            dir_id = table.find_dir(path)
+            if dir_id >= 0:
+                dir_paths[dir_id] = path
+
+        removed = 0
+        existing = set()
+        names = table.get_names()
+        for row in table.rows_in_dirs(dir_paths):
+            dir_path = dir_paths[table.file_dir[row]]
+            name = names[table.file_name[row]]
+            current = changed[dir_path].get(name)
+            if current is None:
+                table.remove_row(row)
+                removed += 1
+            else:
+                table.set_stats(row, *current)
+                existing.add((dir_path, name))
+
+        added = 0
+        for dir_path, files in changed.items():
+            for name, (size, mtime) in files.items():
+                if (dir_path, name) not in existing:
+                    table.add_file(os.path.join(dir_path, name), size, mtime)
+                    added += 1
+        # 大小与修改时间也可能变化（影响 size:、modified: 条件与显示的信息），总是增加版本
+        self.dirty = True
+        self.generation += 1
+        return added, removed
+
+    def apply_changes(self, added=(), removed=(), removed_dirs=()):
+        """批量应用文件系统事件
+
+        added 为 [(路径, 大小, 修改时间)]，removed 为文件路径列表，removed_dirs 为被删除的目录树。
+        返回 (新增数, 删除数)。
+        """
+        added_count = removed_count = 0
+        with self.lock:
+            self.mutable_file_index()
+            table = self.file_index
+            for path in removed:
+                if table.remove_path(path):
+                    removed_count += 1
+
+            if removed_dirs:
+                dir_prefixes = tuple(d.rstrip(os.sep) + os.sep for d in removed_dirs)
+                for row in table.rows_in_dirs(table.dirs_under(dir_prefixes, set(removed_dirs))):
+                    table.remove_row(row)
+                    removed_count += 1
+                snapshots = self.dir_snapshots
+                for path in [p for p in snapshots if (p + os.sep).startswith(dir_prefixes)]:
+                    del snapshots[path]
+                    self.dirty = True
+
+            for path, size, mtime in added:
+                if table.add_file(path, size, mtime):
+                    added_count += 1
+
+            if added_count or removed_count:
+                self.dirty = True
+                self.generation += 1
+        return added_count, removed_count
+
+    def forget_dir(self, path):
+        """删除一个目录的快照，下次增量刷新时重新列出它"""
+        with self.lock:
+            if self.dir_snapshots.pop(path, None) is not None:
+                self.dirty = True
+
+    def revalidate_file(self, path, st):
+        """用 stat 结果（文件已消失时为 None）更新单个已索引文件，返回索引是否有变化"""
+        with self.lock:
+            table = self.file_index
+            row = table.find_row(path)
+            if row < 0:
+                return False
+            if st is None:
+                self.mutable_file_index().remove_row(row)
+            elif table.file_size[row] != st.st_size or table.file_mtime[row] != st.st_mtime:
+                self.mutable_file_index().set_stats(row, st.st_size, st.st_mtime)
+            else:
+                return False
+            self.dirty = True
+            self.generation += 1
+            return True
@@ -0,0 +1,241 @@
+"""多进程分片构建文件索引
+
+要索引的根目录被拆成若干分片：根目录足够多时每个根目录（磁盘、挂载点）一个分片，
+否则把根目录拆为“根目录自身的文件”和各个顶层子目录。每个分片在独立进程中遍历，
+写出与 file_index.bin 格式相同的局部索引文件（行数超过上限时分成多个文件，限制单个进程的内存），
+主进程最后按文件名对所有局部索引做 k 路归并，直接生成分组好的 FileTable。
+
+分片先在共享进程池中运行；进程崩溃（进程池损坏）或长时间没有分片完成时，
+未完成的分片改为每个分片一个独立进程重跑，崩溃或超时只影响该分片本身，其余分片的结果照常合并。
+
+限速与低优先级在每个子进程中各自生效（总速度上限平均分给各进程）；
+暂停只能作用于本进程，多进程构建时不支持，停止时终止未完成的分片，按失败的分片处理。
+"""
+
+import os
+import time
+import heapq
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from .walker import ParallelWalker
+from .table import FileTable, FileTableBuilder
+from .governor import ResourceGovernor
+from . import store
+
+
+MAX_ROWS_PER_PART = 1000000   # 单个局部索引文件的最大行数
+
+
+def plan_shards(roots, walker, min_shards):
+    """把根目录拆分为分片 [(路径, 是否递归)]"""
+    roots = list(roots)
+    if len(roots) >= min_shards:
+        return [(root, True) for root in roots]
+    shards = []
+    for root in roots:
+        files, subdirs = walker.scan_dir(root)
+        shards.append((root, False))
+        shards.extend((path, True) for path in walker.subdir_paths(root, subdirs))
+    return shards
+
+
+def build_shard(shard_id, path, recursive, walker_config, work_dir, governor_config=None,
+                max_rows=MAX_ROWS_PER_PART):
+    """在子进程中遍历一个分片并写出局部索引文件，返回 ([局部索引文件], 文件数, 错误数)"""
+    governor = ResourceGovernor(**(governor_config or {}))
+    governor.start()
+    walker = ParallelWalker(thread_initializer=governor.thread_initializer, **walker_config)
+    parts = []
+    count = 0
+    builder = FileTableBuilder()
+    snapshots = {}
+
+    def flush():
+        part_path = os.path.join(work_dir, f"shard-{shard_id}-{len(parts)}.bin")
+        store.save_table(part_path, builder.build(with_ngrams=False), snapshots, with_ngrams=False)
+        parts.append(part_path)
+
+    if recursive:
+        entries = walker.walk([path])
+    else:
+        entries = [(path,) + walker.visit(path, None)]
+    for root, files, subdirs, signature in entries:
+        if signature is not None:
+            snapshots[root] = [signature[0], signature[1], subdirs]
+        if files:
+            dir_id = builder.add_dir(root)
+            for name, size, mtime in files:
+                builder.add_file(dir_id, name, size, mtime)
+            count += len(files)
+        governor.throttle(max(1, len(files)))
+        if len(builder) >= max_rows:
+            flush()
+            builder = FileTableBuilder()
+            snapshots = {}
+    if len(builder) or snapshots or not parts:
+        flush()
+    return parts, count, walker.errors
+
+
+def _terminate(executor):
+    """结束进程池的全部进程（ProcessPoolExecutor 没有公开的终止接口）"""
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def run_shards(shards, walker_config, processes, work_dir, timeout=None, status=None, governor=None):
+    """并行运行全部分片，返回 ({分片编号: [局部索引文件]}, {分片编号: 失败原因})"""
+    context = multiprocessing.get_context("spawn")
+    governor_config = governor.process_config(processes) if governor else None
+    results = {}
+    failed = {}
+    indexed = 0
+
+    def stopped():
+        return governor is not None and governor.is_stopped()
+
+    def report(shard_id, result):
+        nonlocal indexed
+        results[shard_id] = result[0]
+        indexed += result[1]
+        if status:
+            status(f"已完成 {len(results)}/{len(shards)} 个分片，已索引 {indexed} 个文件...")
+
+    # 第一轮：共享进程池
+    retry = []
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+    futures = {executor.submit(build_shard, shard_id, path, recursive, walker_config, work_dir,
+                               governor_config): shard_id
+               for shard_id, (path, recursive) in enumerate(shards)}
+    not_done = set(futures)
+    broken = False
+    last_done = time.monotonic()
+    try:
+        while not_done and not broken and not stopped():
+            done, not_done = wait(not_done, timeout=1, return_when=FIRST_COMPLETED)
+            if not done:
+                if timeout is not None and time.monotonic() - last_done > timeout:
+                    break  # 长时间没有分片完成，视为有分片卡住
+                continue
+            last_done = time.monotonic()
+            for future in done:
+                shard_id = futures[future]
+                try:
+                    report(shard_id, future.result())
+                except BrokenProcessPool:
+                    broken = True
+                    retry.append(shard_id)
+                except Exception as e:
+                    failed[shard_id] = e
+    finally:
+        if broken or not_done:
+            _terminate(executor)
+        else:
+            executor.shutdown()
+    retry.extend(futures[future] for future in not_done)
+    if stopped():
+        for shard_id in retry:
+            failed[shard_id] = InterruptedError("索引已停止")
+        retry = []
+
+    # 第二轮：每个分片一个独立进程，崩溃或超时只影响自身
+    retry.sort()
+    active = {}  # {future: (分片编号, 进程池, 开始时间)}
+    while retry or active:
+        if stopped():
+            for shard_id in retry:
+                failed[shard_id] = InterruptedError("索引已停止")
+            retry = []
+        while retry and len(active) < processes:
+            shard_id = retry.pop(0)
+            path, recursive = shards[shard_id]
+            single = ProcessPoolExecutor(max_workers=1, mp_context=context)
+            future = single.submit(build_shard, shard_id, path, recursive, walker_config, work_dir,
+                                   governor_config)
+            active[future] = (shard_id, single, time.monotonic())
+        done, _ = wait(active, timeout=1, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for future, (shard_id, single, started) in list(active.items()):
+            if future in done:
+                try:
+                    report(shard_id, future.result())
+                except Exception as e:
+                    failed[shard_id] = e
+                single.shutdown(wait=False)
+            elif timeout is not None and now - started > timeout:
+                failed[shard_id] = TimeoutError(f"分片超过 {timeout} 秒未完成")
+                _terminate(single)
+            elif stopped():
+                failed[shard_id] = InterruptedError("索引已停止")
+                _terminate(single)
+            else:
+                continue
+            del active[future]
+    return results, failed
+
+
+def merge_partials(paths):
+    """按文件名 k 路归并多个局部索引，返回 (FileTable, 目录快照)
+
+    每个局部索引的文件名已排序、行已按文件名分组，归并只需顺序读取一遍，不再重新排序。
+    """
+    parts = [store.MappedIndex(path) for path in paths]
+    try:
+        dirs = []
+        dir_offsets = []
+        snapshots = {}
+        for part in parts:
+            dir_offsets.append(len(dirs))
+            dirs.extend(part.dirs)
+            snapshots.update(part.dir_snapshots())
+        # 父目录与子目录可能位于不同的局部索引中，子目录列表按路径重新建立
+        for snapshot in snapshots.values():
+            snapshot[2] = []
+        for dir_path in snapshots:
+            parent = os.path.dirname(dir_path)
+            if parent != dir_path and parent in snapshots:
+                snapshots[parent][2].append(os.path.basename(dir_path))
+
+        def named(part_index):
+            for name_id, name in enumerate(parts[part_index].names):
+                yield name, part_index, name_id
+
+        names = []
+        name_rows = array("I")
+        file_dir = array("I")
+        file_name = array("I")
+        file_size = array("q")
+        file_mtime = array("d")
+        for name, part_index, name_id in heapq.merge(*(named(i) for i in range(len(parts)))):
+            if not names or names[-1] != name:
+                name_rows.append(len(file_dir))
+                names.append(name)
+            part = parts[part_index]
+            start, end = part.name_rows[name_id], part.name_rows[name_id + 1]
+            offset = dir_offsets[part_index]
+            file_dir.extend(dir_id + offset for dir_id in part.file_dir[start:end])
+            file_name.extend([len(names) - 1] * (end - start))
+            file_size.frombytes(part.file_size[start:end].cast("B"))
+            file_mtime.frombytes(part.file_mtime[start:end].cast("B"))
+        name_rows.append(len(file_dir))
+    finally:
+        for part in parts:
+            part.close()
+
+    table = FileTable()
+    table.dirs = dirs
+    table.names = names
+    table.base_names = len(names)
+    table.name_rows = name_rows
+    table.file_dir = file_dir
+    table.file_name = file_name
+    table.file_size = file_size
+    table.file_mtime = file_mtime
+    table.index_names()
+    return table, snapshots
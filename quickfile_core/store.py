@@ -0,0 +1,363 @@
+"""文件索引的二进制存储格式
+
+文件布局（小端或本机字节序，见标志位）::
+
+    头部      magic(8) 版本(u32) 标志(u32) 段数(u32) 保留(u32)
+    段目录    每段 名称(8) 偏移(u64) 长度(u64)
+    DIRPATH   目录路径字符串表（每个目录只存一次）
+    DIRPRNT   每个目录的父目录编号 (i32，-1 表示无)
+    DIRMTIM   每个目录的 mtime_ns (i64，-1 表示没有快照)
+    DIRINOD   每个目录的 inode (u64)
+    NAMES     按字典序排列、去重后的文件名字符串表
+    NAMEROWS  每个文件名在文件行中的起始行号 (u32，共 名称数+1 个)
+    FILEDIR   每个文件所在的目录编号 (u32)
+    FILENAME  每个文件的文件名编号 (u32)
+    FILESIZE  每个文件的大小 (i64，-1 表示未知)
+    FILEMTIM  每个文件的修改时间 (f64，秒)
+    NGKEYS    文件名字符倒排索引的字符表（可选段）
+    NGROWS    每个字符的倒排表在 NGPOST 中的起始位置 (u32，共 字符数+1 个)
+    NGPOST    倒排数据：按字符依次排列的文件名编号 (u32)
+    FOLDNAME  折叠大小写后的文件名字符串表（可选段，与 NG* 一同写出）
+    NAMEMASK  每个文件名的字符集合位掩码 (u64，可选段)
+    PYIDS     含汉字的文件名的编号 (u32，可选段，与 NG* 一同写出)
+    PYFULL    这些文件名的全拼字符串表（可选段）
+    PYINIT    这些文件名的拼音首字母字符串表（可选段）
+    PYMASK    全拼的字符集合位掩码 (u64，可选段)
+    SIZEORD   按文件大小排序的行号 (u32，可选段，与 NG* 一同写出)
+    MTIMORD   按修改时间排序的行号 (u32，可选段)
+    DIRORD    按目录编号分组的行号 (u32，可选段)
+    DIROFF    每个目录在 DIRORD 中的起始位置 (u32，共 目录数+1 个)
+    EXTKEYS   按字典序排列的扩展名字符串表（可选段）
+    EXTORD    按扩展名分组的行号 (u32，可选段)
+    EXTOFF    每个扩展名在 EXTORD 中的起始位置 (u32，共 扩展名数+1 个)
+
+字符串表为 数量(u64) + 偏移数组(u64 × 数量+1) + UTF-8 数据。
+所有段按 8 字节对齐，读取时直接 mmap 并用 memoryview.cast 访问，
+启动只需解析头部，数据页按需加载。文件行按文件名分组，与内存中的 FileTable 布局一致。
+
+头部与段目录的格式是通用的（write_sections / SectionFile），内容索引的段文件也使用同样的格式，
+只是 magic 不同。
+"""
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+from .table import FileTable
+
+
+MAGIC = b"QFINDEX\0"
+VERSION = 2
+FLAG_BIG_ENDIAN = 0x1
+
+HEADER = struct.Struct("<8sIIII")
+SECTION = struct.Struct("<8sQQ")
+
+
+class IndexFormatError(Exception):
+    """索引文件损坏或版本不受支持"""
+
+
+def _section_name(name):
+    return name.encode("ascii").ljust(8, b"\0")
+
+
+def _string_table(strings):
+    """把字符串列表编码为字符串表"""
+    offsets = array("Q", [0])
+    chunks = []
+    total = 0
+    for text in strings:
+        data = text.encode("utf-8", "surrogateescape")
+        chunks.append(data)
+        total += len(data)
+        offsets.append(total)
+    return struct.pack("<Q", len(strings)) + offsets.tobytes() + b"".join(chunks)
+
+
+def fsync_dir(path):
+    """同步目录项，保证 rename 在崩溃后仍然有效（Windows 上不支持，忽略）"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_sections(path, sections, before_replace=None, magic=MAGIC, version=VERSION):
+    """原子写入：先写临时文件并 fsync，再 os.replace 覆盖目标文件"""
+    tmp_path = path + ".tmp"
+    flags = FLAG_BIG_ENDIAN if sys.byteorder == "big" else 0
+    table_size = HEADER.size + SECTION.size * len(sections)
+    offset = (table_size + 7) & ~7
+    entries = []
+    for name, data in sections:
+        entries.append((name, offset, len(data)))
+        offset = (offset + len(data) + 7) & ~7
+
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(magic, version, flags, len(sections), 0))
+        for name, section_offset, length in entries:
+            f.write(SECTION.pack(_section_name(name), section_offset, length))
+        for (name, section_offset, length), (_, data) in zip(entries, sections):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if before_replace:
+        before_replace()
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def save_table(path, table, dir_snapshots, before_replace=None, with_ngrams=True):
+    """把 FileTable 和目录快照写入二进制索引文件
+
+    with_ngrams 为 False 时（多进程构建的中间分片）不写文件名倒排索引与排序索引。
+    """
+    table = table.compacted()
+    dirs = list(table.dirs)
+    dir_ids = {dir_path: index for index, dir_path in enumerate(dirs)}
+    for dir_path in dir_snapshots:
+        if dir_path not in dir_ids:
+            dir_ids[dir_path] = len(dirs)
+            dirs.append(dir_path)
+
+    dir_parent = array("i")
+    dir_mtime = array("q")
+    dir_inode = array("Q")
+    for dir_path in dirs:
+        parent = os.path.dirname(dir_path)
+        dir_parent.append(dir_ids.get(parent, -1) if parent != dir_path else -1)
+        snapshot = dir_snapshots.get(dir_path)
+        dir_mtime.append(snapshot[0] if snapshot else -1)
+        dir_inode.append(snapshot[1] if snapshot else 0)
+
+    sections = [
+        ("DIRPATH", _string_table(dirs)),
+        ("DIRPRNT", dir_parent.tobytes()),
+        ("DIRMTIM", dir_mtime.tobytes()),
+        ("DIRINOD", dir_inode.tobytes()),
+        ("NAMES", _string_table(table.get_names())),
+        ("NAMEROWS", bytes(table.name_rows)),
+        ("FILEDIR", bytes(table.file_dir)),
+        ("FILENAME", bytes(table.file_name)),
+        ("FILESIZE", bytes(table.file_size)),
+        ("FILEMTIM", bytes(table.file_mtime)),
+    ]
+    if with_ngrams:
+        ngram_keys, ngram_rows, ngram_post = table.get_ngrams().to_sections()
+        sections += [
+            ("NGKEYS", _string_table(ngram_keys)),
+            ("NGROWS", ngram_rows.tobytes()),
+            ("NGPOST", ngram_post.tobytes()),
+        ]
+        folded_names, name_masks = table.get_name_columns()
+        sections += [
+            ("FOLDNAME", _string_table(folded_names)),
+            ("NAMEMASK", bytes(name_masks)),
+        ]
+        pinyin = table.get_pinyin()
+        sections += [
+            ("PYIDS", bytes(pinyin.name_ids)),
+            ("PYFULL", _string_table(pinyin.full)),
+            ("PYINIT", _string_table(pinyin.initials)),
+            ("PYMASK", bytes(pinyin.masks)),
+        ]
+        dir_order, dir_offsets = table.dir_order()
+        sections += [
+            ("SIZEORD", bytes(table.column_order("size"))),
+            ("MTIMORD", bytes(table.column_order("mtime"))),
+            ("DIRORD", bytes(dir_order)),
+            ("DIROFF", bytes(dir_offsets)),
+        ]
+        ext_keys, ext_order, ext_offsets = table.ext_order()
+        sections += [
+            ("EXTKEYS", _string_table(ext_keys)),
+            ("EXTORD", bytes(ext_order)),
+            ("EXTOFF", bytes(ext_offsets)),
+        ]
+    write_sections(path, sections, before_replace)
+
+
+class StringTable:
+    """mmap 上的只读字符串表，按编号惰性解码"""
+
+    def __init__(self, view):
+        self.count = struct.unpack_from("<Q", view, 0)[0]
+        end = 8 + 8 * (self.count + 1)
+        self.offsets = view[8:end].cast("Q")
+        self.data = view[end:]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8", "surrogateescape")
+
+    def __iter__(self):
+        data = self.data
+        offsets = self.offsets
+        for index in range(self.count):
+            yield bytes(data[offsets[index]:offsets[index + 1]]).decode("utf-8", "surrogateescape")
+
+    def release(self):
+        self.offsets.release()
+        self.data.release()
+
+
+class SectionFile:
+    """通过 mmap 打开的分段文件，子类在 _parse 中取出各段"""
+
+    def __init__(self, path, magic=MAGIC, version=VERSION):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise IndexFormatError("索引文件为空")
+        self.view = memoryview(self.mm)
+        self.sections = {}
+        self.views = []
+        self.tables = []
+        try:
+            self._parse_header(magic, version)
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse_header(self, expected_magic, expected_version):
+        if len(self.mm) < HEADER.size:
+            raise IndexFormatError("索引文件过短")
+        magic, version, flags, count, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != expected_magic:
+            raise IndexFormatError("不是 QuickFile 索引文件")
+        if version != expected_version:
+            raise IndexFormatError(f"不支持的索引版本 {version}")
+        if bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == "big"):
+            raise IndexFormatError("索引文件字节序与本机不一致")
+        for i in range(count):
+            name, offset, length = SECTION.unpack_from(self.mm, HEADER.size + i * SECTION.size)
+            if offset + length > len(self.mm):
+                raise IndexFormatError("索引文件被截断")
+            self.sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+
+    def _parse(self):
+        pass
+
+    def section(self, name):
+        """返回某个段的 memoryview"""
+        if name not in self.sections:
+            raise IndexFormatError(f"索引文件缺少 {name} 段")
+        offset, length = self.sections[name]
+        view = self.view[offset:offset + length]
+        self.views.append(view)
+        return view
+
+    def array_section(self, name, typecode):
+        """返回按 typecode 解释的段（零拷贝）"""
+        view = self.section(name).cast(typecode)
+        self.views.append(view)
+        return view
+
+    def string_table(self, name):
+        """返回字符串表段"""
+        table = StringTable(self.section(name))
+        self.tables.append(table)
+        return table
+
+    def close(self):
+        """释放映射（Windows 上替换文件前必须先关闭）"""
+        for table in self.tables:
+            table.release()
+        self.tables = []
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.view.release()
+        self.mm.close()
+        self.file.close()
+
+
+class MappedIndex(SectionFile):
+    """通过 mmap 打开的二进制索引文件"""
+
+    def _parse(self):
+        self.dirs = self.string_table("DIRPATH")
+        self.names = self.string_table("NAMES")
+        self.dir_parent = self.array_section("DIRPRNT", "i")
+        self.dir_mtime = self.array_section("DIRMTIM", "q")
+        self.dir_inode = self.array_section("DIRINOD", "Q")
+        self.name_rows = self.array_section("NAMEROWS", "I")
+        self.file_dir = self.array_section("FILEDIR", "I")
+        self.file_name = self.array_section("FILENAME", "I")
+        self.file_size = self.array_section("FILESIZE", "q")
+        self.file_mtime = self.array_section("FILEMTIM", "d")
+
+    def has_ngrams(self):
+        """索引文件中是否包含文件名倒排索引"""
+        return "NGKEYS" in self.sections
+
+    def ngram_sections(self):
+        """返回 (字符列表, 起始偏移, 倒排数据)，后两者为 mmap 上的零拷贝视图"""
+        keys = self.string_table("NGKEYS")
+        return list(keys), self.array_section("NGROWS", "I"), self.array_section("NGPOST", "I")
+
+    def has_name_columns(self):
+        """索引文件中是否包含折叠后的文件名与字符集合位掩码"""
+        return "NAMEMASK" in self.sections
+
+    def name_column_sections(self):
+        """返回 (折叠后的文件名字符串表, 位掩码)，均为 mmap 上的零拷贝视图"""
+        return self.string_table("FOLDNAME"), self.array_section("NAMEMASK", "Q")
+
+    def has_pinyin(self):
+        """索引文件中是否包含拼音搜索键"""
+        return "PYIDS" in self.sections
+
+    def pinyin_sections(self):
+        """返回 (文件名编号, 全拼字符串表, 首字母字符串表, 位掩码)，均为 mmap 上的零拷贝视图"""
+        return (self.array_section("PYIDS", "I"), self.string_table("PYFULL"), self.string_table("PYINIT"),
+                self.array_section("PYMASK", "Q"))
+
+    def order_sections(self):
+        """返回索引文件中的排序索引（零拷贝视图），格式同 FileTable.orders"""
+        orders = {}
+        if "SIZEORD" in self.sections:
+            orders["size"] = self.array_section("SIZEORD", "I")
+            orders["mtime"] = self.array_section("MTIMORD", "I")
+            orders["dir"] = (self.array_section("DIRORD", "I"), self.array_section("DIROFF", "I"))
+        if "EXTKEYS" in self.sections:
+            orders["ext"] = (list(self.string_table("EXTKEYS")), self.array_section("EXTORD", "I"),
+                             self.array_section("EXTOFF", "I"))
+        return orders
+
+    def dir_snapshots(self):
+        """重建 {目录: [mtime_ns, inode, [子目录名]]}"""
+        dirs = list(self.dirs)
+        snapshots = {}
+        for index, dir_path in enumerate(dirs):
+            if self.dir_mtime[index] >= 0:
+                snapshots[dir_path] = [self.dir_mtime[index], self.dir_inode[index], []]
+        for index, dir_path in enumerate(dirs):
+            parent = self.dir_parent[index]
+            if parent >= 0 and dir_path in snapshots and dirs[parent] in snapshots:
+                snapshots[dirs[parent]][2].append(os.path.basename(dir_path))
+        return snapshots
+
+
+def load_table(path):
+    """打开二进制索引，返回以 mmap 为基础的 FileTable"""
+    return FileTable.from_mapped(MappedIndex(path))
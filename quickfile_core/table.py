@@ -0,0 +1,645 @@
+import os
+import copy
+import bisect
+from array import array
+from itertools import islice
+
+from .ngram import NgramIndex, fold_text, fold_names, char_mask, filter_by_mask
+from .pinyin import PinyinKeys
+
+
+def _zeros(typecode, count):
+    """创建指定长度、全为 0 的数组"""
+    return array(typecode, bytes(array(typecode).itemsize * count))
+
+
+def _copy_column(typecode, column):
+    """把 memoryview 列复制为可修改的数组"""
+    if isinstance(column, array):
+        return column
+    result = array(typecode)
+    result.frombytes(column.cast("B"))
+    return result
+
+
+def extension_key(name):
+    """文件名最后一个 . 之后的部分（折叠大小写），没有 . 时为空字符串"""
+    position = name.rfind(".")
+    return fold_text(name[position + 1:]) if position >= 0 else ""
+
+
+def _bisect_column(order, values, value):
+    """在按 values 排序的行号 order 中，返回第一个值不小于 value 的位置"""
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if values[order[mid]] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _order_rows(key, order):
+    """排序索引覆盖的行数"""
+    if key == "dir":
+        return len(order[0])
+    if key == "ext":
+        return len(order[1])
+    return len(order)
+
+
+class FileTable:
+    """列式内存文件索引
+
+    目录与文件名各只存一份（dirs / names），每个文件是一行，
+    file_dir / file_name / file_size / file_mtime 为等长的数组列。
+    基础部分的行按文件名排序分组：name_rows[i]..name_rows[i+1] 即文件名 i 的全部行；
+    之后新增的行记在 extra_rows 中，删除的行只在 alive 中打标记，保存时再压缩。
+    完整路径只在需要显示时由 path(row) 拼接。
+    基础部分的文件名另有字符倒排索引（ngrams）、折叠大小写后的文件名（folded_names）
+    与字符集合位掩码（name_masks），搜索时先用倒排索引与位掩码缩小候选集，再在折叠后的文件名上匹配；
+    含汉字的文件名另有拼音搜索键（pinyin，见 pinyin.PinyinKeys）。
+    大小、修改时间、所在目录与扩展名另有排序索引（orders，见 column_order / dir_order / ext_order），
+    带过滤条件的查询先在其中二分查找出范围内的行，而不是逐行扫描整列。
+    snapshot() 返回共享列数据的只读快照，读取快照时不必阻塞对本表的修改。
+    """
+
+    def __init__(self):
+        self.dirs = []                    # 目录路径表
+        self.names = []                   # 文件名表，前 base_names 个按字典序排列
+        self.base_names = 0
+        self.name_rows = array("I", [0])  # 基础部分每个文件名的起始行号
+        self.file_dir = array("I")
+        self.file_name = array("I")
+        self.file_size = array("q")       # 文件大小，-1 表示未知
+        self.file_mtime = array("d")      # 修改时间（秒），0 表示未知
+        self.extra_rows = {}              # {文件名编号: [行号]}，基础部分之后新增的行
+        self.extra_name_ids = {}          # {文件名: 编号}，基础部分之后新增的文件名
+        self.alive = None                 # 删除标记（bytearray），None 表示全部有效
+        self.dead = 0
+        self.ngrams = None                # 基础部分文件名的 NgramIndex，按需建立
+        self.folded_names = None          # 基础部分折叠大小写后的文件名，按需建立
+        self.name_masks = None            # 基础部分文件名的字符集合位掩码 array('Q')，按需建立
+        self.pinyin = None                # 基础部分含汉字的文件名的 PinyinKeys，按需建立
+        self.mapped = None                # 从磁盘映射加载时对应的 MappedIndex
+        self.row_limit = None             # 快照可见的行数与文件名数，None 表示不是快照
+        self.name_limit = None
+        self._alive_shared = False        # alive 是否被快照引用（修改前需复制）
+        self.orders = {}                  # 排序索引：{"size"/"mtime": 行号, "dir"/"ext": (.., 分组的行号, 起始位置)}
+        self.restat_rows = set()          # 排序索引建立后原地修改过大小或修改时间的行
+        self.stats_version = 0            # 每次原地修改大小或修改时间加 1
+        self._source = None               # 快照所属的表
+        self._built_orders = {}           # 快照上建立的排序索引 {名称: 建立时所属表的 stats_version}
+        self._dir_ids = None
+
+    @classmethod
+    def from_mapped(cls, mapped):
+        """以只读 mmap 数据为基础创建表，不复制任何列"""
+        table = cls()
+        table.mapped = mapped
+        table.dirs = mapped.dirs
+        table.names = mapped.names
+        table.base_names = len(mapped.names)
+        table.name_rows = mapped.name_rows
+        table.file_dir = mapped.file_dir
+        table.file_name = mapped.file_name
+        table.file_size = mapped.file_size
+        table.file_mtime = mapped.file_mtime
+        table.orders = mapped.order_sections()
+        return table
+
+    @classmethod
+    def from_dict(cls, file_index):
+        """从旧版 {文件名: [路径]} 字典创建（大小与修改时间未知）"""
+        builder = FileTableBuilder()
+        for name, paths in file_index.items():
+            for path in paths:
+                builder.add_file(builder.add_dir(os.path.dirname(path)), name, -1, 0.0)
+        return builder.build()
+
+    def __len__(self):
+        rows = len(self.file_dir) if self.row_limit is None else self.row_limit
+        return rows - self.dead
+
+    def name_count(self):
+        """文件名（去重后）数量"""
+        return len(self.names) if self.name_limit is None else self.name_limit
+
+    def snapshot(self):
+        """返回只读快照（多版本并发读取）
+
+        快照与本表共享列数据，不做复制：行与文件名只会追加，快照只看到创建时已有的部分；
+        删除标记在快照之后第一次修改时复制一份（写时复制），因此之后的增删对快照都不可见。
+        原地更新的大小与修改时间对快照可见。以 mmap 为基础的表不能做快照（detach 会释放映射）。
+        排序索引另用一个字典：已有的排序索引只覆盖快照可见的行，可以共用；
+        之后本表或其他快照建立的排序索引会覆盖更多的行，不能给本快照使用。
+        快照上建立的排序索引读取结束后由 publish_orders 交回本表。
+        """
+        view = copy.copy(self)
+        view.row_limit = len(self.file_dir)
+        view.name_limit = len(self.names)
+        view.orders = dict(self.orders)
+        view._source = self
+        view._built_orders = {}
+        view.restat_rows = set(self.restat_rows)
+        if self.alive is not None:
+            self._alive_shared = True
+        return view
+
+    def get_names(self):
+        """返回文件名列表；映射加载时第一次调用才整体解码"""
+        if not isinstance(self.names, list):
+            self.names = list(self.names)
+        return self.names
+
+    def get_ngrams(self):
+        """返回基础部分文件名的倒排索引；索引文件中没有时现场建立"""
+        if self.ngrams is None:
+            if self.mapped is not None and self.mapped.has_ngrams():
+                self.ngrams = NgramIndex.from_sections(*self.mapped.ngram_sections())
+            else:
+                self.ngrams = NgramIndex.build(islice(self.names, self.base_names))
+        return self.ngrams
+
+    def get_name_columns(self):
+        """返回基础部分文件名的 (折叠后的文件名, 字符集合位掩码)；索引文件中没有时现场建立"""
+        if self.name_masks is None:
+            if self.mapped is not None and self.mapped.has_name_columns():
+                self.folded_names, self.name_masks = self.mapped.name_column_sections()
+            else:
+                self.folded_names, self.name_masks = fold_names(islice(self.names, self.base_names))
+        return self.folded_names, self.name_masks
+
+    def get_pinyin(self):
+        """返回基础部分含汉字的文件名的拼音搜索键；索引文件中没有时现场建立"""
+        if self.pinyin is None:
+            if self.mapped is not None and self.mapped.has_pinyin():
+                self.pinyin = PinyinKeys(*self.mapped.pinyin_sections())
+            else:
+                self.pinyin = PinyinKeys.build(islice(self.names, self.base_names))
+        return self.pinyin
+
+    def index_names(self):
+        """为基础部分的文件名建立折叠列、位掩码、倒排索引与拼音搜索键（构建索引时调用）"""
+        self.folded_names, self.name_masks = fold_names(islice(self.names, self.base_names))
+        self.ngrams = NgramIndex.build(islice(self.names, self.base_names), self.folded_names)
+        self.pinyin = PinyinKeys.build(islice(self.names, self.base_names))
+
+    def candidate_names(self, query):
+        """返回可能匹配模糊查询的文件名编号（升序），后续仍需逐个做正则检查
+
+        从最稀有的字符的倒排表出发，用位掩码排除缺少查询中其他字符的文件名（每个文件名一次整数与运算；
+        字母与数字在位掩码中各占一位，检查是精确的，其余字符共用的位可能放过少量文件名，由正则排除）。
+        """
+        candidates = self.get_ngrams().shortest_posting(query)
+        candidates = filter_by_mask(self.get_name_columns()[1], candidates, char_mask(fold_text(query)))
+        candidates.extend(range(self.base_names, self.name_count()))
+        return candidates
+
+    def pinyin_candidates(self, query):
+        """返回拼音可能匹配查询的 [(PinyinKeys, 条目位置)]，后续仍需在全拼上做正则检查
+
+        基础部分用索引中的拼音位掩码筛选；之后新增的含汉字的文件名现场转换，不做筛选。
+        """
+        keys = self.get_pinyin()
+        groups = [(keys, keys.candidates(char_mask(fold_text(query))))]
+        if self.name_count() > self.base_names:
+            # 有新增的文件名时表已 detach，names 是列表
+            extra = PinyinKeys.build(self.names[self.base_names:self.name_count()], self.base_names)
+            groups.append((extra, range(len(extra))))
+        return groups
+
+    def is_pristine(self):
+        """自构建或加载后是否未被修改（可按原样写盘）"""
+        return not self.extra_rows and not self.dead and len(self.names) == self.base_names
+
+    # 查找
+    def find_name(self, name):
+        """返回文件名编号，不存在时返回 -1"""
+        names = self.names
+        index = bisect.bisect_left(names, name, 0, self.base_names) if isinstance(names, list) else self._bisect_mapped(name)
+        if index < self.base_names and names[index] == name:
+            return index
+        name_id = self.extra_name_ids.get(name, -1)
+        if self.name_limit is not None and name_id >= self.name_limit:
+            return -1
+        return name_id
+
+    def _bisect_mapped(self, name):
+        names = self.names
+        lo, hi = 0, self.base_names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if names[mid] < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_dir(self, path):
+        """返回目录编号，不存在时返回 -1"""
+        if self._dir_ids is None:
+            self._dir_ids = {dir_path: index for index, dir_path in enumerate(self.dirs)}
+        return self._dir_ids.get(path, -1)
+
+    def rows_for(self, name_id):
+        """返回某个文件名的全部有效行号"""
+        rows = []
+        if name_id < self.base_names:
+            rows.extend(range(self.name_rows[name_id], self.name_rows[name_id + 1]))
+        extra = self.extra_rows.get(name_id)
+        if extra:
+            if self.row_limit is not None:
+                limit = self.row_limit
+                extra = [row for row in extra if row < limit]
+            rows.extend(extra)
+        if self.alive is not None:
+            alive = self.alive
+            rows = [row for row in rows if alive[row]]
+        return rows
+
+    def path(self, row):
+        """拼接某一行的完整路径"""
+        return os.path.join(self.dirs[self.file_dir[row]], self.names[self.file_name[row]])
+
+    def find_row(self, path):
+        """返回某个路径的有效行号，不存在时返回 -1"""
+        dir_path, name = os.path.split(path)
+        dir_id = self.find_dir(dir_path)
+        name_id = self.find_name(name)
+        if dir_id < 0 or name_id < 0:
+            return -1
+        for row in self.rows_for(name_id):
+            if self.file_dir[row] == dir_id:
+                return row
+        return -1
+
+    def paths_for(self, name):
+        """返回某个文件名对应的全部路径"""
+        name_id = self.find_name(name)
+        return [self.path(row) for row in self.rows_for(name_id)] if name_id >= 0 else []
+
+    def dirs_under(self, prefixes, include=()):
+        """返回位于给定前缀下（或在 include 中）的目录编号集合"""
+        return {index for index, dir_path in enumerate(self.dirs)
+                if dir_path in include or dir_path.startswith(prefixes)}
+
+    def rows_in_dirs(self, dir_ids):
+        """返回位于给定目录中的全部有效行号（升序）"""
+        order, offsets = self.dir_order()
+        rows = []
+        for dir_id in dir_ids:
+            if dir_id + 1 < len(offsets):
+                rows.extend(order[offsets[dir_id]:offsets[dir_id + 1]])
+        file_dir = self.file_dir
+        rows.extend(row for row in range(len(order), self._row_count()) if file_dir[row] in dir_ids)
+        rows.sort()
+        return self._alive_rows(rows)
+
+    # 排序索引
+    def _row_count(self):
+        return len(self.file_dir) if self.row_limit is None else self.row_limit
+
+    def _alive_rows(self, rows):
+        alive = self.alive
+        return rows if alive is None else [row for row in rows if alive[row]]
+
+    def column_order(self, column):
+        """返回按 "size" 或 "mtime" 列排序的行号
+
+        只覆盖建立时已有的行，之后追加的行与 restat_rows 中的行由调用方另行检查。
+        """
+        order = self.orders.get(column)
+        if order is None:
+            if self._source is not None:
+                self._built_orders[column] = self._source.stats_version
+            values = self.file_size if column == "size" else self.file_mtime
+            order = self.orders[column] = array("I", sorted(range(self._row_count()), key=values.__getitem__))
+        return order
+
+    def dir_order(self):
+        """返回 (按目录编号分组的行号, 每个目录在其中的起始位置)，用计数排序建立"""
+        order = self.orders.get("dir")
+        if order is None:
+            if self._source is not None:
+                self._built_orders["dir"] = None
+            rows = self._row_count()
+            file_dir = self.file_dir
+            offsets = _zeros("I", len(self.dirs) + 1)
+            for dir_id in islice(file_dir, rows):
+                offsets[dir_id + 1] += 1
+            total = 0
+            for index in range(len(offsets)):
+                total += offsets[index]
+                offsets[index] = total
+            position = array("I", offsets[:-1])
+            grouped = _zeros("I", rows)
+            for row in range(rows):
+                dir_id = file_dir[row]
+                grouped[position[dir_id]] = row
+                position[dir_id] += 1
+            order = self.orders["dir"] = (grouped, offsets)
+        return order
+
+    def ext_order(self):
+        """返回 (扩展名列表, 按扩展名分组的行号, 每个扩展名在其中的起始位置)，扩展名见 extension_key"""
+        order = self.orders.get("ext")
+        if order is None:
+            if self._source is not None:
+                self._built_orders["ext"] = None
+            rows = self._row_count()
+            names = self.names
+            file_name = self.file_name
+            key_ids = {}
+            name_keys = array("I")
+            for name in islice(names, self.name_count()):
+                name_keys.append(key_ids.setdefault(extension_key(name), len(key_ids)))
+            keys = sorted(key_ids)
+            rank = _zeros("I", len(keys))
+            for new_id, key in enumerate(keys):
+                rank[key_ids[key]] = new_id
+            row_keys = array("I", [rank[name_keys[name_id]] for name_id in islice(file_name, rows)])
+            offsets = _zeros("I", len(keys) + 1)
+            for key_id in row_keys:
+                offsets[key_id + 1] += 1
+            total = 0
+            for index in range(len(offsets)):
+                total += offsets[index]
+                offsets[index] = total
+            position = array("I", offsets[:-1])
+            grouped = _zeros("I", rows)
+            for row, key_id in enumerate(row_keys):
+                grouped[position[key_id]] = row
+                position[key_id] += 1
+            order = self.orders["ext"] = (keys, grouped, offsets)
+        return order
+
+    def _ext_spans(self, keys):
+        ext_keys, grouped, offsets = self.ext_order()
+        spans = []
+        for key in keys:
+            index = bisect.bisect_left(ext_keys, key)
+            if index < len(ext_keys) and ext_keys[index] == key:
+                spans.append((offsets[index], offsets[index + 1]))
+        return grouped, spans
+
+    def count_with_extensions(self, keys):
+        """估计扩展名在 keys 中的行数"""
+        grouped, spans = self._ext_spans(keys)
+        return sum(end - start for start, end in spans) + self._row_count() - len(grouped)
+
+    def rows_with_extensions(self, keys):
+        """返回扩展名（extension_key）在 keys 中的有效行号"""
+        grouped, spans = self._ext_spans(keys)
+        rows = []
+        for start, end in spans:
+            rows.extend(grouped[start:end])
+        names, file_name = self.names, self.file_name
+        rows.extend(row for row in range(len(grouped), self._row_count())
+                    if extension_key(names[file_name[row]]) in keys)
+        return self._alive_rows(rows)
+
+    def _range_bounds(self, column, low, high):
+        order = self.column_order(column)
+        values = self.file_size if column == "size" else self.file_mtime
+        start = 0 if low is None else _bisect_column(order, values, low)
+        end = len(order) if high is None else _bisect_column(order, values, high)
+        return order, start, max(start, end)
+
+    def count_in_range(self, column, low=None, high=None):
+        """估计该列的值在 [low, high) 中的行数（不必取出行号，用于选择查询计划）"""
+        order, start, end = self._range_bounds(column, low, high)
+        return end - start + len(self.restat_rows) + self._row_count() - len(order)
+
+    def rows_in_range(self, column, low=None, high=None):
+        """返回该列的值在 [low, high) 中的有效行号（None 表示不限）"""
+        order, start, end = self._range_bounds(column, low, high)
+        values = self.file_size if column == "size" else self.file_mtime
+
+        def in_range(row):
+            value = values[row]
+            return (low is None or value >= low) and (high is None or value < high)
+
+        rows = list(order[start:end])
+        restat = self.restat_rows
+        if restat:
+            # 原地修改过的行在排序索引中的位置已经过时，按当前值重新判断
+            covered = len(order)
+            found = set(rows)
+            rows = [row for row in rows if row not in restat or in_range(row)]
+            rows.extend(row for row in restat if row < covered and row not in found and in_range(row))
+        rows.extend(row for row in range(len(order), self._row_count()) if in_range(row))
+        return self._alive_rows(rows)
+
+    def publish_orders(self, table):
+        """把快照上建立的排序索引交给 table（持有写锁时调用），table 不是创建快照的表时什么也不做
+
+        排序索引只覆盖快照可见的行，本表之后追加的行照常另行检查；本表已有覆盖更多行的排序索引时保留原有的。
+        建立期间大小或修改时间被原地修改过的，对应的排序索引可能已过时，不交回。
+        """
+        built, self._built_orders = self._built_orders, {}
+        if table is not self._source:
+            return
+        for key, version in built.items():
+            if version is not None and version != table.stats_version:
+                continue
+            order = self.orders[key]
+            current = table.orders.get(key)
+            if current is None or _order_rows(key, current) < _order_rows(key, order):
+                table.orders[key] = order
+
+    # 修改
+    def set_stats(self, row, size, mtime):
+        """原地更新某一行的大小与修改时间"""
+        self.file_size[row] = size
+        self.file_mtime[row] = mtime
+        self.stats_version += 1
+        if "size" in self.orders or "mtime" in self.orders:
+            self.restat_rows.add(row)
+
+    def detach(self):
+        """复制映射中的数据为可修改的数组，并释放 mmap"""
+        if self.mapped is None:
+            return
+        self.dirs = list(self.dirs)
+        self.get_names()
+        self.name_rows = _copy_column("I", self.name_rows)
+        self.file_dir = _copy_column("I", self.file_dir)
+        self.file_name = _copy_column("I", self.file_name)
+        self.file_size = _copy_column("q", self.file_size)
+        self.file_mtime = _copy_column("d", self.file_mtime)
+        # 快照上按需建立的结果不会写回本表，复制前先取出倒排索引与折叠列
+        self.get_ngrams().detach()
+        folded_names, name_masks = self.get_name_columns()
+        # 与原名相同的折叠结果引用原来的字符串，不重复占用内存
+        self.folded_names = [name if folded == name else folded
+                             for name, folded in zip(self.names, folded_names)]
+        self.name_masks = _copy_column("Q", name_masks)
+        self.get_pinyin().detach()
+        for key, order in list(self.orders.items()):
+            if key == "dir":
+                self.orders[key] = (_copy_column("I", order[0]), _copy_column("I", order[1]))
+            elif key == "ext":
+                self.orders[key] = (list(order[0]), _copy_column("I", order[1]), _copy_column("I", order[2]))
+            else:
+                self.orders[key] = _copy_column("I", order)
+        mapped = self.mapped
+        self.mapped = None
+        mapped.close()
+
+    def add_dir(self, path):
+        """返回目录编号，必要时新增"""
+        index = self.find_dir(path)
+        if index < 0:
+            self.detach()
+            index = self._dir_ids[path] = len(self.dirs)
+            self.dirs.append(path)
+        return index
+
+    def add_file(self, path, size, mtime):
+        """新增一个文件；已存在时只更新大小与修改时间。返回是否为新增"""
+        self.detach()
+        dir_path, name = os.path.split(path)
+        dir_id = self.add_dir(dir_path)
+        name_id = self.find_name(name)
+        if name_id < 0:
+            name_id = self.extra_name_ids[name] = len(self.names)
+            self.names.append(name)
+        else:
+            for row in self.rows_for(name_id):
+                if self.file_dir[row] == dir_id:
+                    self.set_stats(row, size, mtime)
+                    return False
+        row = len(self.file_dir)
+        self.file_dir.append(dir_id)
+        self.file_name.append(name_id)
+        self.file_size.append(size)
+        self.file_mtime.append(mtime)
+        if self.alive is not None:
+            self._own_alive().append(1)
+        self.extra_rows.setdefault(name_id, []).append(row)
+        return True
+
+    def remove_row(self, row):
+        """删除一行（打删除标记）"""
+        self.detach()
+        if self.alive is None:
+            self.alive = bytearray(b"\x01") * len(self.file_dir)
+        alive = self._own_alive()
+        if alive[row]:
+            alive[row] = 0
+            self.dead += 1
+
+    def _own_alive(self):
+        """修改删除标记前调用：快照仍引用当前的标记时先复制一份"""
+        if self._alive_shared:
+            self.alive = bytearray(self.alive)
+            self._alive_shared = False
+        return self.alive
+
+    def remove_path(self, path):
+        """删除某个路径，返回是否找到"""
+        row = self.find_row(path)
+        if row < 0:
+            return False
+        self.remove_row(row)
+        return True
+
+    def compacted(self):
+        """返回去除删除行、按文件名重新排序分组后的新表"""
+        if self.is_pristine():
+            return self
+        names = self.get_names()
+        builder = FileTableBuilder()
+        builder.dirs = list(self.dirs)
+        for name_id in sorted(range(len(names)), key=names.__getitem__):
+            for row in self.rows_for(name_id):
+                builder.add_file(self.file_dir[row], names[name_id],
+                                 self.file_size[row], self.file_mtime[row])
+        return builder.build()
+
+    def close(self):
+        """释放 mmap（不再使用此表时调用）"""
+        if self.mapped is not None:
+            self.ngrams = None
+            self.folded_names = self.name_masks = None
+            self.pinyin = None
+            self.mapped.close()
+            self.mapped = None
+
+
+class FileTableBuilder:
+    """按遍历顺序追加文件，最后一次性排序分组生成 FileTable"""
+
+    def __init__(self):
+        self.dirs = []
+        self.names = []
+        self.name_ids = {}
+        self.file_dir = array("I")
+        self.file_name = array("I")
+        self.file_size = array("q")
+        self.file_mtime = array("d")
+
+    def add_dir(self, path):
+        """登记一个目录，返回编号"""
+        self.dirs.append(path)
+        return len(self.dirs) - 1
+
+    def add_file(self, dir_id, name, size, mtime):
+        """追加一个文件"""
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        self.file_dir.append(dir_id)
+        self.file_name.append(name_id)
+        self.file_size.append(size)
+        self.file_mtime.append(mtime)
+
+    def __len__(self):
+        return len(self.file_dir)
+
+    def build(self, with_ngrams=True):
+        """按文件名排序并用计数排序把行分组；with_ngrams 为 False 时不建立文件名倒排索引与折叠列"""
+        names = self.names
+        order = sorted(range(len(names)), key=names.__getitem__)
+        rank = _zeros("I", len(names))
+        for new_id, old_id in enumerate(order):
+            rank[old_id] = new_id
+
+        name_rows = _zeros("I", len(names) + 1)
+        for old_id in self.file_name:
+            name_rows[rank[old_id] + 1] += 1
+        total = 0
+        for index in range(len(name_rows)):
+            total += name_rows[index]
+            name_rows[index] = total
+
+        rows = len(self.file_dir)
+        position = array("I", name_rows[:-1]) if names else array("I")
+        file_dir = _zeros("I", rows)
+        file_name = _zeros("I", rows)
+        file_size = _zeros("q", rows)
+        file_mtime = _zeros("d", rows)
+        for row in range(rows):
+            name_id = rank[self.file_name[row]]
+            target = position[name_id]
+            position[name_id] = target + 1
+            file_dir[target] = self.file_dir[row]
+            file_name[target] = name_id
+            file_size[target] = self.file_size[row]
+            file_mtime[target] = self.file_mtime[row]
+
+        table = FileTable()
+        table.dirs = self.dirs
+        table.names = [names[old_id] for old_id in order]
+        table.base_names = len(names)
+        table.name_rows = name_rows
+        table.file_dir = file_dir
+        table.file_name = file_name
+        table.file_size = file_size
+        table.file_mtime = file_mtime
+        if with_ngrams:
+            table.index_names()
+        return table
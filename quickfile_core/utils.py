@@ -0,0 +1,46 @@
+import os
+import json
+from datetime import datetime
+
+
+def default_data_dir():
+    """返回默认数据目录 ~/.quickfile"""
+    return os.path.join(os.path.expanduser("~"), ".quickfile")
+
+
+def load_json(path, default):
+    """读取 JSON 文件，失败时返回默认值"""
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"读取 {path} 失败: {e}")
+    return default
+
+
+def save_json(path, data):
+    """写入 JSON 文件"""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"保存 {path} 失败: {e}")
+
+
+def format_size(size_bytes):
+    """格式化文件大小显示"""
+    units = ['B', 'KB', 'MB', 'GB', 'TB']
+    unit_index = 0
+    while size_bytes >= 1024 and unit_index < len(units) - 1:
+        size_bytes /= 1024
+        unit_index += 1
+    return f"{size_bytes:.2f} {units[unit_index]}"
+
+
+def format_file_info(size, mtime):
+    """生成结果列表中文件的“大小 | 修改时间”信息，大小未知（-1）时显示“未知”"""
+    if size < 0:
+        return "未知"
+    modified = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M')
+    return f"{format_size(size)} | {modified}"
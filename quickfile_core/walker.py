@@ -0,0 +1,216 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .ignore import IgnoreRules
+from .metrics import metrics
+
+
+def default_workers():
+    """默认线程数：SSD 上随核心数扩展，网络文件系统上靠并发掩盖延迟"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+class _RootWalk:
+    """单个根目录的遍历状态：每个线程一个双端队列，空闲线程从其他队列窃取任务"""
+
+    def __init__(self, root, workers):
+        self.root = root
+        self.deques = [deque() for _ in range(workers)]
+        self.deques[0].append(root)
+        self.pending = 1
+        self.cond = threading.Condition()
+
+    def take(self, worker_id, stop_event):
+        """取出下一个待扫描目录；全部完成时返回 None"""
+        with self.cond:
+            while True:
+                if stop_event.is_set() or self.pending == 0:
+                    return None
+                own = self.deques[worker_id]
+                if own:
+                    return own.pop()  # 自己的队列后进先出，保持局部性
+                for other in self.deques:
+                    if other:
+                        return other.popleft()  # 从其他队列头部窃取较大的子树
+                self.cond.wait(0.1)
+
+    def finish(self, worker_id, subdirs):
+        """登记一个目录扫描完成，并把子目录放入自己的队列"""
+        with self.cond:
+            self.deques[worker_id].extend(subdirs)
+            self.pending += len(subdirs) - 1
+            if subdirs or self.pending == 0:
+                self.cond.notify_all()
+
+
+class ParallelWalker:
+    """基于线程池与 os.scandir 的并行目录遍历器
+
+    每访问一个目录产出一条 (目录路径, [(文件名, 大小, 修改时间)], [子目录名], 目录签名)，
+    排除规则（gitignore 风格，见 ignore 模块）在遍历过程中直接生效，文件大小取自 DirEntry.stat()，不再额外调用 getsize。
+    excluded_paths 中的目录不进入，但仍记录在父目录的子目录列表中（取消排除后增量刷新即可进入）。
+    目录签名为 (mtime_ns, inode)；传入上次的快照时，签名未变的目录不再列出内容，
+    文件列表为 None，子目录沿用快照记录。目录已不存在时签名为 None。
+    """
+
+    def __init__(self, excludes=(), base=None, excluded_paths=(), max_file_size=None,
+                 workers=None, drive_workers=None, thread_initializer=None):
+        self.rules = IgnoreRules(excludes, base)          # gitignore 风格的排除规则，相对 base 比较
+        self.excluded_paths = set(excluded_paths)         # 不进入的目录（完整路径，例如嵌套的其他索引根目录）
+        self.max_file_size = max_file_size
+        self.workers = workers or default_workers()
+        self.drive_workers = drive_workers or {}  # {根目录: 线程数}，可按磁盘单独配置
+        self.thread_initializer = thread_initializer  # 每个工作线程启动时调用（例如降低优先级）
+        self.stop_event = threading.Event()
+        self.errors = 0
+
+    def workers_for(self, root):
+        """返回某个根目录使用的线程数"""
+        return max(1, self.drive_workers.get(root, self.workers))
+
+    def stop(self):
+        """请求中止遍历"""
+        self.stop_event.set()
+
+    def is_excluded_dir(self, parent, name):
+        """判断 parent 中名为 name 的目录是否应被排除"""
+        return self.rules.excludes(parent, name, True)
+
+    def is_excluded_file(self, parent, name):
+        """判断 parent 中名为 name 的文件是否应被排除（不含大小上限）"""
+        return self.rules.excludes(parent, name, False)
+
+    def subdir_paths(self, path, subdirs):
+        """要进入的子目录完整路径（跳过 excluded_paths）"""
+        children = [os.path.join(path, name) for name in subdirs]
+        if self.excluded_paths:
+            children = [child for child in children if child not in self.excluded_paths]
+        return children
+
+    def scan_dir(self, path):
+        """扫描单个目录，返回 (文件列表, 子目录名列表)"""
+        files = []
+        subdirs = []
+        errors = excluded_dirs = excluded_files = 0
+        excludes = self.rules.excludes
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            # 与 os.walk 一致：不跟随目录符号链接
+                            if entry.is_symlink():
+                                continue
+                            if excludes(path, entry.name, True):
+                                excluded_dirs += 1
+                            else:
+                                subdirs.append(entry.name)
+                            continue
+                        name = entry.name
+                        if excludes(path, name, False):
+                            excluded_files += 1
+                            continue
+                        st = entry.stat()
+                    except (PermissionError, OSError):
+                        errors += 1
+                        continue
+                    if self.max_file_size is not None and st.st_size > self.max_file_size:
+                        excluded_files += 1
+                        continue
+                    files.append((name, st.st_size, st.st_mtime))
+        except (PermissionError, OSError):
+            errors += 1
+        # 每个目录只更新一次指标
+        self.errors += errors
+        metrics.inc("quickfile_walk_dirs_scanned_total", 1, "列出内容的目录数")
+        metrics.inc("quickfile_walk_files_scanned_total", len(files), "遍历时收录的文件数")
+        if errors:
+            metrics.inc("quickfile_walk_errors_total", errors, "scandir/stat 失败次数")
+        if excluded_dirs:
+            metrics.inc("quickfile_walk_excluded_total", excluded_dirs, "被排除规则跳过的条目数",
+                        {"kind": "dir"})
+        if excluded_files:
+            metrics.inc("quickfile_walk_excluded_total", excluded_files, "被排除规则跳过的条目数",
+                        {"kind": "file"})
+        return files, subdirs
+
+    def _put(self, out, item):
+        """向结果队列写入，消费者停止时放弃"""
+        while not self.stop_event.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def visit(self, path, snapshots):
+        """访问一个目录：签名与快照一致时跳过列目录"""
+        try:
+            st = os.stat(path)
+        except (PermissionError, OSError):
+            return None, [], None
+        signature = (st.st_mtime_ns, st.st_ino)
+        old = snapshots.get(path) if snapshots else None
+        if old is not None and old[0] == signature[0] and old[1] == signature[1]:
+            metrics.inc("quickfile_walk_dirs_unchanged_total", 1, "签名与快照一致、未重新列出的目录数")
+            return None, list(old[2]), signature
+        files, subdirs = self.scan_dir(path)
+        return files, subdirs, signature
+
+    def _work(self, state, worker_id, out, snapshots):
+        """工作线程主循环"""
+        while True:
+            path = state.take(worker_id, self.stop_event)
+            if path is None:
+                return
+            try:
+                files, subdirs, signature = self.visit(path, snapshots)
+            except Exception as e:
+                print(f"扫描 {path} 时出错: {e}")
+                files, subdirs, signature = [], [], None
+            state.finish(worker_id, self.subdir_paths(path, subdirs))
+            self._put(out, (path, files, subdirs, signature))
+
+    def _walk_root(self, root, out, snapshots):
+        """用独立线程池遍历一个根目录"""
+        workers = self.workers_for(root)
+        state = _RootWalk(root, workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quickfile-walk",
+                                    initializer=self.thread_initializer) as pool:
+                futures = [pool.submit(self._work, state, i, out, snapshots) for i in range(workers)]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            print(f"遍历 {root} 时出错: {e}")
+        finally:
+            self._put(out, None)
+
+    def walk(self, roots, snapshots=None):
+        """并行遍历多个根目录（各根目录同时进行），逐个产出目录扫描结果
+
+        snapshots 为 {目录: [mtime_ns, inode, [子目录名]]}，用于增量刷新。
+        """
+        roots = list(roots)
+        if not roots:
+            return
+        self.stop_event = threading.Event()
+        out = queue.Queue(maxsize=4096)
+        threads = [threading.Thread(target=self._walk_root, args=(root, out, snapshots), daemon=True) for root in roots]
+        for thread in threads:
+            thread.start()
+        remaining = len(roots)
+        try:
+            while remaining:
+                item = out.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
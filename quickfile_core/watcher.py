@@ -0,0 +1,273 @@
+import os
+import sys
+import errno
+import select
+import stat
+import struct
+import threading
+import time
+
+
+# inotify 事件掩码（见 inotify(7)）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONTFOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+              | IN_ONLYDIR | IN_DONTFOLLOW | IN_EXCL_UNLINK)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchLimitReached(Exception):
+    """inotify 监视数量耗尽（ENOSPC）"""
+
+
+class Inotify:
+    """通过 ctypes 调用 libc 的最小 inotify 封装（仅 Linux）"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.ctypes = ctypes
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """添加监视，返回 watch 描述符；目录已消失时返回 -1"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = self.ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise WatchLimitReached(path)
+            return -1
+        return wd
+
+    def rm_watch(self, wd):
+        """移除监视"""
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """等待并读取事件，返回 [(wd, mask, cookie, name)]"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        """关闭 inotify 文件描述符"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class IndexWatcher:
+    """后台监视服务：订阅已索引根目录的文件系统事件并实时更新文件索引
+
+    Linux 上使用 inotify，事件经过去抖后按批次调用 IndexEngine.apply_changes；
+    不支持 inotify 或监视数量耗尽时，退化为按目录 mtime 的定期增量扫描。
+    """
+
+    def __init__(self, engine, roots=None, debounce=0.2, max_latency=0.8, poll_interval=60):
+        self.engine = engine
+        self.roots = roots
+        self.debounce = debounce          # 事件静默多久后提交一批（秒）
+        self.max_latency = max_latency    # 持续有事件时最长等待多久提交（秒）
+        self.poll_interval = poll_interval
+        self.mode = None                  # "inotify" 或 "polling"
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.inotify = None
+        self.paths_by_wd = {}
+        self.wds_by_path = {}
+        self.on_change = None             # 每批变更应用后的回调 (新增数, 删除数)
+
+    def start(self):
+        """启动后台监视线程"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="quickfile-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止监视"""
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def watched_segments(self):
+        """要监视的索引段：默认为刷新策略为实时监视的段，指定了根目录时为位于其下的段"""
+        if not self.roots:
+            return self.engine.watched_segments()
+        roots = [os.path.abspath(root) for root in self.roots]
+        prefixes = tuple(r if r.endswith(os.sep) else r + os.sep for r in roots)
+        return [segment for segment in self.engine.segments if segment.path in roots or segment.path.startswith(prefixes)]
+
+    def run(self):
+        """监视线程主循环"""
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify()
+                self.mode = "inotify"
+                self.add_initial_watches()
+                self.inotify_loop()
+                return
+            except WatchLimitReached:
+                self.engine.set_status("inotify 监视数量已耗尽，改用定期扫描")
+            except Exception as e:
+                print(f"inotify 不可用: {e}")
+            finally:
+                if self.inotify:
+                    self.inotify.close()
+                    self.inotify = None
+                self.paths_by_wd.clear()
+                self.wds_by_path.clear()
+        if not self.stop_event.is_set():
+            self.mode = "polling"
+            self.polling_loop()
+
+    # 定期扫描模式
+    def polling_loop(self):
+        """按目录 mtime 定期执行增量刷新"""
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                added, removed = self.engine.refresh_file_index([s.path for s in self.watched_segments()])
+                if self.on_change and (added or removed):
+                    self.on_change(added, removed)
+            except Exception as e:
+                print(f"定期扫描失败: {e}")
+
+    # inotify 模式
+    def watch_dir(self, path):
+        """为单个目录添加监视"""
+        wd = self.inotify.add_watch(path)
+        if wd >= 0:
+            self.paths_by_wd[wd] = path
+            self.wds_by_path[path] = wd
+
+    def add_initial_watches(self):
+        """为要监视的段中已索引的所有目录添加监视（沿用目录快照，无需重新遍历）"""
+        segments = self.watched_segments()
+        dirs = [path for segment in segments for path in segment.dir_snapshots]
+        for path in dirs or [segment.path for segment in segments]:
+            if self.stop_event.is_set():
+                return
+            self.watch_dir(path)
+
+    def unwatch_tree(self, path):
+        """移除某目录及其子目录的监视"""
+        prefix = path.rstrip(os.sep) + os.sep
+        for watched in [p for p in self.wds_by_path if p == path or p.startswith(prefix)]:
+            wd = self.wds_by_path.pop(watched)
+            self.paths_by_wd.pop(wd, None)
+            self.inotify.rm_watch(wd)
+
+    def inotify_loop(self):
+        """读取事件、去抖并批量提交"""
+        file_ops = {}      # {路径: "add"/"remove"}，同一路径以最后一次事件为准
+        added_dirs = []
+        removed_dirs = []
+        first_event = last_event = None
+        while not self.stop_event.is_set():
+            events = self.inotify.read_events(self.debounce / 2)
+            now = time.monotonic()
+            for wd, mask, cookie, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，补做一次增量扫描
+                    self.engine.refresh_file_index([s.path for s in self.watched_segments()])
+                    continue
+                parent = self.paths_by_wd.get(wd)
+                if parent is None:
+                    continue
+                if mask & IN_IGNORED:
+                    self.paths_by_wd.pop(wd, None)
+                    self.wds_by_path.pop(parent, None)
+                    continue
+                if not name:
+                    continue
+                path = os.path.join(parent, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_DELETE | IN_MOVED_FROM):
+                        removed_dirs.append(path)
+                        self.unwatch_tree(path)
+                    elif mask & (IN_CREATE | IN_MOVED_TO):
+                        added_dirs.append(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    file_ops[path] = "remove"
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    file_ops[path] = "add"
+                first_event = first_event or now
+                last_event = now
+
+            if first_event and (now - last_event >= self.debounce or now - first_event >= self.max_latency):
+                self.flush(file_ops, added_dirs, removed_dirs)
+                file_ops, added_dirs, removed_dirs = {}, [], []
+                first_event = last_event = None
+
+    def accept_file(self, path):
+        """按所属段的排除规则与大小上限检查新文件，应加入索引时返回其 stat 结果，否则返回 None"""
+        segment = self.engine.segment_for(path)
+        if segment is None or segment.excludes(path, False):
+            return None
+        try:
+            st = os.stat(path)
+        except (PermissionError, OSError):
+            return None
+        if stat.S_ISDIR(st.st_mode) or not segment.accepts_size(st.st_size):
+            return None
+        return st
+
+    def flush(self, file_ops, added_dirs, removed_dirs):
+        """把一批事件作为一个事务应用到索引"""
+        added = []
+        removed = [p for p, op in file_ops.items() if op == "remove"]
+        for path, op in file_ops.items():
+            if op == "add":
+                st = self.accept_file(path)
+                if st is not None:
+                    added.append((path, st.st_size, st.st_mtime))
+
+        # 新目录（含移入的目录树）：添加监视并扫描其内容
+        # 只有未被排除的目录才有监视，因此只需检查新目录自身的名称
+        for path in added_dirs:
+            segment = self.engine.segment_for(path)
+            if segment is None or segment.excludes(path, True):
+                continue
+            walker = segment.create_walker()
+            for root, files, subdirs, signature in walker.walk([path]):
+                if signature is None:
+                    continue
+                self.watch_dir(root)
+                added.extend((os.path.join(root, name), size, mtime) for name, size, mtime in files)
+
+        counts = self.engine.apply_changes(added, removed, removed_dirs)
+        if self.on_change and any(counts):
+            self.on_change(*counts)